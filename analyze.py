@@ -5,11 +5,21 @@ import glob
 import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
 import argparse
+import json
 from datetime import datetime
 import numpy as np
 import math
 import webbrowser
 from bs4 import BeautifulSoup
+import grid
+import artifacts
+import catalog
+import equity
+import drawdowns
+import codrawdown
+import exposure
+import overlaps
+from prices import load_price_folder
 
 class MultiWriter:
     def __init__(self, f_full, f_short):
@@ -25,7 +35,35 @@ def main():
     parser.add_argument('--start', type=str, help='Start date (YYYY-MM-DD)')
     parser.add_argument('--end', type=str, help='End date (YYYY-MM-DD)')
     parser.add_argument('--base', type=float, default=100000.0, help='Base capital (default: 100,000)')
+    parser.add_argument('--dd-budget', type=float, default=1000.0, help='DD budget in USD for the max safe lot / min pip gap table (default: 1,000)')
+    parser.add_argument('--adverse-moves', type=str, default='100,200,300,500', help='Adverse moves in pips for the DD budget table (comma list)')
+    parser.add_argument('--thresholds', type=str, default='500,1000,2000,5000,10000', help='USD DD thresholds for the multi-threshold breach table (comma list)')
+    parser.add_argument('--episodes-top', type=int, default=5, help='Deepest portfolio drawdown episodes listed in the report (default: 5)')
+    parser.add_argument('--episode-min-dd', type=float, default=0.0, help='Minimum depth in USD of a listed drawdown episode (default: 0)')
+    parser.add_argument('--attribution-top', type=int, default=5, help='Worst portfolio DD days broken down by report (default: 5)')
+    parser.add_argument('--codd-threshold', type=float, default=100.0, help='Daily DD in USD at which a report counts as under water for the co-drawdown stress days (default: 100)')
+    parser.add_argument('--stress-min-reports', type=int, default=2, help='Reports under water together for a stress day (default: 2)')
+    parser.add_argument('--rolling-windows', type=str, default='7,30,90', help='Rolling windows in days for the worst rolling DD and PnL (comma list)')
+    parser.add_argument('--catalog', type=str, help=f'Results catalog to record this run in (default: {catalog.default_catalog()})')
+    parser.add_argument('--no-catalog', action='store_true', help='Do not record this run in the results catalog')
     args = parser.parse_args()
+    rolling_days = [int(x) for x in args.rolling_windows.split(',') if x.strip()]
+    portfolio_rolling = []
+
+    try:
+        dd_thresholds = grid.parse_thresholds(args.thresholds)
+    except ValueError as e:
+        print(f"Warning: {e} Using {','.join(f'{t:g}' for t in grid.DEFAULT_THRESHOLDS)}.")
+        dd_thresholds = np.array(grid.DEFAULT_THRESHOLDS)
+    # The 1k columns are always resolved alongside the configured thresholds
+    breach_thresholds = np.union1d(dd_thresholds, [grid.DEFAULT_THRESHOLD])
+    k1_col = int(np.searchsorted(breach_thresholds, grid.DEFAULT_THRESHOLD))
+
+    try:
+        adverse_moves = [float(m) for m in args.adverse_moves.split(',') if m.strip()]
+    except ValueError:
+        print(f"Warning: Invalid --adverse-moves '{args.adverse_moves}'. Using 100,200,300,500.")
+        adverse_moves = [100.0, 200.0, 300.0, 500.0]
 
     output_dir = os.path.abspath(args.output_folder)
     
@@ -123,6 +161,9 @@ def main():
         portfolio_max_dd_abs = (portfolio['Balance'] - portfolio['PeakBalance']).min()
         portfolio_max_dd_abs_time = (portfolio['Balance'] - portfolio['PeakBalance']).idxmin()
 
+        # Worst DD / PnL within rolling windows (risk limits are defined per 7/30/90 days)
+        portfolio_rolling = drawdowns.rolling_worst(portfolio.index, portfolio['Balance'].values, rolling_days)
+
     # Calculate Portfolio-wide Buy/Sell Trade Counts
     total_portfolio_buy_trades = 0
     total_portfolio_sell_trades = 0
@@ -275,39 +316,17 @@ def main():
         table_html = "No trades included in the aggregate portfolio for the specified period.\n\n"
 
     # --- Helper Functions ---
+    # One directory scan for all report artifacts (.set, .parquet, ...) of this run
+    run_index = artifacts.get_run_index(output_dir, list(html_path_map.values()))
+
     def load_parquet_data(html_file_path):
-        """Tries to find and load corresponding parquet file from sibling CSV folder."""
+        """Loads the report's parquet file from the sibling CSV folder."""
         try:
-            base_dir = os.path.dirname(html_file_path)
-            csv_folder = os.path.join(os.path.dirname(base_dir), "CSV")
-            if not os.path.exists(csv_folder):
-                return None
-            
             filename_no_ext = os.path.splitext(os.path.basename(html_file_path))[0]
-            parquet_pattern = os.path.join(csv_folder, f"{filename_no_ext}*.parquet")
-            matches = glob.glob(parquet_pattern)
-            
-            if not matches:
+            parquet_path = run_index.get(filename_no_ext, 'parquet')
+            if not parquet_path:
                 return None
-                
-            p_df = pd.read_parquet(matches[0])
-            if p_df.empty: return None
-            
-            # Parse tab-separated format
-            cols = p_df.columns[0].split('\t')
-            data = [row[0].split('\t') for row in p_df.values]
-            df_parsed = pd.DataFrame(data, columns=cols)
-            
-            # Cleanup names and types
-            df_parsed.columns = [c.replace('<', '').replace('>', '').strip() for c in df_parsed.columns]
-            df_parsed['DATE'] = pd.to_datetime(df_parsed['DATE'], format='%Y.%m.%d %H:%M', errors='coerce')
-            df_parsed = df_parsed.dropna(subset=['DATE'])
-            
-            for c in ['BALANCE', 'EQUITY']:
-                if c in df_parsed.columns:
-                    df_parsed[c] = pd.to_numeric(df_parsed[c], errors='coerce').fillna(0)
-                    
-            return df_parsed.sort_values('DATE')
+            return equity.load_report_equity(parquet_path)
         except Exception as e:
             print(f"Warning: Could not parse parquet for {html_file_path}: {e}")
             return None
@@ -330,10 +349,10 @@ def main():
         
         try:
             base_name = os.path.splitext(os.path.basename(html_file_path))[0]
-            set_path = os.path.join(sets_dir, f"{base_name}.set")
+            set_path = run_index.get(base_name, 'set')
 
-            if not os.path.exists(set_path):
-                print(f"  Warning: .set file not found at {set_path}")
+            if not set_path:
+                print(f"  Warning: .set file not found at {os.path.join(sets_dir, f'{base_name}.set')}")
                 return results
 
             content = None
@@ -411,23 +430,7 @@ def main():
         
         return metrics
 
-    def load_all_fx_rates(base_dir):
-        """Loads daily FX closing prices from the prices/ folder."""
-        prices_dir = os.path.join(base_dir, "prices")
-        rates = {}
-        if os.path.exists(prices_dir):
-            files = glob.glob(os.path.join(prices_dir, "*.csv"))
-            for f in files:
-                s = os.path.splitext(os.path.basename(f))[0].upper()
-                try:
-                    rdf = pd.read_csv(f)
-                    rdf['Date'] = pd.to_datetime(rdf['Date']).dt.date
-                    rdf.set_index('Date', inplace=True)
-                    rates[s] = rdf
-                except: pass
-        return rates
-
-    all_fx_rates = load_all_fx_rates(output_dir)
+    all_fx_rates = load_price_folder(os.path.join(output_dir, "prices"))
 
     def get_usd_conv_factor(symbol, target_date, fx_rates):
         """Calculates conversion factor to USD based on the quote currency."""
@@ -617,6 +620,31 @@ def main():
     </style>
     """
 
+    # Which reports overlap, and what blocked each skipped sequence (replay of the trades.py selection)
+    overlap_table = pd.DataFrame()
+    overlap_rejected = pd.DataFrame(columns=['Report', 'Reason', 'BlockedBy'])
+    try:
+        run_sequences = overlaps.report_sequences(output_dir)
+        if not run_sequences.empty:
+            overlap_table = overlaps.overlap_matrix(overlaps.overlap_pairs(run_sequences))
+            overlap_rejected = overlaps.rejections(run_sequences, overlaps.read_selection(output_dir))
+    except Exception as e:
+        print(f"Warning: Could not build the overlap matrix: {e}")
+
+    # Portfolio floating-equity DD from the included reports' parquet equity curves. A parquet curve holds
+    # all sequences of its report, including those trades.py rejected, so it is not the balance portfolio.
+    equity_reports = [os.path.splitext(sf)[0] for sf in sorted(df_deals['SourceFile'].unique())] if not df_deals.empty else []
+    equity_paths = [p for p in (run_index.get(r, 'parquet') for r in equity_reports) if p]
+    equity_rejected = int(overlap_rejected['Report'].isin(equity_reports).sum())
+    portfolio_equity_res = None
+    if equity_paths:
+        try:
+            portfolio_equity_res = equity.portfolio_equity(equity_paths, args.base, calc_start, calc_end)
+        except Exception as e:
+            print(f"Warning: Could not aggregate portfolio equity: {e}")
+        if equity_rejected:
+            print(f"Warning: The floating equity DD includes {equity_rejected} sequences of the included reports that trades.py rejected.")
+
     with open(report_path, 'w', encoding='utf-8') as f_full, open(short_report_path, 'w', encoding='utf-8') as f_short:
         f = MultiWriter(f_full, f_short)
         f.write("<!DOCTYPE html>\n<html lang='en'>\n<head>\n")
@@ -638,6 +666,33 @@ def main():
         
         if not portfolio.empty:
             f.write(f"<p><strong>Max Drawdown:</strong> {portfolio_max_dd_abs:,.2f} ({portfolio_max_dd_pct:.2f}%) [{portfolio_max_dd_time}]</p>\n")
+        run_summary = {'period_start': calc_start.date(), 'period_end': calc_end.date(), 'base': args.base,
+                       'included': num_included, 'total': num_total, 'final_balance': final_balance,
+                       'total_profit': final_balance - args.base}
+        if not portfolio.empty:
+            run_summary.update(max_dd=portfolio_max_dd_abs, max_dd_pct=portfolio_max_dd_pct, max_dd_time=portfolio_max_dd_time)
+        if portfolio_rolling:
+            f.write(f"<p><strong>Worst Rolling DD:</strong> {drawdowns.format_rolling(portfolio_rolling, 'dd')}</p>\n")
+            f.write(f"<p><strong>Worst Rolling PnL:</strong> {drawdowns.format_rolling(portfolio_rolling, 'pnl')}</p>\n")
+            run_summary['rolling'] = portfolio_rolling
+        if portfolio_equity_res and portfolio_equity_res['reports']:
+            f.write(f"<p><strong>Floating Equity DD:</strong> {portfolio_equity_res['max_dd_abs']:,.2f} "
+                    f"({portfolio_equity_res['max_dd_pct']:.2f}%) [{portfolio_equity_res['max_dd_time']}] "
+                    f"(all sequences of {portfolio_equity_res['reports']} / {num_included} included reports, parquet equity)</p>\n")
+            if equity_rejected:
+                f.write(f"<p><em>Warning: The floating equity DD includes {equity_rejected} sequences of these reports that were "
+                        f"rejected as overlapping or capped, so it describes a different portfolio than the balance Max Drawdown.</em></p>\n")
+        
+        selection_path = os.path.join(trades_folder, "selection.json")
+        if os.path.exists(selection_path):
+            try:
+                with open(selection_path, 'r', encoding='utf-8') as f_sel:
+                    selection = json.load(f_sel)
+                if selection.get('max_concurrent') or selection.get('max_per_currency'):
+                    f.write(f"<p><strong>Concurrency Cap:</strong> {selection.get('max_concurrent') or '-'} sequences portfolio-wide, "
+                            f"{selection.get('max_per_currency') or '-'} per currency ({selection.get('skipped_cap', 0)} sequences skipped)</p>\n")
+            except Exception as e:
+                print(f"Warning: Could not read {selection_path}: {e}")
         
         f.write(f"<p><strong>Total Trades:</strong> {total_portfolio_buy_trades + total_portfolio_sell_trades} (Buy: {total_portfolio_buy_trades}, Sell: {total_portfolio_sell_trades})</p>\n")
         f.write("</div>\n")
@@ -649,6 +704,70 @@ def main():
             f.write(f"<div class='chart-container'><img src='{overview_path}' alt='Portfolio Overview'></div>\n\n")
         else:
             f.write("<p>Portfolio Overview chart is not available (no portfolio-wide trades found).</p>\n\n")
+
+        # Each report's share of the worst days of the conservative daily-sum DD
+        dd_attribution = drawdowns.attribute_worst(df_daily_all, args.attribution_top) if report_daily_max_dds else []
+        if dd_attribution:
+            run_summary['attribution'] = dd_attribution
+            f.write("<h3>Drawdown Attribution</h3>\n")
+            f.write("<p>Worst days of the summed daily report drawdowns and each report's contribution.</p>\n")
+            f.write("<table>\n<thead>\n<tr><th>#</th><th>Date</th><th>Portfolio DD</th><th>Contributors</th></tr>\n</thead>\n<tbody>\n")
+            for att_i, att in enumerate(dd_attribution, 1):
+                contributors = ", ".join(f"{c['report']}: {c['dd']:,.2f} ({c['pct']:.1f}%)" for c in att['reports'])
+                f.write(f"<tr><td>{att_i}</td><td>{att['time']}</td><td>{att['total']:,.2f}</td><td>{contributors}</td></tr>\n")
+            f.write("</tbody>\n</table>\n\n")
+
+        # Days on which several reports are under water together, and the pairs that fail together
+        if report_daily_max_dds and len(report_daily_max_dds) > 1:
+            codd = codrawdown.co_drawdown(df_daily_all, args.codd_threshold, args.stress_min_reports)
+            run_summary['codrawdown'] = {'threshold': codd['threshold'], 'min_reports': codd['min_reports'], 'stress_days': codd['stress_days'],
+                                         'periods': codd['clusters'].head(20).to_dict('records'), 'pairs': codd['pairs'].head(20).to_dict('records')}
+            f.write("<h2>Co-Drawdown</h2>\n")
+            f.write(f"<p>{codd['stress_days']} stress days (at least {codd['min_reports']} reports with a daily DD of {codd['threshold']:,.2f} or more) "
+                    f"in {len(codd['clusters'])} periods.</p>\n")
+            if not codd['clusters'].empty:
+                f.write("<table>\n<thead>\n<tr><th>Start</th><th>End</th><th>Stress Days</th><th>Max Reports</th><th>Worst Daily DD</th><th>Reports</th></tr>\n</thead>\n<tbody>\n")
+                for cl in codd['clusters'].head(10).itertuples():
+                    f.write(f"<tr><td>{cl.Start}</td><td>{cl.End}</td><td>{cl.StressDays}</td><td>{cl.PeakReports}</td>"
+                            f"<td>{cl.WorstDD:,.2f} [{cl.WorstDay}]</td><td>{cl.Reports}</td></tr>\n")
+                f.write("</tbody>\n</table>\n")
+            if not codd['pairs'].empty:
+                f.write("<table>\n<thead>\n<tr><th>Report A</th><th>Report B</th><th>Days Together</th><th>P(B | A)</th><th>P(A | B)</th></tr>\n</thead>\n<tbody>\n")
+                for pr in codd['pairs'].head(10).itertuples(index=False):
+                    f.write(f"<tr><td>{pr.ReportA}</td><td>{pr.ReportB}</td><td>{pr.Together}</td><td>{pr.P_B_given_A:.1f}% ({pr.Together}/{pr.DaysA})</td>"
+                            f"<td>{pr.P_A_given_B:.1f}% ({pr.Together}/{pr.DaysB})</td></tr>\n")
+                f.write("</tbody>\n</table>\n")
+            f.write("\n")
+
+        # Portfolio drawdown episodes (peak -> trough -> recovery) of the balance timeline
+        if not portfolio.empty:
+            portfolio_episodes = drawdowns.extract_episodes(portfolio.index, portfolio['Balance'].values, args.episode_min_dd)
+            uw_pct, longest = drawdowns.time_under_water(portfolio.index, portfolio['Balance'].values)
+            f.write("<h2>Drawdown Episodes</h2>\n")
+            f.write(f"<p>{len(portfolio_episodes)} episodes, {uw_pct:.1f}% of the period under water, longest {drawdowns.format_duration(longest)}.</p>\n")
+            if not portfolio_episodes.empty:
+                f.write("<table>\n<thead>\n<tr><th>#</th><th>Peak</th><th>Trough</th><th>Recovery</th><th>Depth</th><th>Depth %</th><th>Duration</th><th>To Trough</th></tr>\n</thead>\n<tbody>\n")
+                for ep_i, ep in enumerate(portfolio_episodes.head(args.episodes_top).itertuples(), 1):
+                    recovery = ep.Recovery if not pd.isna(ep.Recovery) else "Open"
+                    f.write(f"<tr><td>{ep_i}</td><td>{ep.Peak}</td><td>{ep.Trough}</td><td>{recovery}</td><td>{ep.Depth:,.2f}</td>"
+                            f"<td>{ep.DepthPct:.2f}%</td><td>{drawdowns.format_duration(ep.Duration)}</td><td>{drawdowns.format_duration(ep.TimeToTrough)}</td></tr>\n")
+                f.write("</tbody>\n</table>\n\n")
+
+        # Concurrent exposure of the selected deals (sweep over in/out deals)
+        exposure_res = exposure.exposure_summary(df_deals) if not df_deals.empty else None
+        if exposure_res:
+            run_summary.update(max_sequences=exposure_res['max_sequences'], max_open_lots=exposure_res['max_lots'])
+            f.write("<h2>Concurrent Exposure</h2>\n")
+            f.write(f"<p>Max concurrent sequences: <strong>{exposure_res['max_sequences']}</strong> [{exposure_res['max_sequences_time']}] &nbsp; "
+                    f"Max open lots: <strong>{exposure_res['max_lots']:.2f}</strong> [{exposure_res['max_lots_time']}]</p>\n")
+            f.write("<table style='width: auto;'>\n<thead>\n<tr><th>Symbol / Side</th><th>Peak Open Lots</th><th>Time</th></tr>\n</thead>\n<tbody>\n")
+            for row in exposure_res['symbol_side'].itertuples():
+                f.write(f"<tr><td>{row.Key}</td><td>{row.Peak:.2f}</td><td>{row.PeakTime}</td></tr>\n")
+            f.write("</tbody>\n</table>\n")
+            f.write("<table style='width: auto;'>\n<thead>\n<tr><th>Currency</th><th>Peak Net Lots</th><th>Time</th></tr>\n</thead>\n<tbody>\n")
+            for row in exposure_res['currency'].itertuples():
+                f.write(f"<tr><td>{row.Key}</td><td>{row.Peak:+.2f}</td><td>{row.PeakTime}</td></tr>\n")
+            f.write("</tbody>\n</table>\n\n")
         
         # 11. Final Portfolio Stats Update (Conservative Daily-Sum Max DD)
         if report_daily_max_dds:
@@ -687,14 +806,29 @@ def main():
 
         if overlapping_skipped:
             f.write("<h2>Overlapping Trades (Skipped)</h2>\n")
-            f.write("<p>These files were marked for inclusion but skipped because all their trades overlapped with already accepted sequences:</p>\n")
+            f.write("<p>These files were marked for inclusion but skipped because all their trades overlapped with already accepted sequences (or hit the concurrency cap of <code>trades.py</code>):</p>\n")
             f.write("<ul>\n")
             for sf in overlapping_skipped:
                 sf_path = html_path_map.get(sf, "")
                 sf_link = f"<a href='file:///{sf_path}' target='_blank'><code>{sf}</code></a>" if sf_path else f"<code>{sf}</code>"
-                f.write(f"<li>{sf_link}</li>\n")
+                sf_rejected = overlap_rejected[overlap_rejected['Report'] == os.path.splitext(sf)[0]]
+                blockers = sf_rejected['BlockedBy'].fillna('concurrency cap').value_counts()
+                why = ", ".join(f"{name} ({count})" for name, count in blockers.items())
+                f.write(f"<li>{sf_link}{' - blocked by: ' + why if why else ''}</li>\n")
             f.write("</ul>\n")
 
+        if not overlap_table.empty:
+            f.write("<h2>Report Overlaps</h2>\n")
+            f.write("<p>Included reports whose sequences overlap on the same symbol and side (overlapping sequence pairs and hours):</p>\n")
+            f.write("<table style='width: auto;'>\n<thead>\n<tr><th>Report</th><th>Overlaps With</th><th>Sequences</th><th>Hours</th><th>Skipped</th></tr>\n</thead>\n<tbody>\n")
+            for row in overlap_table.head(20).itertuples():
+                skipped_n = int(((overlap_rejected['Report'] == row.Report) & (overlap_rejected['BlockedBy'] == row.OverlapsWith)).sum() +
+                                ((overlap_rejected['Report'] == row.OverlapsWith) & (overlap_rejected['BlockedBy'] == row.Report)).sum())
+                f.write(f"<tr><td>{row.Report}</td><td>{row.OverlapsWith}</td><td>{row.Sequences}</td><td>{row.Hours:,.1f}</td><td>{skipped_n}</td></tr>\n")
+            f.write("</tbody>\n</table>\n")
+            if len(overlap_table) > 20:
+                f.write(f"<p>{len(overlap_table) - 20} more pairs: <code>python overlaps.py</code></p>\n")
+
         # 10. Detailed Per-Report Analysis
         f.write("<h2>Detailed Per-Report Analysis</h2>\n")
         
@@ -733,6 +867,7 @@ def main():
                     bn = os.path.basename(atf).replace("all_trades_", "").replace(".csv", "")
                     all_reports_to_show.append({'basename': bn, 'original_filename': bn + ".html", 'full_html_path': None})
             short_idx = 1
+            catalog_reports = []
             for idx, r_info in enumerate(all_reports_to_show, 1):
                 report_basename = r_info['basename']
                 original_filename = r_info['original_filename']
@@ -743,6 +878,9 @@ def main():
                 max_dd_abs = None
                 max_dd_pct = None
                 max_dd_time = None
+                report_episodes = None
+                report_uw = None
+                report_rolling = []
 
                 df_parquet = None
                 set_params = None
@@ -1214,6 +1352,9 @@ def main():
                         max_dd_pct = df_pq_filtered['DD_Pct'].min()
                         max_dd_abs = df_pq_filtered['DD_Abs'].min()
                         max_dd_time = df_pq_filtered.iloc[df_pq_filtered['DD_Pct'].argmin()]['DATE']
+                        report_episodes = drawdowns.extract_episodes(df_pq_filtered['DATE'], df_pq_filtered['EQUITY'].values, args.episode_min_dd)
+                        report_uw = drawdowns.time_under_water(df_pq_filtered['DATE'], df_pq_filtered['EQUITY'].values)
+                        report_rolling = drawdowns.rolling_worst(df_pq_filtered['DATE'], df_pq_filtered['EQUITY'].values, rolling_days)
 
                         # Collect daily max DD for portfolio aggregation
                         df_pq_filtered['DateOnlyDD'] = df_pq_filtered['DATE'].dt.date
@@ -1248,6 +1389,9 @@ def main():
                     max_dd_pct = exits['DD_Pct'].min()
                     max_dd_abs = exits['DD_Abs'].min()
                     max_dd_time = exits.iloc[exits['DD_Pct'].argmin()]['Time']
+                    report_episodes = drawdowns.extract_episodes(exits['Time'], exits['Balance'].values, args.episode_min_dd)
+                    report_uw = drawdowns.time_under_water(exits['Time'], exits['Balance'].values)
+                    report_rolling = drawdowns.rolling_worst(exits['Time'], exits['Balance'].values, rolling_days)
 
                     # Collect daily max DD for portfolio aggregation
                     exits['DateOnlyDD'] = exits['Time'].dt.date
@@ -1577,6 +1721,12 @@ def main():
                 plt.close()
 
                 print(f"[{idx}/{len(all_reports_to_show)}] Processed: {report_basename} - {status}")
+                catalog_reports.append({
+                    'report': report_basename, 'symbol': s_sym_top if not df_at.empty else None, 'status': status,
+                    'total_pnl': total_pnl, 'max_dd': max_dd_abs, 'max_dd_pct': max_dd_pct, 'max_dd_time': max_dd_time,
+                    'profit_factor': report_metrics.get('ProfitFactor'), 'recovery_factor': report_metrics.get('RecoveryFactor'),
+                    'max_trades': max_trades_val, 'buy_trades': total_buy_trades, 'sell_trades': total_sell_trades,
+                    'params': set_params, 'rolling': report_rolling})
                 if total_pnl is not None:
                     print(f"  PnL: {total_pnl:,.2f}")
                     if max_dd_abs is not None:
@@ -1619,6 +1769,12 @@ def main():
                     if max_dd_abs is not None:
                         f.write(f"<li><strong>Max Drawdown</strong>: {max_dd_abs:,.2f} ({max_dd_pct:.2f}%) [{max_dd_time}]</li>\n", short=(status == "Included"))
 
+                    if report_episodes is not None:
+                        f.write(f"<li><strong>Drawdown Episodes</strong>: {len(report_episodes)} ({report_uw[0]:.1f}% under water, longest {drawdowns.format_duration(report_uw[1])})</li>\n", short=(status == "Included"))
+
+                    if report_rolling:
+                        f.write(f"<li><strong>Worst Rolling DD</strong>: {drawdowns.format_rolling(report_rolling, 'dd')}</li>\n", short=(status == "Included"))
+
                     # 8. Max Trades in Sequence
                     if 'max_trades_val' in locals() and max_trades_val is not None:
                         date_str = f" [{max_trades_date}]" if 'max_trades_date' in locals() and max_trades_date else ""
@@ -1694,30 +1850,24 @@ def main():
                             # Keep it sorted by PipStepUsed descending
                             combined_distinct = combined_distinct.sort_values('PipStepUsed', ascending=False)
 
+                            def resolve_breaches(row):
+                                # Returns (levels, gaps) for breach_thresholds; level 0 / NaN gap when never reached
+                                dd_l = np.array([row.get(f'DD{b}', 0) for b in range(1, 21)], dtype=float)
+                                gap_l = np.array([row.get(f'Gap{b}', 0) for b in range(1, 21)], dtype=float)
+                                lots_l = np.cumsum([row.get(f'Lot{b}', 0) for b in range(1, 21)])
+                                levels_r, gaps_r, _ = grid.breach_table(dd_l, gap_l, lots_l, breach_thresholds)
+                                return levels_r, gaps_r
+
                             # Prepare scenario rows with breach calculations
                             scenario_rows = []
                             for _, d_row in combined_distinct.iterrows():
                                 is_max = d_row['PipStepUsed'] in top_distinct['PipStepUsed'].values
                                 prefix = "Max Distinct Gap" if is_max else "Min Distinct Gap"
                                 
-                                # Find breach level
-                                b_idx = -1
-                                k1_v_str = "N/A"
-                                try:
-                                    last_dd = 0
-                                    last_gap = 0
-                                    for b in range(1, 21):
-                                        curr_dd = d_row.get(f'DD{b}', 0)
-                                        curr_gap = d_row.get(f'Gap{b}', 0)
-                                        if last_dd < 1000 <= curr_dd:
-                                            b_idx = b
-                                            if curr_dd > last_dd:
-                                                k1_v = last_gap + (curr_gap - last_gap) * (1000 - last_dd) / (curr_dd - last_dd)
-                                                k1_v_str = f"{k1_v:,.1f}"
-                                            break
-                                        last_dd = curr_dd
-                                        last_gap = curr_gap
-                                except: pass
+                                # Resolve all thresholds on the DD ladder at once
+                                b_levels, b_gaps = resolve_breaches(d_row)
+                                b_idx = b_levels[k1_col] if b_levels[k1_col] > 0 else -1
+                                k1_v_str = f"{b_gaps[k1_col]:,.1f}" if b_idx != -1 else "N/A"
 
                                 scenario_rows.append({
                                     'Type': prefix,
@@ -1727,28 +1877,16 @@ def main():
                                     'Label': f"{prefix} | Date: {d_row['Time'].date()} | Base Pip Gap: {d_row['PipStepUsed']:.2f} | USD Conv Factor: {d_row['FX_Factor']:.4f}",
                                     'Data': d_row,
                                     'BreachIdx': b_idx,
-                                    'K1Gap': k1_v_str
+                                    'K1Gap': k1_v_str,
+                                    'BreachLevels': b_levels,
+                                    'BreachGaps': b_gaps
                                 })
                             
                             if 'mean_gap_scenario' in locals() and mean_gap_scenario:
-                                # Find breach for mean gap
-                                b_idx = -1
-                                k1_v_str = "N/A"
-                                try:
-                                    last_dd = 0
-                                    last_gap = 0
-                                    for b in range(1, 21):
-                                        curr_dd = mean_gap_scenario.get(f'DD{b}', 0)
-                                        curr_gap = mean_gap_scenario.get(f'Gap{b}', 0)
-                                        if last_dd < 1000 <= curr_dd:
-                                            b_idx = b
-                                            if curr_dd > last_dd:
-                                                k1_v = last_gap + (curr_gap - last_gap) * (1000 - last_dd) / (curr_dd - last_dd)
-                                                k1_v_str = f"{k1_v:,.1f}"
-                                            break
-                                        last_dd = curr_dd
-                                        last_gap = curr_gap
-                                except: pass
+                                # Resolve all thresholds for the mean gap
+                                b_levels, b_gaps = resolve_breaches(mean_gap_scenario)
+                                b_idx = b_levels[k1_col] if b_levels[k1_col] > 0 else -1
+                                k1_v_str = f"{b_gaps[k1_col]:,.1f}" if b_idx != -1 else "N/A"
 
                                 scenario_rows.append({
                                     'Type': "Mean Pip Gap (Max DD Day)",
@@ -1758,7 +1896,9 @@ def main():
                                     'Label': f"Scenario: Mean Pip Gap on Max DD Day ({max_gap_day.date() if max_gap_day else 'N/A'}) | Base Pip Gap: {global_avg_gap:.2f} | USD Conv Factor: {max_gap_fx_factor:.4f}",
                                     'Data': mean_gap_scenario,
                                     'BreachIdx': b_idx,
-                                    'K1Gap': k1_v_str
+                                    'K1Gap': k1_v_str,
+                                    'BreachLevels': b_levels,
+                                    'BreachGaps': b_gaps
                                 })
 
                             # --- 1. SUMMARY TABLE (Full & Short) ---
@@ -1787,6 +1927,28 @@ def main():
                             
                             f.write("</tbody></table></div></li>\n", short=(status == "Included"))
 
+                            # --- Multi-Threshold Breach Table (Full Report Only) ---
+                            f.write("<li><strong>Theoretical DD Thresholds (Pip Gap / Trade)</strong>:\n", short=False)
+                            f.write("<div style='overflow-x: auto;'>\n", short=False)
+                            f.write("<table style='width: 100%; margin: 10px 0; font-size: 12px; border-collapse: collapse; border: 1px solid #ddd;'>\n", short=False)
+                            f.write("<thead><tr style='background-color: #f2f2f2;'>", short=False)
+                            f.write("<th style='padding: 8px; border: 1px solid #ddd; text-align: left;'>Type</th>", short=False)
+                            f.write("<th style='padding: 8px; border: 1px solid #ddd; text-align: center;'>Base Pip Gap</th>", short=False)
+                            for t_val in dd_thresholds:
+                                f.write(f"<th style='padding: 8px; border: 1px solid #ddd; text-align: center;'>${t_val:,.0f}</th>", short=False)
+                            f.write("</tr></thead>\n<tbody>\n", short=False)
+                            for s in scenario_rows:
+                                f.write("<tr>", short=False)
+                                f.write(f"<td style='padding: 8px; border: 1px solid #ddd;'>{s['Type']}</td>", short=False)
+                                f.write(f"<td style='padding: 8px; border: 1px solid #ddd; text-align: center;'>{s['BasePipGap']}</td>", short=False)
+                                for t_val in dd_thresholds:
+                                    t_i = int(np.searchsorted(breach_thresholds, t_val))
+                                    lvl = s['BreachLevels'][t_i]
+                                    cell = f"{s['BreachGaps'][t_i]:,.1f} (L{lvl}-L{lvl+1})" if lvl > 0 else "N/A"
+                                    f.write(f"<td style='padding: 8px; border: 1px solid #ddd; text-align: center;'>{cell}</td>", short=False)
+                                f.write("</tr>\n", short=False)
+                            f.write("</tbody></table></div></li>\n", short=False)
+
                             # --- 2. DETAILED TABLES (Full Report Only) ---
                             f.write(f"<li><strong>Theoretical Max DD Summary in USD (Max 2 & Min 2 Distinct Pip Gaps)</strong>:\n", short=False)
                             f.write("<div style='overflow-x: auto;'>\n", short=False)
@@ -1821,7 +1983,7 @@ def main():
                                     if b == b_idx:
                                         f.write(f"<td style='padding: 2px; border: 2px solid red; color: red; font-weight: bold; text-align: center;'>$1,000</td>", short=False)
                                     dd_val = d_row.get(f'DD{b}', 0)
-                                    style = f"padding: 2px; color: {'red' if dd_val >= 1000 else 'black'}; font-weight: {'bold' if dd_val >= 1000 else 'normal'};"
+                                    style = f"padding: 2px; color: {'red' if dd_val >= grid.DEFAULT_THRESHOLD else 'black'}; font-weight: {'bold' if dd_val >= grid.DEFAULT_THRESHOLD else 'normal'};"
                                     f.write(f"<td style='{style}'>{dd_val:,.0f}</td>", short=False)
                                 f.write("</tr>\n", short=False)
                                 f.write("</tbody>\n", short=False)
@@ -1836,53 +1998,21 @@ def main():
                                     base_pipstep = max_dd_row['PipStepUsed']
                                     max_dd_fx = max_dd_row['FX_Factor']
                                     
-                                    # Re-calculate effective maxpipstep for this pipstep
-                                    calc_atr = base_pipstep / abs(s_pipstep) if s_pipstep != 0 else 1.0
-                                    eff_maxpipstep = calc_atr * abs(s_maxpipstep) if s_maxpipstep < 0 else s_maxpipstep
-                                    
-                                    # Prices grid based on base_pipstep
-                                    sim_prices = [0.0] * 23
-                                    sim_prices[s_ld + 1] = 1.0 # Anchor
-                                    for k in range(s_ld + 1, 22):
-                                        gap_sim = min(eff_maxpipstep, base_pipstep * (s_pipstepexp ** (k-1))) if eff_maxpipstep > 0 else base_pipstep * (s_pipstepexp ** (k-1))
-                                        sim_prices[k+1] = sim_prices[k] + (gap_sim * detected_point)
-                                    
+                                    # Ladder for all starting lots at once, on the base_pipstep price grid
+                                    eff_maxpipstep = grid.effective_max_pipstep(base_pipstep, s_pipstep, s_maxpipstep)
                                     target_lots = [0.01, 0.02, 0.03, 0.04, 0.05]
-                                    lot_results = {}
+                                    sim_dd, sim_gaps, _, sim_open = grid.theoretical_ladder(
+                                        np.array(target_lots), s_lotexp, s_maxlots, base_pipstep, s_pipstepexp,
+                                        eff_maxpipstep, s_ld, detected_point, max_dd_fx)
+                                    lvl_k1, gap_k1, lots_k1 = grid.first_breach(sim_dd, sim_gaps, sim_open, grid.DEFAULT_THRESHOLD)
                                     
-                                    for st_lot in target_lots:
-                                        # Simulate volumes
-                                        sim_vols = [0.0] * 22
-                                        sim_vols[1] = sum(min(s_maxlots, st_lot * (s_lotexp ** (j-1))) for j in range(1, s_ld + 2))
-                                        for j in range(2, 21):
-                                            sim_vols[j] = min(s_maxlots, st_lot * (s_lotexp ** (s_ld + j - 1)))
-                                            
-                                        # Find 1k Gap
-                                        final_k1_gap = "N/A"
-                                        total_lots_k1 = "N/A"
-                                        level_k1 = "N/A"
-                                        l_dd = 0
-                                        l_gap = 0
-                                        for i in range(1, 21):
-                                            t_p = sim_prices[min(s_ld + i + 1, 22)]
-                                            dd_val_sim = 0
-                                            open_v = 0
-                                            for j in range(1, i + 1):
-                                                dd_val_sim += sim_vols[j] * abs(t_p - sim_prices[s_ld + j])
-                                                open_v += sim_vols[j]
-                                            dd_usd_sim = dd_val_sim * 100000 * max_dd_fx
-                                            curr_gap_sim = abs(t_p - 1.0) / detected_point
-                                            
-                                            if l_dd < 1000 <= dd_usd_sim:
-                                                if dd_usd_sim > l_dd:
-                                                    iv = l_gap + (curr_gap_sim - l_gap) * (1000 - l_dd) / (dd_usd_sim - l_dd)
-                                                    final_k1_gap = f"{iv:,.1f}"
-                                                    total_lots_k1 = f"{open_v:.2f}"
-                                                    level_k1 = f"L{i}-{i+1}"
-                                                break
-                                            l_dd = dd_usd_sim
-                                            l_gap = curr_gap_sim
-                                        lot_results[st_lot] = {'gap': final_k1_gap, 'lots': total_lots_k1, 'level': level_k1}
+                                    lot_results = {}
+                                    for lt_i, st_lot in enumerate(target_lots):
+                                        if lvl_k1[lt_i] > 0:
+                                            lot_results[st_lot] = {'gap': f"{gap_k1[lt_i]:,.1f}", 'lots': f"{lots_k1[lt_i]:.2f}",
+                                                                   'level': f"L{lvl_k1[lt_i]}-{lvl_k1[lt_i]+1}"}
+                                        else:
+                                            lot_results[st_lot] = {'gap': "N/A", 'lots': "N/A", 'level': "N/A"}
                                     
                                     # Output Table
                                     f.write("<li><strong>1k Drawdown Threshold vs. Starting Lot (Pips)</strong>:\n", short=False)
@@ -1913,6 +2043,38 @@ def main():
                                     f.write("</tr>\n", short=False)
                                     
                                     f.write("</tbody></table></div></li>\n", short=False)
+                                    
+                                    # --- DD Budget Table: Max Safe Lot / Min Pip Gap per adverse move ---
+                                    if adverse_moves:
+                                        moves_arr = np.array(adverse_moves)
+                                        safe_lots = grid.solve_max_lot(args.dd_budget, moves_arr, s_lotexp, s_maxlots, base_pipstep,
+                                                                       s_pipstepexp, s_pipstep, s_maxpipstep, s_ld, detected_point, max_dd_fx)
+                                        min_gaps = grid.solve_min_pipstep(args.dd_budget, moves_arr, s_lot, s_lotexp, s_maxlots,
+                                                                          s_pipstepexp, s_pipstep, s_maxpipstep, s_ld, detected_point, max_dd_fx)
+                                        # Lots are traded in 0.01 steps
+                                        safe_lots = np.floor(safe_lots * 100 + 1e-9) / 100
+                                        
+                                        f.write(f"<li><strong>${args.dd_budget:,.0f} DD Budget vs. Adverse Move (Pips)</strong>:\n", short=False)
+                                        f.write("<div style='overflow-x: auto;'>\n", short=False)
+                                        f.write("<table style='margin: 10px 0; font-size: 10px; border-collapse: collapse; min-width: 300px;'>\n", short=False)
+                                        f.write("<thead><tr style='background-color: #f2f2f2;'>", short=False)
+                                        f.write("<th style='border: 1px solid #ddd; padding: 4px;'>Adverse Move</th>", short=False)
+                                        for mv in adverse_moves:
+                                            f.write(f"<th style='border: 1px solid #ddd; padding: 4px;'>{mv:,.0f}</th>", short=False)
+                                        f.write("</tr></thead>\n<tbody>\n", short=False)
+                                        
+                                        f.write(f"<tr><td style='border: 1px solid #ddd; padding: 4px;'><b>Max Safe Lot</b> (gap {base_pipstep:,.1f})</td>", short=False)
+                                        for sl in safe_lots:
+                                            f.write(f"<td style='border: 1px solid #ddd; padding: 4px; text-align: center;'>{sl:.2f}</td>", short=False)
+                                        f.write("</tr>\n", short=False)
+                                        
+                                        f.write(f"<tr><td style='border: 1px solid #ddd; padding: 4px;'><b>Min Base Pip Gap</b> (lot {s_lot})</td>", short=False)
+                                        for mg in min_gaps:
+                                            mg_str = f"{mg:,.1f}" if not np.isnan(mg) else "N/A"
+                                            f.write(f"<td style='border: 1px solid #ddd; padding: 4px; text-align: center;'>{mg_str}</td>", short=False)
+                                        f.write("</tr>\n", short=False)
+                                        
+                                        f.write("</tbody></table></div></li>\n", short=False)
                             except Exception as ex_sim:
                                 f.write(f"<li><strong style='color: red;'>Simulation Error</strong>: {ex_sim}</li>\n", short=(status == "Included"))
                         elif 'theoretical_skip_reason' in locals() and theoretical_skip_reason:
@@ -1926,6 +2088,24 @@ def main():
 
     print(f"\nAnalysis complete.")
     print(f"Report saved to: {report_path}")
+
+    # Results sidecar for scripts that need the numbers without parsing the HTML
+    if 'catalog_reports' in locals():
+        results_path = os.path.join(output_dir, "analysis_results.json")
+        try:
+            with open(results_path, 'w', encoding='utf-8') as f_json:
+                json.dump({'summary': locals().get('run_summary', {}), 'reports': catalog_reports}, f_json, indent=1, default=str)
+            print(f"Results saved to: {results_path}")
+        except Exception as e:
+            print(f"Warning: Could not write {results_path}: {e}")
+
+    # Record the run in the cross-run results catalog
+    if not args.no_catalog and 'catalog_reports' in locals():
+        try:
+            catalog.record_run(output_dir, locals().get('run_summary', {}), catalog_reports, args.catalog)
+            print(f"Run recorded in catalog: {args.catalog or catalog.default_catalog()}")
+        except Exception as e:
+            print(f"Warning: Could not record run in catalog: {e}")
     
     # Try to provide a clickable link in the console (VS Code and some terminals support this)
     clickable_link = f"file:///{report_path.replace(os.sep, '/')}"
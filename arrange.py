@@ -5,18 +5,47 @@ This script organizes files in a /Hunted subdirectory into a structured format.
 The resulting 'Hunted/arranged' folder is designed to be the parent directory 
 for subsequent analysis scripts like 'list.py'.
 
+Files are only re-placed when their size or mtime changed, so re-running after new
+backtests only touches the new files.
+
 Usage:
-    python arrange.py <root_directory>
+    python arrange.py <root_directory> [--mode copy|hardlink|reflink] [--force]
 """
 
 import os
-import shutil
-import glob
 import argparse
+import placement
+
+MANIFEST_FILE = "arrange_manifest.json"
+
+# Report images that belong next to their .htm only; any other .png also goes to Graphs
+HTML_PNG_SUFFIXES = ("_overview.png", "holding.png", "-hst.png", "-mfemae.png")
+
+def scan_hunted(hunted_path):
+    """One scandir pass over the Hunted folder, grouped by extension (.set, .parquet, .htm, .png; any case)."""
+    files = {'.set': [], '.parquet': [], '.htm': [], '.png': []}
+    with os.scandir(hunted_path) as entries:
+        for entry in entries:
+            if not entry.is_file():
+                continue
+            ext = os.path.splitext(entry.name)[1].lower()
+            if ext in files:
+                files[ext].append(entry.path)
+    for paths in files.values():
+        paths.sort()
+    return files
+
+def _summary(placed):
+    new = sum(1 for e in placed.values() if e['method'] != 'unchanged')
+    return f"{new} placed, {len(placed) - new} unchanged"
 
 def arrange_files():
     parser = argparse.ArgumentParser(description='Arrange files in /Hunted folder into a structured hierarchy.')
     parser.add_argument('root_dir', type=str, help='Root directory containing the Hunted folder.')
+    parser.add_argument('--mode', choices=placement.PLACE_MODES, default='copy',
+                        help='How files are placed: copy, hardlink or reflink (default: copy). Falls back to copy where unsupported.')
+    parser.add_argument('--force', action='store_true', help='Re-place every file, even if size and mtime already match.')
+    parser.add_argument('--workers', type=int, default=8, help='Parallel copy threads (default: 8).')
     args = parser.parse_args()
 
     root_dir = os.path.abspath(args.root_dir)
@@ -41,44 +70,39 @@ def arrange_files():
         os.makedirs(folder, exist_ok=True)
         print(f"Ensured directory: {folder}")
 
-    # 3. All *.set files from /Hunted should be copied to /Hunted/arranged
-    set_files = glob.glob(os.path.join(hunted_path, "*.set"))
-    for f in set_files:
-        shutil.copy2(f, arranged_path)
-    print(f"Copied {len(set_files)} .set files to {arranged_path}")
-
-    # 4. All *.parquet files from /Hunted should be copied to /Hunted/arranged/CSV
-    parquet_files = glob.glob(os.path.join(hunted_path, "*.parquet"))
-    for f in parquet_files:
-        shutil.copy2(f, csv_path)
-    print(f"Copied {len(parquet_files)} .parquet files to {csv_path}")
-
-    # 5. Copy all *.htm and ALL *.png files to /Hunted/arranged/HTML Reports
-    #    Additionally, copy "remaining" *.png files (not matching standard report patterns) to /Hunted/arranged/Graphs
-    html_patterns = [
-        "*_overview.png",
-        "*_holding.png",
-        "*holding.png",
-        "*-hst.png",
-        "*-mfemae.png"
-    ]
-    
-    all_pngs = set(glob.glob(os.path.join(hunted_path, "*.png")))
-    specific_pngs = set()
-    for pattern in html_patterns:
-        specific_pngs.update(glob.glob(os.path.join(hunted_path, pattern)))
-    
-    # All .htm and all .png to HTML Reports
-    html_files = glob.glob(os.path.join(hunted_path, "*.htm")) + list(all_pngs)
-    for f in html_files:
-        shutil.copy2(f, html_reports_path)
-    print(f"Copied {len(html_files)} files (.htm and all .png) to {html_reports_path}")
-
-    # 6. Copy remaining *.png files to Graphs
-    remaining_pngs = all_pngs - specific_pngs
-    for f in remaining_pngs:
-        shutil.copy2(f, graphs_path)
-    print(f"Copied {len(remaining_pngs)} remaining .png files to {graphs_path}")
+    files = scan_hunted(hunted_path)
+    place = lambda jobs, mode=args.mode: placement.place_files(jobs, mode, args.workers, args.force)
+    into = lambda paths, folder: [(f, os.path.join(folder, os.path.basename(f))) for f in paths]
+
+    # 3. All *.set files from /Hunted should be placed in /Hunted/arranged
+    placed_sets = place(into(files['.set'], arranged_path))
+    print(f"Arranged {len(placed_sets)} .set files in {arranged_path} ({_summary(placed_sets)})")
+
+    # 4. All *.parquet files from /Hunted should be placed in /Hunted/arranged/CSV
+    placed_parquet = place(into(files['.parquet'], csv_path))
+    print(f"Arranged {len(placed_parquet)} .parquet files in {csv_path} ({_summary(placed_parquet)})")
+
+    # 5. Place all *.htm and ALL *.png files in /Hunted/arranged/HTML Reports
+    placed_html = place(into(files['.htm'] + files['.png'], html_reports_path))
+    print(f"Arranged {len(placed_html)} files (.htm and all .png) in {html_reports_path} ({_summary(placed_html)})")
+
+    # 6. Remaining *.png files (not matching standard report patterns) also go to Graphs.
+    #    They are linked from the HTML Reports copy rather than copied from Hunted a second time.
+    remaining_pngs = [f for f in files['.png'] if not os.path.basename(f).lower().endswith(HTML_PNG_SUFFIXES)]
+    placed_graphs = place(into([os.path.join(html_reports_path, os.path.basename(f)) for f in remaining_pngs], graphs_path),
+                          'reflink' if args.mode == 'reflink' else 'hardlink')
+    print(f"Arranged {len(remaining_pngs)} remaining .png files in {graphs_path} ({_summary(placed_graphs)})")
+
+    manifest_path = os.path.join(arranged_path, MANIFEST_FILE)
+    manifest = placement.read_manifest(manifest_path).get('files', {})
+    for placed in (placed_sets, placed_parquet, placed_html, placed_graphs):
+        for dst, entry in placed.items():
+            rel = os.path.relpath(dst, arranged_path)
+            if entry['method'] == 'unchanged' and rel in manifest:
+                continue  # keep how it was placed originally
+            manifest[rel] = entry
+    placement.write_manifest(manifest_path, manifest, hunted=hunted_path, mode=args.mode)
+    print(f"Manifest saved to: {manifest_path}")
 
     print("\nFile arrangement complete.")
     print(f"The directory '{arranged_path}' is now ready for list.py.")
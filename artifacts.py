@@ -0,0 +1,84 @@
+"""
+artifacts.py - Report Artifact Index
+
+Maps report basenames to their .htm, .set, .parquet and .png files with one os.scandir
+pass per folder, so scripts resolve artifacts with a dictionary lookup instead of a glob
+or os.path.exists call per report.
+
+Resolution is exact: "Report" only resolves to "Report.parquet", never to a longer name
+such as "Report_ld1.parquet" (a different variation of the same report).
+"""
+
+import os
+import pandas as pd
+
+KINDS = {'.htm': 'htm', '.html': 'htm', '.set': 'set', '.parquet': 'parquet', '.png': 'png'}
+
+_RUN_INDEX_CACHE = {}
+
+
+class ArtifactIndex:
+    """Basename -> path lookup per artifact kind, built from directory listings."""
+
+    def __init__(self):
+        self._paths = {kind: {} for kind in set(KINDS.values())}
+
+    def add_folder(self, folder, kinds=None):
+        """Indexes the files of one folder (non-recursive). Earlier folders win on duplicate names."""
+        if not folder or not os.path.isdir(folder):
+            return 0
+        added = 0
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                if not entry.is_file():
+                    continue
+                stem, ext = os.path.splitext(entry.name)
+                kind = KINDS.get(ext.lower())
+                if kind is None or (kinds and kind not in kinds):
+                    continue
+                if stem not in self._paths[kind]:
+                    self._paths[kind][stem] = entry.path
+                    added += 1
+        return added
+
+    def get(self, basename, kind):
+        """Path of the artifact named exactly basename, else None."""
+        return self._paths[kind].get(basename)
+
+    def names(self, kind):
+        return sorted(self._paths[kind])
+
+    def resolve(self, basename):
+        """All artifact paths for basename as {kind: path or None}."""
+        return {kind: self.get(basename, kind) for kind in self._paths}
+
+
+def build_run_index(output_dir, report_paths=None):
+    """
+    Index for an analysis run: .set files from <output_dir>/sets, .htm/.png from the report
+    folders and .parquet from their sibling CSV folders (as arranged by arrange.py).
+    """
+    output_dir = os.path.abspath(output_dir)
+    if report_paths is None:
+        report_paths = []
+        report_list_path = os.path.join(output_dir, "report_list.csv")
+        if os.path.exists(report_list_path):
+            try:
+                report_paths = pd.read_csv(report_list_path)['FilePath'].tolist()
+            except Exception as e:
+                print(f"Warning: Could not read {report_list_path}: {e}")
+
+    index = ArtifactIndex()
+    index.add_folder(os.path.join(output_dir, "sets"), kinds=('set',))
+    for report_dir in sorted({os.path.dirname(p) for p in report_paths if isinstance(p, str)}):
+        index.add_folder(report_dir, kinds=('htm', 'png'))
+        index.add_folder(os.path.join(os.path.dirname(report_dir), "CSV"), kinds=('parquet',))
+    return index
+
+
+def get_run_index(output_dir, report_paths=None):
+    """Cached build_run_index: one directory scan per run and process."""
+    key = os.path.abspath(output_dir)
+    if key not in _RUN_INDEX_CACHE:
+        _RUN_INDEX_CACHE[key] = build_run_index(output_dir, report_paths)
+    return _RUN_INDEX_CACHE[key]
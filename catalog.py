@@ -0,0 +1,246 @@
+"""
+catalog.py - Cross-Run Results Catalog
+
+Every analyze.py run appends its portfolio summary, per-report metrics and set file
+parameters to one SQLite database, so metrics can be compared across runs without
+opening old HTML reports. Re-analyzing an output folder replaces its previous entry.
+
+Default location: ~/.analyzedrawdown/catalog.sqlite (override with ANALYZEDRAWDOWN_CATALOG
+or --catalog).
+
+Usage:
+    python catalog.py runs
+    python catalog.py query --symbol GBPAUD --columns run_ts,report,max_dd
+    python catalog.py query --report "ADX_BB%" --param PipStep --param LiveDelay
+    python catalog.py sql "SELECT symbol, MIN(max_dd) FROM reports GROUP BY symbol"
+"""
+
+import os
+import re
+import sqlite3
+import argparse
+from datetime import datetime
+import pandas as pd
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY,
+    run_dir TEXT UNIQUE NOT NULL,
+    run_ts TEXT,
+    recorded_at TEXT,
+    period_start TEXT,
+    period_end TEXT,
+    base REAL,
+    included INTEGER,
+    total INTEGER,
+    final_balance REAL,
+    total_profit REAL,
+    max_dd REAL,
+    max_dd_pct REAL,
+    max_dd_time TEXT
+);
+CREATE TABLE IF NOT EXISTS reports (
+    run_id INTEGER NOT NULL REFERENCES runs(run_id) ON DELETE CASCADE,
+    report TEXT NOT NULL,
+    symbol TEXT,
+    status TEXT,
+    total_pnl REAL,
+    max_dd REAL,
+    max_dd_pct REAL,
+    max_dd_time TEXT,
+    profit_factor REAL,
+    recovery_factor REAL,
+    max_trades INTEGER,
+    buy_trades INTEGER,
+    sell_trades INTEGER,
+    PRIMARY KEY (run_id, report)
+);
+CREATE TABLE IF NOT EXISTS params (
+    run_id INTEGER NOT NULL REFERENCES runs(run_id) ON DELETE CASCADE,
+    report TEXT NOT NULL,
+    name TEXT NOT NULL,
+    value TEXT,
+    num REAL,
+    PRIMARY KEY (run_id, report, name)
+);
+CREATE INDEX IF NOT EXISTS idx_runs_ts ON runs(run_ts);
+CREATE INDEX IF NOT EXISTS idx_reports_report ON reports(report);
+CREATE INDEX IF NOT EXISTS idx_reports_symbol ON reports(symbol);
+CREATE INDEX IF NOT EXISTS idx_params_name ON params(name, report);
+"""
+
+REPORT_FIELDS = ['symbol', 'status', 'total_pnl', 'max_dd', 'max_dd_pct', 'max_dd_time', 'profit_factor',
+                 'recovery_factor', 'max_trades', 'buy_trades', 'sell_trades']
+RUN_FIELDS = ['period_start', 'period_end', 'base', 'included', 'total', 'final_balance', 'total_profit',
+              'max_dd', 'max_dd_pct', 'max_dd_time']
+
+
+def default_catalog():
+    return os.environ.get("ANALYZEDRAWDOWN_CATALOG") or os.path.join(os.path.expanduser("~"), ".analyzedrawdown", "catalog.sqlite")
+
+
+def connect(db_path=None):
+    db_path = db_path or default_catalog()
+    os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA foreign_keys = ON")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def _number(value):
+    """Float of value, or None for N/A, blanks and text (e.g. '1,234.50' -> 1234.5)."""
+    if value is None:
+        return None
+    try:
+        num = float(str(value).replace(',', '').strip())
+    except ValueError:
+        return None
+    return None if num != num else num
+
+
+def _text(value):
+    return None if value is None else str(value)
+
+
+def run_timestamp(run_dir):
+    """Timestamp of an analysis/output_<YYYYMMDD_HHMMSS> folder, else the folder's mtime."""
+    match = re.search(r'(\d{8}_\d{6})', os.path.basename(os.path.normpath(run_dir)))
+    if match:
+        return datetime.strptime(match.group(1), "%Y%m%d_%H%M%S").isoformat(sep=' ')
+    return datetime.fromtimestamp(os.path.getmtime(run_dir)).isoformat(sep=' ', timespec='seconds')
+
+
+def record_run(run_dir, summary, reports, db_path=None):
+    """
+    Stores one run: summary holds RUN_FIELDS, reports is a list of dicts with 'report',
+    REPORT_FIELDS and an optional 'params' dict from the set file. Returns the run_id.
+    """
+    run_dir = os.path.abspath(run_dir)
+    conn = connect(db_path)
+    try:
+        with conn:
+            conn.execute("DELETE FROM runs WHERE run_dir = ?", (run_dir,))
+            cur = conn.execute(
+                f"INSERT INTO runs (run_dir, run_ts, recorded_at, {', '.join(RUN_FIELDS)}) "
+                f"VALUES (?, ?, ?, {', '.join('?' * len(RUN_FIELDS))})",
+                [run_dir, run_timestamp(run_dir), datetime.now().isoformat(sep=' ', timespec='seconds')] +
+                [_text(summary.get(k)) if k in ('period_start', 'period_end', 'max_dd_time') else _number(summary.get(k)) for k in RUN_FIELDS])
+            run_id = cur.lastrowid
+
+            text_fields = ('symbol', 'status', 'max_dd_time')
+            conn.executemany(
+                f"INSERT OR REPLACE INTO reports (run_id, report, {', '.join(REPORT_FIELDS)}) "
+                f"VALUES (?, ?, {', '.join('?' * len(REPORT_FIELDS))})",
+                [[run_id, r['report']] + [_text(r.get(k)) if k in text_fields else _number(r.get(k)) for k in REPORT_FIELDS]
+                 for r in reports])
+            conn.executemany(
+                "INSERT OR REPLACE INTO params (run_id, report, name, value, num) VALUES (?, ?, ?, ?, ?)",
+                [(run_id, r['report'], name, _text(value), _number(value))
+                 for r in reports for name, value in (r.get('params') or {}).items()])
+        return run_id
+    finally:
+        conn.close()
+
+
+def query_reports(db_path=None, report=None, symbol=None, status=None, since=None, until=None,
+                  columns=None, param_names=(), latest=False):
+    """
+    Per-report rows across runs as a DataFrame. report is a SQL LIKE pattern, symbol matches
+    as a substring (so GBPAUD also finds GBPAUD.m), param_names add set file parameters as columns.
+    latest keeps only the most recent run of each report.
+    """
+    columns = columns or ['run_ts', 'report', 'symbol', 'status', 'total_pnl', 'max_dd', 'max_dd_pct',
+                          'recovery_factor', 'max_trades']
+    select = [f"runs.{c}" if c in ('run_ts', 'run_dir') else f"reports.{c}" for c in columns]
+    joins, args = [], []
+    for i, name in enumerate(param_names):
+        joins.append(f"LEFT JOIN params p{i} ON p{i}.run_id = reports.run_id AND p{i}.report = reports.report AND p{i}.name = ?")
+        select.append(f"COALESCE(p{i}.num, p{i}.value) AS \"{name}\"")
+        args.append(name)
+
+    where = []
+    if report:
+        where.append("reports.report LIKE ?")
+        args.append(report)
+    if symbol:
+        where.append("reports.symbol LIKE ?")
+        args.append(f"%{symbol.upper()}%")
+    if status:
+        where.append("reports.status = ?")
+        args.append(status)
+    if since:
+        where.append("runs.run_ts >= ?")
+        args.append(since)
+    if until:
+        # until is a whole day: run_ts carries the time of day
+        where.append("runs.run_ts < date(?, '+1 day')")
+        args.append(until)
+    if latest:
+        where.append("runs.run_ts = (SELECT MAX(r2.run_ts) FROM runs r2 JOIN reports x ON x.run_id = r2.run_id WHERE x.report = reports.report)")
+
+    sql = (f"SELECT {', '.join(select)} FROM reports JOIN runs ON runs.run_id = reports.run_id "
+           f"{' '.join(joins)} {'WHERE ' + ' AND '.join(where) if where else ''} "
+           f"ORDER BY runs.run_ts, reports.report")
+    conn = connect(db_path)
+    try:
+        return pd.read_sql_query(sql, conn, params=args)
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query the cross-run results catalog written by analyze.py.")
+    parser.add_argument("--catalog", help=f"Catalog database (default: {default_catalog()}).")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    sub.add_parser("runs", help="List recorded runs with their portfolio summary.")
+
+    p_query = sub.add_parser("query", help="Per-report metrics across runs.")
+    p_query.add_argument("--report", help="Report name pattern (SQL LIKE, e.g. 'ADX_BB%%').")
+    p_query.add_argument("--symbol", help="Symbol, e.g. GBPAUD.")
+    p_query.add_argument("--status", help="Only reports with this status (e.g. Included).")
+    p_query.add_argument("--since", help="Runs from this date (YYYY-MM-DD).")
+    p_query.add_argument("--until", help="Runs up to this date (YYYY-MM-DD).")
+    p_query.add_argument("--columns", help=f"Comma list of run_ts, run_dir, report, {', '.join(REPORT_FIELDS)}.")
+    p_query.add_argument("--param", action="append", default=[], help="Add a set file parameter column (repeatable).")
+    p_query.add_argument("--latest", action="store_true", help="Only the most recent run of each report.")
+    p_query.add_argument("--csv", help="Also save the result to this CSV file.")
+
+    p_sql = sub.add_parser("sql", help="Run a raw SQL query (tables: runs, reports, params).")
+    p_sql.add_argument("statement")
+    args = parser.parse_args()
+
+    pd.set_option('display.width', 250)
+    pd.set_option('display.max_columns', 50)
+    if args.command == "runs":
+        conn = connect(args.catalog)
+        try:
+            df = pd.read_sql_query("SELECT run_id, run_ts, period_start, period_end, included, total, total_profit, "
+                                   "max_dd, max_dd_pct, run_dir FROM runs ORDER BY run_ts", conn)
+        finally:
+            conn.close()
+    elif args.command == "query":
+        columns = [c.strip() for c in args.columns.split(',')] if args.columns else None
+        valid = set(REPORT_FIELDS) | {'run_ts', 'run_dir', 'report'}
+        if columns and not set(columns) <= valid:
+            parser.error(f"Unknown columns: {', '.join(sorted(set(columns) - valid))}")
+        df = query_reports(args.catalog, args.report, args.symbol, args.status, args.since, args.until,
+                           columns, args.param, args.latest)
+        if args.csv:
+            df.to_csv(args.csv, index=False)
+    else:
+        conn = connect(args.catalog)
+        try:
+            df = pd.read_sql_query(args.statement, conn)
+        finally:
+            conn.close()
+
+    if df.empty:
+        print("No matching rows.")
+    else:
+        print(df.to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
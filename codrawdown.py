@@ -0,0 +1,173 @@
+"""
+codrawdown.py - Co-Drawdown Detection
+
+Finds the days on which several reports are under water at the same time, and the report
+pairs that tend to fail together. Input is the aligned date x report matrix of daily
+drawdowns that analyze.py builds for the conservative daily-sum Max DD (also embedded in
+Full_Analysis.html as the hidden DAILY_DD_DATA block).
+
+A day counts as "under water" for a report when its drawdown is at or below -threshold.
+The resulting boolean day x report matrix B is sparse, and B^T B gives, in one product,
+the number of days every pair of reports was under water together (the diagonal holds
+each report's own count). Conditional probabilities follow as
+    P(B under water | A under water) = together(A, B) / days(A).
+scipy.sparse is used for the product when it is installed, numpy otherwise.
+
+Stress days (at least --min-reports reports under water) closer than --gap days are
+clustered into stress periods.
+
+Usage:
+    python codrawdown.py <output_folder> [--threshold 100] [--min-reports 2] [--gap 3] [--top 20]
+"""
+
+import os
+import re
+import argparse
+from io import StringIO
+import numpy as np
+import pandas as pd
+
+try:
+    import scipy.sparse as sparse
+except ImportError:
+    sparse = None
+
+PAIR_COLUMNS = ['ReportA', 'ReportB', 'Together', 'DaysA', 'DaysB', 'P_B_given_A', 'P_A_given_B']
+CLUSTER_COLUMNS = ['Start', 'End', 'StressDays', 'PeakReports', 'WorstDD', 'WorstDay', 'Reports']
+
+
+def underwater_matrix(daily_dd, threshold):
+    """Boolean day x report matrix (sparse CSR if scipy is available) of drawdowns <= -threshold."""
+    mask = daily_dd.fillna(0).to_numpy(dtype=float) <= -abs(threshold)
+    if sparse is not None:
+        return sparse.csr_matrix(mask, dtype=np.int32)
+    # float32 so the dense product runs through BLAS (exact for counts below 2**24)
+    return mask.astype(np.float32)
+
+
+def co_counts(b):
+    """B^T B of joint under-water days: sparse if B is sparse, else a dense array."""
+    if sparse is not None and sparse.issparse(b):
+        return (b.T @ b).tocsr()
+    return np.rint(b.T @ b).astype(np.int64)
+
+
+def co_drawdown_pairs(daily_dd, threshold, counts=None):
+    """
+    Report pairs that were under water together on at least one day, most shared days first.
+    Returns a frame with PAIR_COLUMNS (P_B_given_A = P(B under water | A under water), in %).
+    """
+    if counts is None:
+        counts = co_counts(underwater_matrix(daily_dd, threshold))
+    reports = np.asarray(daily_dd.columns.astype(str))
+    if sparse is not None and sparse.issparse(counts):
+        # Upper triangle taken from the sparse product, without a dense R x R copy
+        days = counts.diagonal().astype(np.int64)
+        upper = sparse.triu(counts, k=1).tocoo()
+        order = np.lexsort((upper.col, upper.row))
+        a, b, together = upper.row[order], upper.col[order], upper.data[order].astype(np.int64)
+        keep = together > 0
+        a, b, together = a[keep], b[keep], together[keep]
+    else:
+        days = np.diag(counts)
+        a, b = np.nonzero(np.triu(counts, k=1))
+        together = counts[a, b]
+    pairs = pd.DataFrame({
+        'ReportA': reports[a], 'ReportB': reports[b], 'Together': together,
+        'DaysA': days[a], 'DaysB': days[b],
+        'P_B_given_A': together / days[a] * 100, 'P_A_given_B': together / days[b] * 100,
+    }, columns=PAIR_COLUMNS)
+    return pairs.sort_values(['Together', 'P_B_given_A'], ascending=False, kind='stable').reset_index(drop=True)
+
+
+def stress_clusters(daily_dd, threshold, min_reports=2, gap_days=3, b=None):
+    """
+    Stress days (>= min_reports reports under water) merged into periods when they are at most
+    gap_days apart. Returns a frame with CLUSTER_COLUMNS, worst period first.
+    """
+    if b is None:
+        b = underwater_matrix(daily_dd, threshold)
+    per_day = np.asarray(b.sum(axis=1)).ravel().astype(np.int64)
+    rows = np.flatnonzero(per_day >= min_reports)
+    if not len(rows):
+        return pd.DataFrame(columns=CLUSTER_COLUMNS)
+
+    dates = pd.to_datetime(daily_dd.index[rows])
+    cluster = np.concatenate([[0], np.cumsum(np.diff(dates.values) > np.timedelta64(gap_days, 'D'))])
+    total = daily_dd.fillna(0).to_numpy(dtype=float)[rows].sum(axis=1)
+    stress = pd.DataFrame({'Date': dates, 'Cluster': cluster, 'Reports': per_day[rows], 'DD': total})
+    g = stress.groupby('Cluster')
+    clusters = pd.DataFrame({
+        'Start': g['Date'].first().dt.date, 'End': g['Date'].last().dt.date, 'StressDays': g.size(),
+        'PeakReports': g['Reports'].max(), 'WorstDD': g['DD'].min(),
+        'WorstDay': stress.loc[g['DD'].idxmin(), 'Date'].dt.date.to_numpy(),
+    })
+
+    # Reports under water on any stress day of the period
+    reports = np.asarray(daily_dd.columns.astype(str))
+    hit = b[rows]
+    hit = hit.toarray() if sparse is not None and sparse.issparse(hit) else hit
+    members = pd.DataFrame(hit > 0).groupby(cluster).any().to_numpy()
+    clusters['Reports'] = [", ".join(reports[m]) for m in members]
+    return clusters.sort_values('WorstDD', kind='stable').reset_index(drop=True)[CLUSTER_COLUMNS]
+
+
+def co_drawdown(daily_dd, threshold, min_reports=2, gap_days=3):
+    """Pairs, stress periods and the number of stress days of a daily DD matrix."""
+    b = underwater_matrix(daily_dd, threshold)
+    pairs = co_drawdown_pairs(daily_dd, threshold, co_counts(b))
+    clusters = stress_clusters(daily_dd, threshold, min_reports, gap_days, b)
+    return {'threshold': abs(threshold), 'min_reports': min_reports,
+            'stress_days': int(clusters['StressDays'].sum()) if not clusters.empty else 0,
+            'pairs': pairs, 'clusters': clusters}
+
+
+def read_daily_dd(output_dir):
+    """The hidden daily DD matrix of Full_Analysis.html (date x report), or None."""
+    path = os.path.join(output_dir, "Full_Analysis.html")
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        content = f.read()
+    block = re.search(r'<!-- DAILY_DD_DATA_START\n(.*?)\nDAILY_DD_DATA_END -->', content, re.DOTALL)
+    if not block:
+        return None
+    return pd.read_csv(StringIO(block.group(1).strip()), index_col=0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Days on which several reports are under water together, and the pairs that fail together.")
+    parser.add_argument("output_folder", help="Path to the output folder (analysis/output_*) with Full_Analysis.html.")
+    parser.add_argument("--threshold", type=float, default=100.0, help="Daily DD in USD at which a report counts as under water (default: 100).")
+    parser.add_argument("--min-reports", type=int, default=2, help="Reports under water for a stress day (default: 2).")
+    parser.add_argument("--gap", type=int, default=3, help="Max days between stress days of one period (default: 3).")
+    parser.add_argument("--top", type=int, default=20, help="Pairs and periods listed (default: 20).")
+    args = parser.parse_args()
+
+    output_dir = os.path.abspath(args.output_folder)
+    daily_dd = read_daily_dd(output_dir)
+    if daily_dd is None or daily_dd.empty:
+        print("No daily DD data found. Run analyze.py on the output folder first.")
+        return
+
+    res = co_drawdown(daily_dd, args.threshold, args.min_reports, args.gap)
+    pd.set_option('display.width', 250)
+    pd.set_option('display.max_colwidth', 120)
+    print(f"{daily_dd.shape[1]} reports x {daily_dd.shape[0]} days, threshold {res['threshold']:,.2f} "
+          f"({'scipy.sparse' if sparse is not None else 'numpy'}): {res['stress_days']} stress days in {len(res['clusters'])} periods")
+    if not res['clusters'].empty:
+        print("\nStress periods:")
+        print(res['clusters'].head(args.top).to_string(index=False, float_format=lambda x: f"{x:,.2f}"))
+    if not res['pairs'].empty:
+        print("\nReport pairs under water together:")
+        print(res['pairs'].head(args.top).to_string(index=False, float_format=lambda x: f"{x:,.1f}"))
+
+    out_dir = os.path.join(output_dir, "codrawdown")
+    os.makedirs(out_dir, exist_ok=True)
+    res['pairs'].to_csv(os.path.join(out_dir, "pairs.csv"), index=False)
+    res['clusters'].to_csv(os.path.join(out_dir, "stress_periods.csv"), index=False)
+    print(f"\nSaved to: {out_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,29 @@
 import re
 import os
+import numpy as np
 import pandas as pd
 import argparse
 import webbrowser
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from bs4 import BeautifulSoup
 
 def parse_arguments():
-    parser = argparse.ArgumentParser(description='Compare strategy variations from Short_Analysis.html')
-    parser.add_argument('output_dir', type=str, help='Path to the output folder containing Short_Analysis.html')
+    parser = argparse.ArgumentParser(description='Compare strategy variations from the trade data (fallback: Short_Analysis.html)')
+    parser.add_argument('output_dir', type=str, help='Path to the output folder containing Trades/ and report_list.csv')
+    parser.add_argument('--base', type=float, default=100000.0, help='Base capital for DD percentages (default: 100,000).')
+    parser.add_argument('--all', action='store_true', help='Include reports with Include = 0.')
+    parser.add_argument('--workers', type=int, help='Parallel variant groups (default: CPU count).')
+    parser.add_argument('--html', action='store_true', help='Use the Short_Analysis.html metrics instead of the trade data.')
     return parser.parse_args()
 
+def split_variant(report_name):
+    """Splits 'Strategy_ld1' / 'Strategy_t18' into (base, variant); names without a suffix are 'Original'."""
+    match = re.search(r'(.*?)_([a-zA-Z]+\d+)$', report_name)
+    if match:
+        return match.group(1), match.group(2)
+    return report_name, "Original"
+
 def extract_metrics(html_content):
     # Regular expression to find report headers and their metrics
     report_pattern = re.compile(r"<h3>\d+\. Report: <a[^>]*>(.*?)</a></h3>.*?<ul class='metrics-list'>(.*?)</ul>", re.DOTALL)
@@ -21,15 +34,8 @@ def extract_metrics(html_content):
     results = []
     
     for report_name, metrics_html in report_pattern.findall(html_content):
-        # Improved suffix detection
         # Matches patterns like _ld1, _t18, _v1, etc.
-        match = re.search(r'(.*?)_([a-zA-Z]+\d+)$', report_name)
-        if match:
-            base_name = match.group(1)
-            variant = match.group(2)
-        else:
-            base_name = report_name
-            variant = "Original"
+        base_name, variant = split_variant(report_name)
         
         metrics = {}
         target_metrics = ["Total PnL", "Max Drawdown", "Recovery Factor", "Max Trades in Sequence", "Buy Trades", "Sell Trades"]
@@ -54,6 +60,140 @@ def extract_metrics(html_content):
         })
     return results
 
+def load_trade_series(trades_path):
+    """Closed-trade PnL per deal (time-sorted), entry deals and sequence sizes of one all_trades_<report>.csv."""
+    df = pd.read_csv(trades_path)
+    df = df[df['Type'].astype(str).str.lower() != 'balance']
+    df['Time'] = pd.to_datetime(df['Time'])
+    df = df.sort_values('Time', kind='stable')
+    pnl = df['Profit'].fillna(0) + df['Commission'].fillna(0) + df['Swap'].fillna(0)
+    ins = df[df['Direction'].astype(str).str.lower() == 'in']
+    return pd.Series(pnl.to_numpy(), index=df['Time']), ins
+
+def variant_metrics(trades_path, base=100000.0):
+    """Metrics of one variant from its trades plus its daily equity (cumulative PnL) and daily DD curves."""
+    pnl, ins = load_trade_series(trades_path)
+    equity = pnl.cumsum()
+    dd = equity - np.maximum(equity.cummax(), 0.0)
+    max_dd = float(dd.min()) if len(dd) else 0.0
+    total_pnl = float(pnl.sum())
+    # Sequence length as in analyze.py: highest TradeNumberInSequence of each sequence
+    seqs = ins[ins['SequenceNumber'] > 0] if 'SequenceNumber' in ins.columns else ins.iloc[0:0]
+    if 'TradeNumberInSequence' in seqs.columns:
+        seq_sizes = seqs.groupby('SequenceNumber')['TradeNumberInSequence'].max()
+    else:
+        seq_sizes = seqs.groupby('SequenceNumber').size()
+    types = ins['Type'].astype(str).str.lower()
+
+    day = equity.index.normalize()
+    daily = pd.DataFrame({'Equity': equity.groupby(day).last(), 'DD': dd.groupby(day).min(), 'PnL': pnl.groupby(day).sum()})
+    metrics = {
+        'Total PnL': total_pnl,
+        'Max Drawdown': max_dd,
+        'Max DD %': max_dd / base * 100 if base else 0.0,
+        'Recovery Factor': total_pnl / abs(max_dd) if max_dd < 0 else np.nan,
+        'Max Trades in Sequence': int(seq_sizes.max()) if len(seq_sizes) else 0,
+        'Sequences': len(seq_sizes),
+        'Buy Trades': int((types == 'buy').sum()),
+        'Sell Trades': int((types == 'sell').sum()),
+    }
+    return metrics, daily
+
+def paired_differences(ref, ref_daily, other, other_daily):
+    """Variant minus reference: total deltas and the daily PnL difference over their common calendar."""
+    days = ref_daily.index.union(other_daily.index)
+    diff = other_daily['PnL'].reindex(days, fill_value=0.0) - ref_daily['PnL'].reindex(days, fill_value=0.0)
+    active = diff[diff != 0]
+    std = diff.std()
+    return {
+        'dPnL': other['Total PnL'] - ref['Total PnL'],
+        'dMaxDD': other['Max Drawdown'] - ref['Max Drawdown'],
+        'Mean Daily dPnL': diff.mean(),
+        't-stat': diff.mean() / std * np.sqrt(len(diff)) if std > 0 else np.nan,
+        'Days Better %': (active > 0).mean() * 100 if len(active) else np.nan,
+        'Daily PnL Cor': ref_daily['PnL'].reindex(days, fill_value=0.0).corr(other_daily['PnL'].reindex(days, fill_value=0.0)),
+    }
+
+def compare_group(job):
+    """Worker: metrics, paired differences against the reference variant and an overlay chart for one strategy."""
+    base_name, members, trades_dir, chart_path, base = job
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    rows, daily = [], {}
+    for report_name, variant in members:
+        metrics, daily[variant] = variant_metrics(os.path.join(trades_dir, f"all_trades_{report_name}.csv"), base)
+        rows.append({'Base': base_name, 'Variant': variant, 'FullReportName': report_name, **metrics})
+
+    ref = rows[0]
+    paired = [{'Base': base_name, 'Variant': r['Variant'], 'Reference': ref['Variant'],
+               **paired_differences(ref, daily[ref['Variant']], r, daily[r['Variant']])} for r in rows[1:]]
+
+    fig, (ax_eq, ax_dd) = plt.subplots(2, 1, figsize=(12, 7), sharex=True)
+    for r in rows:
+        curve = daily[r['Variant']]
+        ax_eq.plot(curve.index, curve['Equity'], label=r['Variant'], linewidth=1.2)
+        ax_dd.plot(curve.index, curve['DD'], label=r['Variant'], linewidth=1.0)
+    ax_eq.set_title(f"{base_name}: Closed-Trade Equity")
+    ax_eq.set_ylabel('Cumulative PnL')
+    ax_eq.legend(loc='upper left', fontsize=8)
+    ax_eq.grid(True, alpha=0.3)
+    ax_dd.set_title("Daily Drawdown")
+    ax_dd.set_ylabel('DD')
+    ax_dd.grid(True, alpha=0.3)
+    plt.tight_layout()
+    plt.savefig(chart_path)
+    plt.close(fig)
+    return rows, paired
+
+def compare_from_trades(output_dir, base=100000.0, include_all=False, workers=None):
+    """
+    Groups the run's reports into variant families and compares every family from its
+    Trades/all_trades_<report>.csv files, one family per worker process.
+    Returns (metric rows, paired difference rows, {base: chart path}) or None without trade data.
+    """
+    trades_dir = os.path.join(output_dir, "Trades")
+    report_list_path = os.path.join(output_dir, "report_list.csv")
+    if not os.path.isdir(trades_dir) or not os.path.exists(report_list_path):
+        return None
+    df_list = pd.read_csv(report_list_path)
+    if not include_all and 'Include' in df_list.columns:
+        df_list = df_list[df_list['Include'] == 1]
+
+    families = {}
+    for fp in df_list['FilePath']:
+        report_name = os.path.splitext(os.path.basename(fp))[0]
+        if os.path.exists(os.path.join(trades_dir, f"all_trades_{report_name}.csv")):
+            base_name, variant = split_variant(report_name)
+            families.setdefault(base_name, []).append((report_name, variant))
+    families = {b: sorted(m, key=lambda x: (x[1] != "Original", x[1])) for b, m in families.items() if len(m) > 1}
+    if not families:
+        return None
+
+    charts_dir = os.path.join(output_dir, "compare")
+    os.makedirs(charts_dir, exist_ok=True)
+    charts = {b: os.path.join(charts_dir, f"{b}.png") for b in families}
+    jobs = [(b, members, trades_dir, charts[b], base) for b, members in sorted(families.items())]
+
+    results, paired = [], []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for rows, diffs in executor.map(compare_group, jobs):
+            results.extend(rows)
+            paired.extend(diffs)
+    return results, paired, charts
+
+def format_trade_metrics(results, base=100000.0):
+    """Renders trade metrics with the same labels and number formats as the analysis report."""
+    formatted = []
+    for r in results:
+        item = dict(r)
+        item['Total PnL'] = f"{r['Total PnL']:,.2f}"
+        item['Max Drawdown'] = f"{r['Max Drawdown']:,.2f} ({r['Max DD %']:.2f}%)"
+        item['Recovery Factor'] = "N/A" if pd.isna(r['Recovery Factor']) else f"{r['Recovery Factor']:.2f}"
+        formatted.append(item)
+    return formatted
+
 def get_selected_reports(output_dir):
     """Parse Full_Analysis.html to find which reports are in the Monthly Contributor Breakdown."""
     full_analysis_path = os.path.join(output_dir, "Full_Analysis.html")
@@ -95,7 +235,7 @@ def get_selected_reports(output_dir):
         print(f"Warning: Could not parse Full_Analysis.html for selected reports: {e}")
         return set()
 
-def generate_report(results, output_file, selected_reports=None):
+def generate_report(results, output_file, selected_reports=None, paired=None, charts=None, note=""):
     if selected_reports is None:
         selected_reports = set()
     
@@ -147,6 +287,19 @@ def generate_report(results, output_file, selected_reports=None):
     cols = ['Base Strategy'] + [v for v in all_variants if v in final_df.columns]
     final_df = final_df[cols]
     
+    # Paired differences and overlay charts per strategy (trade data only)
+    details_html = ""
+    if paired or charts:
+        df_paired = pd.DataFrame(paired or [])
+        for base in final_df['Base Strategy']:
+            details_html += f"<h3 class='base-name'>{base}</h3>\n"
+            if not df_paired.empty and base in df_paired['Base'].values:
+                rows = df_paired[df_paired['Base'] == base].drop(columns=['Base'])
+                details_html += rows.to_html(index=False, float_format=lambda v: f"{v:,.2f}", na_rep='N/A', classes='comparison-table') + "\n"
+            if charts and base in charts:
+                rel = os.path.relpath(charts[base], os.path.dirname(output_file)).replace(os.sep, '/')
+                details_html += f"<img src='{rel}' alt='{base}' style='max-width: 100%; margin-top: 10px;'>\n"
+
     html_output = f"""
 <!DOCTYPE html>
 <html>
@@ -167,7 +320,10 @@ def generate_report(results, output_file, selected_reports=None):
 </head>
 <body>
     <h2>Strategy Variant Comparison</h2>
+    {f"<p>{note}</p>" if note else ""}
     {final_df.to_html(index=False, escape=False, classes='comparison-table')}
+    {"<h2>Paired Differences vs. Reference Variant</h2>" if details_html else ""}
+    {details_html}
 </body>
 </html>
 """
@@ -180,27 +336,36 @@ def main():
     args = parse_arguments()
     
     output_dir = os.path.abspath(args.output_dir)
-    html_file = os.path.join(output_dir, 'Short_Analysis.html')
+    paired, charts, note = None, None, ""
 
-    if not os.path.exists(html_file):
-        print(f"Error: {html_file} not found.")
-        return
+    trade_results = None if args.html else compare_from_trades(output_dir, args.base, args.all, args.workers)
+    if trade_results:
+        results, paired, charts = trade_results
+        print(f"Compared {len(charts)} strategies ({len(results)} variants) from {os.path.join(output_dir, 'Trades')}")
+        results = format_trade_metrics(results, args.base)
+        note = "Metrics from Trades/all_trades_*.csv. DD and RF use the closed-trade balance; daily differences are variant minus reference."
+    else:
+        # Fallback: metrics as rendered in Short_Analysis.html
+        html_file = os.path.join(output_dir, 'Short_Analysis.html')
+        if not os.path.exists(html_file):
+            print(f"Error: {html_file} not found.")
+            return
 
-    print(f"Reading: {html_file}")
-    with open(html_file, 'r', encoding='utf-8') as f:
-        html_content = f.read()
+        print(f"Reading: {html_file}")
+        with open(html_file, 'r', encoding='utf-8') as f:
+            html_content = f.read()
 
-    results = extract_metrics(html_content)
-    if not results:
-        print("No metrics found in the report.")
-        return
+        results = extract_metrics(html_content)
+        if not results:
+            print("No metrics found in the report.")
+            return
 
     selected_reports = get_selected_reports(output_dir)
     if selected_reports:
         print(f"Found {len(selected_reports)} selected variations in Full_Analysis.html")
 
     output_file = os.path.join(output_dir, 'compare_report.html')
-    if generate_report(results, output_file, selected_reports):
+    if generate_report(results, output_file, selected_reports, paired, charts, note):
         webbrowser.open(f"file:///{output_file}")
 
 if __name__ == "__main__":
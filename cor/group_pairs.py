@@ -1,6 +1,11 @@
 import csv
-import random
 import os
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+HIGH_COR = 65
+SWAP_BLOCK = 1 << 16
 
 def load_correlation_data(filepath):
     correlations = {}
@@ -53,69 +58,163 @@ def calculate_score(buckets, correlations):
     max_high_cor = max(bucket_high_cor_counts) if bucket_high_cor_counts else 0
     return high_cor_count * 10000 + max_high_cor * 100000 + score
 
-def group_pairs(pairs, correlations, num_buckets=5):
-    best_buckets = None
-    best_score = float('inf')
-    
-    # Try more random restarts for a deeper search
-    for _ in range(100):
-        current_buckets = [[] for _ in range(num_buckets)]
-        pair_list = list(pairs)
-        random.shuffle(pair_list)
-        for i, p in enumerate(pair_list):
-            current_buckets[i % num_buckets].append(p)
-        
-        current_score = calculate_score(current_buckets, correlations)
-        
-        improved = True
-        while improved:
-            improved = False
-            # Randomly shuffle buckets to browse
-            b_indices = list(range(num_buckets))
-            random.shuffle(b_indices)
-            
-            for b_idx in b_indices:
-                if not current_buckets[b_idx]: continue
-                
-                # Randomly shuffle pairs within bucket
-                p_indices = list(range(len(current_buckets[b_idx])))
-                random.shuffle(p_indices)
-                
-                for p_idx in p_indices:
-                    p = current_buckets[b_idx][p_idx]
-                    
-                    target_b_indices = list(range(num_buckets))
-                    random.shuffle(target_b_indices)
-                    
-                    for target_b_idx in target_b_indices:
-                        if b_idx == target_b_idx: continue
-                        
-                        # Move
-                        item = current_buckets[b_idx].pop(p_idx)
-                        current_buckets[target_b_idx].append(item)
-                        new_score = calculate_score(current_buckets, correlations)
-                        
-                        if new_score < current_score:
-                            current_score = new_score
-                            improved = True
-                            break # Found improvement, restart bucket loops
-                        else:
-                            # Move back
-                            current_buckets[target_b_idx].pop()
-                            current_buckets[b_idx].insert(p_idx, item)
-                    if improved: break
-                if improved: break
-        
-        if current_score < best_score:
-            best_score = current_score
-            best_buckets = [list(b) for b in current_buckets]
-            
-    return best_buckets
+def build_matrix(pairs, correlations):
+    """Absolute correlation matrix in pairs order (missing pairs count as 100, diagonal 0)."""
+    index = {p: i for i, p in enumerate(pairs)}
+    n = len(pairs)
+    abs_cor = np.full((n, n), 100.0)
+    for (p1, p2), val in correlations.items():
+        if p1 in index and p2 in index:
+            abs_cor[index[p1], index[p2]] = abs(val)
+    # calculate_score looks up (p1, p2) before (p2, p1), so keep that precedence where both exist
+    for (p1, p2), val in correlations.items():
+        if p1 in index and p2 in index and (p2, p1) not in correlations:
+            abs_cor[index[p2], index[p1]] = abs(val)
+    np.fill_diagonal(abs_cor, 0.0)
+    return abs_cor
+
+def _search(abs_cor, high, num_buckets, rng, balanced=False):
+    """
+    One restart: random round-robin start, then random improving moves/swaps until neither helps.
+    Per-item bucket totals turn every candidate into an O(1) delta, so all moves (and then all
+    swaps) are scored in one vectorized step instead of a full rescore per candidate.
+    balanced: swaps only, so the round-robin bucket sizes are kept.
+    """
+    n = abs_cor.shape[0]
+    k = num_buckets
+    items = np.arange(n)
+    order = rng.permutation(n)
+    assign = np.empty(n, dtype=int)
+    assign[order] = items % k
+
+    # cor_to[p, b] / high_to[p, b]: sum of |cor| and high count between p and the members of bucket b
+    onehot = np.zeros((n, k))
+    onehot[items, assign] = 1.0
+    cor_to = abs_cor @ onehot
+    high_to = high @ onehot
+    bucket_high = np.array([high_to[assign == b, b].sum() / 2 for b in range(k)])
+
+    # others[s, t]: bucket mask without s and t, used for the max high count of untouched buckets
+    others = np.ones((k, k, k), dtype=bool)
+    others[np.arange(k), :, np.arange(k)] = False
+    others[:, np.arange(k), np.arange(k)] = False
+
+    def apply_move(p, src, dst):
+        assign[p] = dst
+        cor_to[:, src] -= abs_cor[:, p]
+        cor_to[:, dst] += abs_cor[:, p]
+        high_to[:, src] -= high[:, p]
+        high_to[:, dst] += high[:, p]
+
+    def delta(d_sum, d_high, src_high, dst_high, s_idx, t_idx, max_high):
+        # Score change = total high * 10000 + max bucket high * 100000 + sum of |cor|
+        rest = np.where(others, bucket_high, -np.inf).max(axis=-1)[s_idx, t_idx]
+        new_max = np.maximum(np.maximum(rest, src_high), dst_high)
+        return d_high * 10000 + (new_max - max_high) * 100000 + d_sum
+
+    while True:
+        own_cor = cor_to[items, assign]
+        own_high = high_to[items, assign]
+        max_high = bucket_high.max(initial=0)
+
+        # Single moves p -> t, shaped (n, k)
+        src = assign[:, None]
+        dst = np.arange(k)[None, :]
+        d = delta(cor_to - own_cor[:, None], high_to - own_high[:, None],
+                  (bucket_high[assign] - own_high)[:, None], bucket_high[None, :] + high_to,
+                  src, dst, max_high)
+        d[items, assign] = np.inf
+        better = np.argwhere(d < -1e-9) if not balanced else []
+        if len(better):
+            p, t = better[rng.integers(len(better))]
+            bucket_high[assign[p]] -= own_high[p]
+            bucket_high[t] += high_to[p, t]
+            apply_move(p, assign[p], t)
+            continue
+
+        # Swaps p <-> q across buckets once no single move helps. Rows are scored in random
+        # blocks of shape (rows, n) so large item counts never build the full n x n grid at once
+        swapped = False
+        perm = rng.permutation(n)
+        block = max(1, SWAP_BLOCK // n)
+        to_q_cor_all = cor_to[:, assign]      # [p, q]: |cor| between p and q's bucket
+        to_q_high_all = high_to[:, assign]
+        for start in range(0, n, block):
+            rows = perm[start:start + block]
+            src, dst = assign[rows][:, None], assign[None, :]
+            src_high = (bucket_high[assign[rows]] - own_high[rows])[:, None] + to_q_high_all[:, rows].T - high[rows]
+            dst_high = (bucket_high[assign] - own_high)[None, :] + to_q_high_all[rows] - high[rows]
+            d = delta(to_q_cor_all[:, rows].T + to_q_cor_all[rows] - own_cor[rows][:, None] - own_cor[None, :] - 2 * abs_cor[rows],
+                      src_high + dst_high - bucket_high[src] - bucket_high[dst],
+                      src_high, dst_high, src, dst, max_high)
+            d[src == dst] = np.inf
+            better = np.argwhere(d < -1e-9)
+            if len(better):
+                r, q = better[rng.integers(len(better))]
+                p = rows[r]
+                s_b, t_b = assign[p], assign[q]
+                bucket_high[s_b], bucket_high[t_b] = src_high[r, q], dst_high[r, q]
+                apply_move(p, s_b, t_b)
+                apply_move(q, t_b, s_b)
+                swapped = True
+                break
+        if not swapped:
+            break
+
+    b_sum = (cor_to[items, assign]).sum() / 2
+    return float(bucket_high.sum() * 10000 + bucket_high.max(initial=0) * 100000 + b_sum), assign.copy()
+
+_WORKER_STATE = {}
+
+def _init_worker(abs_cor, num_buckets, balanced=False):
+    _WORKER_STATE['abs_cor'] = abs_cor
+    _WORKER_STATE['high'] = (abs_cor >= HIGH_COR).astype(float)
+    _WORKER_STATE['num_buckets'] = num_buckets
+    _WORKER_STATE['balanced'] = balanced
+
+def _run_restarts(seeds):
+    best = (float('inf'), None)
+    for seed in seeds:
+        result = _search(_WORKER_STATE['abs_cor'], _WORKER_STATE['high'], _WORKER_STATE['num_buckets'],
+                         np.random.default_rng(seed), _WORKER_STATE['balanced'])
+        if result[0] < best[0]:
+            best = result
+    return best
+
+def group_matrix(abs_cor, num_buckets=5, restarts=100, workers=None, seed=None, balanced=False):
+    """
+    Buckets the items of an absolute correlation matrix to minimize intra-bucket correlation.
+    balanced keeps the bucket sizes within one item of each other (swaps only), for costs that
+    allow piling items into one bucket for free.
+    Returns (score, assignment) where assignment[i] is the bucket index of item i.
+    """
+    abs_cor = np.asarray(abs_cor, dtype=float)
+    if abs_cor.shape[0] == 0:
+        return 0.0, np.empty(0, dtype=int)
+    workers = max(1, min(workers or os.cpu_count() or 1, restarts))
+    seeds = np.random.SeedSequence(seed).spawn(restarts)
+    # One chunk of restarts per worker so the matrix is shipped once per process
+    chunks = [seeds[i::workers] for i in range(workers)]
+
+    if workers == 1:
+        _init_worker(abs_cor, num_buckets, balanced)
+        results = [_run_restarts(seeds)]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(abs_cor, num_buckets, balanced)) as executor:
+            results = list(executor.map(_run_restarts, chunks))
+    # Ties go to the lowest chunk so a fixed seed gives a fixed result regardless of timing
+    return min(results, key=lambda r: r[0])
+
+def group_pairs(pairs, correlations, num_buckets=5, restarts=100, workers=None, seed=None):
+    pairs = list(pairs)
+    _, assign = group_matrix(build_matrix(pairs, correlations), num_buckets, restarts, workers, seed)
+    return [[pairs[i] for i in np.flatnonzero(assign == b)] for b in range(num_buckets)]
 
 def generate_md_report(buckets, correlations, output_path):
     with open(output_path, 'w') as f:
         f.write("# FX Pair Correlation Buckets\n\n")
-        f.write("Pairs grouped into 5 buckets to minimize intra-bucket absolute correlation (Daily).\n\n")
+        f.write(f"Pairs grouped into {len(buckets)} buckets to minimize intra-bucket absolute correlation (Daily).\n\n")
         
         for idx, bucket in enumerate(buckets):
             f.write(f"## Bucket {idx + 1}\n\n")
@@ -146,10 +245,22 @@ def generate_md_report(buckets, correlations, output_path):
 
             f.write("\n")
 
+def main():
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description="Group FX pairs into low-correlation buckets.")
+    parser.add_argument("--csv", default=os.path.join(script_dir, "correlation.csv"), help="Correlation table (mataf.net CSV format).")
+    parser.add_argument("--out", default=os.path.join(script_dir, "buckets_report.md"), help="Markdown report path.")
+    parser.add_argument("--buckets", type=int, default=5, help="Number of buckets (default: 5).")
+    parser.add_argument("--restarts", type=int, default=100, help="Random restarts (default: 100).")
+    parser.add_argument("--workers", type=int, help="Worker processes (default: CPU count).")
+    parser.add_argument("--seed", type=int, help="Seed for reproducible buckets.")
+    args = parser.parse_args()
+
+    pairs, correlations = load_correlation_data(args.csv)
+    final_buckets = group_pairs(pairs, correlations, args.buckets, args.restarts, args.workers, args.seed)
+    print(f"Score: {calculate_score(final_buckets, correlations):,.1f}")
+    generate_md_report(final_buckets, correlations, args.out)
+    print(f"Report generated at {args.out}")
+
 if __name__ == "__main__":
-    csv_path = r'd:\Trading\MT5Enhance\cor\correlation.csv'
-    report_path = r'd:\Trading\MT5Enhance\cor\buckets_report.md'
-    pairs, correlations = load_correlation_data(csv_path)
-    final_buckets = group_pairs(pairs, correlations)
-    generate_md_report(final_buckets, correlations, report_path)
-    print(f"Report generated at {report_path}")
+    main()
@@ -0,0 +1,205 @@
+import os
+import re
+import glob
+import argparse
+from datetime import datetime, timezone
+import numpy as np
+import pandas as pd
+
+# Market convention for naming crosses: the currency listed first is the base
+CURRENCY_PRIORITY = ['EUR', 'GBP', 'AUD', 'NZD', 'USD', 'CAD', 'CHF', 'JPY']
+
+def _symbol_from_filename(path):
+    stem = os.path.splitext(os.path.basename(path))[0].upper()
+    match = re.match(r'([A-Z]{6})', stem)
+    return match.group(1) if match else stem
+
+def _pick_column(columns, candidates):
+    lookup = {str(c).strip('<>').strip().lower(): c for c in columns}
+    for cand in candidates:
+        if cand in lookup:
+            return lookup[cand]
+    return None
+
+def load_close_file(path):
+    """Daily close series from a prices/ CSV (Date, Price), an OHLC CSV (MT5 <DATE>/<CLOSE> or Date/Close) or parquet."""
+    if path.lower().endswith('.parquet'):
+        df = pd.read_parquet(path)
+        # Parquet files may keep the dates as their index
+        if isinstance(df.index, pd.DatetimeIndex):
+            df = df.reset_index()
+    else:
+        df = pd.read_csv(path, sep=None, engine='python')
+
+    date_col = _pick_column(df.columns, ['date', 'datetime', 'time', 'index'])
+    close_col = _pick_column(df.columns, ['price', 'close', 'adj close'])
+    if date_col is None or close_col is None:
+        return None
+
+    dates = pd.to_datetime(df[date_col], errors='coerce')
+    closes = pd.to_numeric(df[close_col], errors='coerce')
+    series = pd.Series(closes.values, index=dates).dropna()
+    series = series[series.index.notna() & (series > 0)]
+    if series.empty:
+        return None
+    # One close per calendar day (intraday files collapse to their last bar)
+    series.index = series.index.normalize()
+    return series.groupby(level=0).last()
+
+def load_closes(folder):
+    """Loads every price file in folder into a Date x Symbol frame of daily closes."""
+    files = sorted(glob.glob(os.path.join(folder, "*.csv")) + glob.glob(os.path.join(folder, "*.parquet")))
+    closes = {}
+    for path in files:
+        try:
+            series = load_close_file(path)
+        except Exception as e:
+            print(f"Warning: Could not read {path}: {e}")
+            continue
+        if series is None:
+            print(f"Warning: No date/close columns in {os.path.basename(path)}, skipping.")
+            continue
+        closes[_symbol_from_filename(path)] = series
+    if not closes:
+        return pd.DataFrame()
+    return pd.DataFrame(closes).sort_index()
+
+def derive_crosses(closes):
+    """Adds crosses of the major currencies that can be built from available USD legs (e.g. EURJPY = EURUSD * USDJPY)."""
+    usd_value = {}
+    for sym in closes.columns:
+        if len(sym) != 6:
+            continue
+        base, quote = sym[:3], sym[3:]
+        if quote == 'USD':
+            usd_value[base] = closes[sym]
+        elif base == 'USD':
+            usd_value[quote] = 1.0 / closes[sym]
+
+    derived = {}
+    ccys = sorted(usd_value, key=lambda c: CURRENCY_PRIORITY.index(c) if c in CURRENCY_PRIORITY else len(CURRENCY_PRIORITY))
+    for i, base in enumerate(ccys):
+        for quote in ccys[i + 1:]:
+            sym = base + quote
+            if sym not in closes.columns and quote + base not in closes.columns:
+                derived[sym] = usd_value[base] / usd_value[quote]
+    if not derived:
+        return closes
+    return pd.concat([closes, pd.DataFrame(derived)], axis=1)
+
+def log_returns(closes):
+    return np.log(closes).diff().iloc[1:]
+
+def correlation_matrix(returns, min_periods=10):
+    """
+    Pairwise-complete Pearson correlation of all columns at once via masked moment sums.
+    Returns a symbols x symbols DataFrame (NaN where fewer than min_periods overlapping returns).
+    """
+    x = returns.to_numpy(dtype=float)
+    mask = ~np.isnan(x)
+    x = np.where(mask, x, 0.0)
+    m = mask.astype(float)
+
+    n = m.T @ m
+    sx = x.T @ m                       # sum of x_i over rows where both i and j exist
+    sxx = (x * x).T @ m
+    sxy = x.T @ x
+    cov = n * sxy - sx * sx.T
+    var = (n * sxx - sx * sx) * (n * sxx - sx * sx).T
+    with np.errstate(invalid='ignore', divide='ignore'):
+        corr = cov / np.sqrt(var)
+    corr[(n < min_periods) | ~np.isfinite(corr)] = np.nan
+    np.fill_diagonal(corr, 1.0)
+    return pd.DataFrame(np.clip(corr, -1.0, 1.0), index=returns.columns, columns=returns.columns)
+
+def rolling_correlation(returns, window, min_periods=None):
+    """
+    Rolling pairwise correlation for every pair, vectorized through cumulative moment sums.
+    Returns a (Date, pair1, pair2) indexed Series of upper-triangle pairs.
+    """
+    min_periods = min_periods or window
+    x = returns.to_numpy(dtype=float)
+    mask = ~np.isnan(x)
+    x = np.where(mask, x, 0.0)
+    m = mask.astype(float)
+    t_len, k = x.shape
+
+    def windowed(a):
+        # Trailing window sums along time of a (T, k, k) moment tensor
+        c = np.cumsum(a, axis=0)
+        c[window:] = c[window:] - c[:-window]
+        return c
+
+    n = windowed(m[:, :, None] * m[:, None, :])
+    sx = windowed(x[:, :, None] * m[:, None, :])
+    sxx = windowed((x * x)[:, :, None] * m[:, None, :])
+    sxy = windowed(x[:, :, None] * x[:, None, :])
+    cov = n * sxy - sx * np.swapaxes(sx, 1, 2)
+    var_i = n * sxx - sx * sx
+    with np.errstate(invalid='ignore', divide='ignore'):
+        corr = cov / np.sqrt(var_i * np.swapaxes(var_i, 1, 2))
+    corr[(n < min_periods) | ~np.isfinite(corr)] = np.nan
+
+    iu, ju = np.triu_indices(k, 1)
+    symbols = list(returns.columns)
+    index = pd.MultiIndex.from_arrays([
+        np.repeat(returns.index.values, len(iu)),
+        np.tile([symbols[i] for i in iu], t_len),
+        np.tile([symbols[j] for j in ju], t_len),
+    ], names=['Date', 'pair1', 'pair2'])
+    return pd.Series(np.clip(corr[:, iu, ju], -1.0, 1.0).ravel(), index=index, name='corr').dropna()
+
+def write_mataf_csv(output_path, day_corr, week_corr=None, window=50):
+    """Writes the mataf.net table layout that group_pairs.load_correlation_data reads (values in %)."""
+    symbols = list(day_corr.columns)
+    fmt = lambda v: "" if pd.isna(v) else f"{v * 100:.1f}"
+    with open(output_path, 'w', newline='') as f:
+        f.write(f"Correlation Table - {window} periods\n")
+        f.write("Computed locally from daily closes\n")
+        f.write(datetime.now(timezone.utc).strftime("%a, %d %b %Y %H:%M:%S +0000") + "\n")
+        f.write("pair1,pair2,5min,15min,1h,4h,day,week\n")
+        for i, p1 in enumerate(symbols):
+            for p2 in symbols[i:]:
+                day_v = day_corr.loc[p1, p2]
+                if pd.isna(day_v):
+                    continue
+                week_v = week_corr.loc[p1, p2] if week_corr is not None and p1 in week_corr.index and p2 in week_corr.columns else np.nan
+                f.write(f"{p1},{p2},,,,,{fmt(day_v)},{fmt(week_v)}\n")
+
+def main():
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description="Compute pairwise FX correlations from local daily closes.")
+    parser.add_argument("prices_dir", help="Folder of price files (e.g. analysis/output_*/prices or a folder of OHLC CSVs).")
+    parser.add_argument("--window", type=int, default=50, help="Number of most recent returns per correlation (default: 50, like mataf).")
+    parser.add_argument("--min-periods", type=int, default=10, help="Minimum overlapping returns for a pair (default: 10).")
+    parser.add_argument("--crosses", action="store_true", help="Derive missing major crosses from the USD legs.")
+    parser.add_argument("--out", default=os.path.join(script_dir, "correlation.csv"), help="Output CSV in mataf format.")
+    parser.add_argument("--rolling", type=int, help="Also write rolling correlations with this window (days).")
+    parser.add_argument("--rolling-out", help="Rolling output CSV (default: <out>_rolling_<window>.csv).")
+    args = parser.parse_args()
+
+    closes = load_closes(args.prices_dir)
+    if closes.empty:
+        print(f"No usable price files found in {args.prices_dir}")
+        return
+    if args.crosses:
+        closes = derive_crosses(closes)
+    closes = closes.reindex(sorted(closes.columns), axis=1)
+    print(f"Loaded {closes.shape[1]} symbols, {closes.index.min().date()} to {closes.index.max().date()}")
+
+    returns = log_returns(closes)
+    day_corr = correlation_matrix(returns.tail(args.window), args.min_periods)
+    week_returns = log_returns(closes.resample('W-FRI').last())
+    week_corr = correlation_matrix(week_returns.tail(args.window), args.min_periods)
+
+    write_mataf_csv(args.out, day_corr, week_corr, args.window)
+    print(f"Correlation table saved to: {args.out}")
+
+    if args.rolling:
+        rolling = rolling_correlation(returns, args.rolling)
+        rolling_path = args.rolling_out or f"{os.path.splitext(args.out)[0]}_rolling_{args.rolling}.csv"
+        (rolling * 100).round(1).to_csv(rolling_path)
+        print(f"Rolling correlations saved to: {rolling_path}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+import os
+import sys
+import argparse
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from group_pairs import group_matrix, HIGH_COR
+from price_correlation import correlation_matrix
+
+def included_reports(output_dir, include_all=False):
+    """Report basenames from report_list.csv (Include == 1 unless include_all)."""
+    report_list_path = os.path.join(output_dir, "report_list.csv")
+    df_list = pd.read_csv(report_list_path)
+    if not include_all and 'Include' in df_list.columns:
+        df_list = df_list[df_list['Include'] == 1]
+    return [os.path.splitext(os.path.basename(fp))[0] for fp in df_list['FilePath']]
+
+def load_daily_series(trades_folder, basename, base=100000.0):
+    """Daily net PnL and daily max DD (from the closed-trade balance, as in analyze.py) for one report."""
+    path = os.path.join(trades_folder, f"all_trades_{basename}.csv")
+    if not os.path.exists(path):
+        return None, None
+    df = pd.read_csv(path, usecols=lambda c: c in ('Time', 'Type', 'Profit', 'Commission', 'Swap'))
+    if 'Type' in df.columns:
+        df = df[df['Type'].astype(str).str.lower() != 'balance']
+    if df.empty:
+        return None, None
+
+    df['Time'] = pd.to_datetime(df['Time'])
+    df = df.sort_values('Time')
+    pnl = df['Profit'].fillna(0) + df['Commission'].fillna(0) + df['Swap'].fillna(0)
+    day = df['Time'].dt.normalize()
+
+    balance = pnl.cumsum() + base
+    dd = balance - balance.expanding().max()
+    return pnl.groupby(day).sum(), dd.groupby(day).min()
+
+def build_daily_frames(output_dir, reports, base=100000.0, start=None, end=None):
+    """Date x Report frames of daily PnL (0 on idle days) and daily DD (carried while underwater)."""
+    trades_folder = os.path.join(output_dir, "Trades")
+    pnl_cols, dd_cols = {}, {}
+    for basename in reports:
+        pnl, dd = load_daily_series(trades_folder, basename, base)
+        if pnl is None:
+            print(f"  Warning: No trades for {basename}, skipping.")
+            continue
+        pnl_cols[basename] = pnl
+        dd_cols[basename] = dd
+    if not pnl_cols:
+        return pd.DataFrame(), pd.DataFrame()
+
+    df_pnl = pd.DataFrame(pnl_cols).sort_index()
+    df_dd = pd.DataFrame(dd_cols).sort_index()
+    calendar = pd.date_range(df_pnl.index.min(), df_pnl.index.max(), freq='D')
+    if start:
+        calendar = calendar[calendar >= pd.Timestamp(start)]
+    if end:
+        calendar = calendar[calendar <= pd.Timestamp(end)]
+    df_pnl = df_pnl.reindex(calendar).fillna(0.0)
+    # A report stays in its drawdown until the next deal moves it; before its first deal it is flat
+    df_dd = df_dd.reindex(calendar).ffill().fillna(0.0)
+    return df_pnl, df_dd
+
+def co_movement(corr_pnl, corr_dd, metric='both'):
+    """
+    Bucketing cost in percent: only positive correlation is penalized, since strategies that
+    move against each other offset drawdowns rather than stack them. Such a cost can be zero for a
+    whole bucket, so the search keeps the bucket sizes balanced (group_matrix balanced=True).
+    """
+    if metric == 'pnl':
+        blended = corr_pnl
+    elif metric == 'dd':
+        blended = corr_dd
+    else:
+        blended = (corr_pnl + corr_dd) / 2
+    cost = np.clip(np.nan_to_num(blended.to_numpy(), nan=0.0), 0, None) * 100
+    np.fill_diagonal(cost, 0.0)
+    return cost
+
+def generate_md_report(buckets, corr_pnl, corr_dd, df_pnl, df_dd, output_path, metric, max_matrix=15):
+    with open(output_path, 'w') as f:
+        f.write("# Strategy Correlation Buckets\n\n")
+        f.write(f"{corr_pnl.shape[0]} reports grouped into {len(buckets)} buckets to minimize intra-bucket co-movement "
+                f"(metric: daily {'PnL and DD' if metric == 'both' else metric.upper()}, {len(df_pnl)} days).\n\n")
+
+        f.write("| Bucket | Reports | Net PnL | Max Daily DD Sum | Mean Intra PnL Cor | Mean Intra DD Cor |\n")
+        f.write("|---|---|---|---|---|---|\n")
+        for idx, bucket in enumerate(buckets):
+            iu = np.triu_indices(len(bucket), 1)
+            with np.errstate(all='ignore'):
+                mean_pnl = np.nanmean(corr_pnl.loc[bucket, bucket].to_numpy()[iu]) * 100 if len(bucket) > 1 else np.nan
+                mean_dd = np.nanmean(corr_dd.loc[bucket, bucket].to_numpy()[iu]) * 100 if len(bucket) > 1 else np.nan
+            mean_pnl = "N/A" if np.isnan(mean_pnl) else f"{mean_pnl:.1f}"
+            mean_dd = "N/A" if np.isnan(mean_dd) else f"{mean_dd:.1f}"
+            f.write(f"| {idx + 1} | {len(bucket)} | {df_pnl[bucket].to_numpy().sum():,.2f} | "
+                    f"{df_dd[bucket].sum(axis=1).min():,.2f} | {mean_pnl} | {mean_dd} |\n")
+        f.write("\n")
+
+        for idx, bucket in enumerate(buckets):
+            f.write(f"## Bucket {idx + 1}\n\n")
+            if len(bucket) > max_matrix:
+                # Large buckets: one line per report with its worst partner instead of a full matrix
+                f.write("| Report | Most Correlated (PnL) | Cor |\n|---|---|---|\n")
+                sub = corr_pnl.loc[bucket, bucket].to_numpy(copy=True)
+                np.fill_diagonal(sub, np.nan)
+                for r_i, rep in enumerate(bucket):
+                    row = sub[r_i]
+                    if np.all(np.isnan(row)):
+                        f.write(f"| {rep} | N/A | N/A |\n")
+                        continue
+                    j = int(np.nanargmax(row))
+                    val = row[j] * 100
+                    val_str = f'<span style="color:red">**{val:.1f}**</span>' if val >= HIGH_COR else f"{val:.1f}"
+                    f.write(f"| {rep} | {bucket[j]} | {val_str} |\n")
+                f.write("\n")
+                continue
+
+            f.write("Daily PnL correlation:\n\n")
+            f.write("| | " + " | ".join(bucket) + " |\n")
+            f.write("|---" + "|---" * len(bucket) + "|\n")
+            for p1 in bucket:
+                row = [p1]
+                for p2 in bucket:
+                    if p1 == p2:
+                        row.append("100")
+                        continue
+                    val = corr_pnl.loc[p1, p2]
+                    if pd.isna(val):
+                        row.append("N/A")
+                    elif val * 100 >= HIGH_COR:
+                        row.append(f'<span style="color:red">**{val * 100:.1f}**</span>')
+                    else:
+                        row.append(f"{val * 100:.1f}")
+                f.write("| " + " | ".join(row) + " |\n")
+            f.write("\n")
+
+def main():
+    parser = argparse.ArgumentParser(description="Group strategies into sub-portfolios with low daily PnL/DD correlation.")
+    parser.add_argument("output_dir", help="Path to the output folder (analysis/output_*) with report_list.csv and Trades/.")
+    parser.add_argument("--buckets", type=int, default=5, help="Number of sub-portfolios (default: 5).")
+    parser.add_argument("--metric", choices=['both', 'pnl', 'dd'], default='both', help="Correlation used for bucketing (default: both).")
+    parser.add_argument("--start", help="Start date (YYYY-MM-DD).")
+    parser.add_argument("--end", help="End date (YYYY-MM-DD).")
+    parser.add_argument("--base", type=float, default=100000.0, help="Base capital (default: 100,000).")
+    parser.add_argument("--min-periods", type=int, default=20, help="Minimum overlapping days for a correlation (default: 20).")
+    parser.add_argument("--all", action="store_true", help="Include reports with Include = 0.")
+    parser.add_argument("--restarts", type=int, default=100, help="Random restarts (default: 100).")
+    parser.add_argument("--workers", type=int, help="Worker processes (default: CPU count).")
+    parser.add_argument("--seed", type=int, help="Seed for reproducible buckets.")
+    args = parser.parse_args()
+
+    output_dir = os.path.abspath(args.output_dir)
+    reports = included_reports(output_dir, args.all)
+    print(f"Loading daily PnL/DD for {len(reports)} reports...")
+    df_pnl, df_dd = build_daily_frames(output_dir, reports, args.base, args.start, args.end)
+    if df_pnl.shape[1] < 2:
+        print("Need at least two reports with trades to build buckets.")
+        return
+
+    corr_pnl = correlation_matrix(df_pnl, args.min_periods)
+    corr_dd = correlation_matrix(df_dd, args.min_periods)
+    names = list(df_pnl.columns)
+    num_buckets = min(args.buckets, len(names))
+
+    score, assign = group_matrix(co_movement(corr_pnl, corr_dd, args.metric), num_buckets,
+                                 args.restarts, args.workers, args.seed, balanced=True)
+    buckets = [[names[i] for i in np.flatnonzero(assign == b)] for b in range(num_buckets)]
+    print(f"Score: {score:,.1f}")
+
+    pd.DataFrame({'Report': names, 'Bucket': assign + 1}).sort_values(['Bucket', 'Report']).to_csv(
+        os.path.join(output_dir, "strategy_buckets.csv"), index=False)
+    (corr_pnl * 100).round(1).to_csv(os.path.join(output_dir, "strategy_correlation_pnl.csv"))
+    (corr_dd * 100).round(1).to_csv(os.path.join(output_dir, "strategy_correlation_dd.csv"))
+    report_path = os.path.join(output_dir, "strategy_buckets.md")
+    generate_md_report(buckets, corr_pnl, corr_dd, df_pnl, df_dd, report_path, args.metric)
+    print(f"Report generated at {report_path}")
+    print(f"Assignment saved to: {os.path.join(output_dir, 'strategy_buckets.csv')}")
+
+if __name__ == "__main__":
+    main()
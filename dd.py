@@ -1,11 +1,13 @@
 import pandas as pd
 import os
-import glob
 import argparse
 from datetime import datetime
 import numpy as np
 import math
 import re
+import grid
+import artifacts
+from prices import load_price_folder
 
 def parse_set_file(set_path):
     """Reads .set file and extracts target parameters."""
@@ -49,21 +51,6 @@ def parse_set_file(set_path):
                         results[target_params[key]] = clean_val
     return results
 
-def load_fx_rates(prices_dir):
-    """Loads daily FX closing prices from the prices/ folder."""
-    rates = {}
-    if os.path.exists(prices_dir):
-        files = glob.glob(os.path.join(prices_dir, "*.csv"))
-        for f in files:
-            s = os.path.splitext(os.path.basename(f))[0].upper()
-            try:
-                rdf = pd.read_csv(f)
-                rdf['Date'] = pd.to_datetime(rdf['Date']).dt.date
-                rdf.set_index('Date', inplace=True)
-                rates[s] = rdf
-            except: pass
-    return rates
-
 def get_usd_conv_factor(symbol, target_date, fx_rates):
     """Calculates conversion factor to USD based on the quote currency."""
     clean_symbol = symbol.split('.')[0].split('_')[0]
@@ -135,15 +122,310 @@ def extract_symbol_from_html(html_path):
         pass
     return None
 
+def parse_sweep_values(spec, cast=float):
+    """Parses 'start:stop:step' (inclusive) or 'a,b,c' into a sorted array of values."""
+    spec = spec.strip()
+    if ':' in spec:
+        parts = [float(x) for x in spec.split(':')]
+        if len(parts) != 3 or parts[2] <= 0:
+            raise ValueError(f"Invalid range '{spec}'. Use start:stop:step with a positive step.")
+        start, stop, step = parts
+        values = np.arange(start, stop + step / 2, step).round(10)
+    else:
+        values = np.array([float(x) for x in spec.split(',') if x.strip()])
+    values = np.unique(values.astype(cast))
+    if values.size == 0:
+        raise ValueError(f"No values in '{spec}'.")
+    return values
+
+def run_sweep(args, output_dir, basename, base_values, s_max_lot, s_pipstep, point, fx_factor):
+    """Evaluates the DD ladder and 1k breach over the Cartesian product of the swept parameters."""
+    sweep_specs = {
+        'LotSize': (args.sweep_lot, float),
+        'LotSizeExponent': (args.sweep_lotexp, float),
+        'PipStep': (args.sweep_pipstep, float),
+        'PipStepExponent': (args.sweep_pipstepexp, float),
+        'MaxPipStep': (args.sweep_maxpipstep, float),
+        'LiveDelay': (args.sweep_livedelay, int),
+    }
+    axes = {}
+    for name, (spec, cast) in sweep_specs.items():
+        axes[name] = parse_sweep_values(spec, cast) if spec else np.array([base_values[name]], dtype=cast)
+
+    total = int(np.prod([len(v) for v in axes.values()]))
+    print(f"\nSweeping {total:,} parameter combinations:")
+    for name, vals in axes.items():
+        print(f" - {name}: {len(vals)} value(s) [{vals.min()} .. {vals.max()}]")
+
+    # Cartesian product as flat columns
+    mesh = np.meshgrid(*axes.values(), indexing='ij')
+    cube = {name: m.ravel() for name, m in zip(axes.keys(), mesh)}
+
+    eff_max = grid.effective_max_pipstep(cube['PipStep'], s_pipstep, cube['MaxPipStep'])
+    dd_usd, gap_pips, _, open_lots = grid.theoretical_ladder(
+        cube['LotSize'], cube['LotSizeExponent'], s_max_lot,
+        cube['PipStep'], cube['PipStepExponent'], eff_max, cube['LiveDelay'],
+        point, fx_factor)
+    # 1k breach plus one gap column per extra --thresholds value, all from one searchsorted pass
+    thresholds = np.union1d(grid.parse_thresholds(args.thresholds), [grid.DEFAULT_THRESHOLD])
+    b_level, b_gap, b_lots = grid.breach_table(dd_usd, gap_pips, open_lots, thresholds)
+    k1_col = int(np.searchsorted(thresholds, grid.DEFAULT_THRESHOLD))
+
+    cube['EffectiveMaxPipStep'] = eff_max
+    cube['BreachLevel'] = b_level[:, k1_col]
+    cube['BreachGap'] = b_gap[:, k1_col]
+    cube['BreachLots'] = b_lots[:, k1_col]
+    extra_cols = []
+    for t_i, t_val in enumerate(thresholds):
+        if t_i != k1_col:
+            cube[f'BreachGap_{t_val:g}'] = b_gap[:, t_i]
+            extra_cols.append(f'BreachGap_{t_val:g}')
+    for i in range(grid.LEVELS):
+        cube[f'DD{i+1}'] = dd_usd[:, i]
+    for i in range(grid.LEVELS):
+        cube[f'Gap{i+1}'] = gap_pips[:, i]
+    df_cube = pd.DataFrame(cube)
+
+    sweep_dir = args.sweep_out or os.path.join(output_dir, "sweep")
+    os.makedirs(sweep_dir, exist_ok=True)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    stem = os.path.join(sweep_dir, f"dd_cube_{basename}_{timestamp}")
+    try:
+        df_cube.to_parquet(f"{stem}.parquet", index=False)
+        print(f"Cube saved to: {stem}.parquet")
+    except Exception as e:
+        print(f"Warning: Could not write parquet ({e}).")
+    # CSV keeps the summary columns only; the full ladder (DD1..DD20, Gap1..Gap20) lives in the parquet
+    summary_cols = list(axes.keys()) + ['EffectiveMaxPipStep', 'BreachLevel', 'BreachGap', 'BreachLots'] + extra_cols + [f'DD{grid.LEVELS}']
+    df_cube[summary_cols].to_csv(f"{stem}.csv", index=False, float_format='%.6g')
+    print(f"Cube summary saved to: {stem}.csv")
+
+    breached = df_cube['BreachLevel'] > 0
+    print(f"1k breach reached in {breached.sum():,} of {total:,} combinations.")
+
+    # Heatmap slices: worst case (min breach gap) over the non-plotted parameters
+    x_name, y_name = [x.strip() for x in args.heatmap.split(',')]
+    if x_name not in axes or y_name not in axes:
+        print(f"Warning: Unknown heatmap axes '{args.heatmap}'. Choose from {', '.join(axes)}.")
+        return
+    if len(axes[x_name]) < 2 or len(axes[y_name]) < 2:
+        print(f"Skipping heatmaps: {x_name} and {y_name} both need more than one value.")
+        return
+
+    slice_names = [n for n in axes if n not in (x_name, y_name) and len(axes[n]) > 1]
+    slice_name = args.heatmap_slice if args.heatmap_slice in slice_names else (slice_names[0] if slice_names else None)
+    slice_values = axes[slice_name] if slice_name else [None]
+
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    for s_val in slice_values:
+        df_slice = df_cube if slice_name is None else df_cube[df_cube[slice_name] == s_val]
+        heat = df_slice.pivot_table(index=y_name, columns=x_name, values='BreachGap', aggfunc='min', dropna=False)
+
+        fig, ax = plt.subplots(figsize=(12, 8))
+        im = ax.imshow(heat.values, origin='lower', aspect='auto', cmap='RdYlGn')
+        ax.set_xticks(range(len(heat.columns)))
+        ax.set_xticklabels([f"{v:g}" for v in heat.columns], rotation=45, ha='right')
+        ax.set_yticks(range(len(heat.index)))
+        ax.set_yticklabels([f"{v:g}" for v in heat.index])
+        ax.set_xlabel(x_name)
+        ax.set_ylabel(y_name)
+        title = f"1k Breach Pip Gap (worst case) - {basename}"
+        if slice_name is not None:
+            title += f" | {slice_name} = {s_val:g}"
+        ax.set_title(title, fontsize=12)
+        fig.colorbar(im, ax=ax, label='Pip Gap at $1,000 DD')
+        if heat.size <= 400:
+            for (r, c), v in np.ndenumerate(heat.values):
+                if not np.isnan(v):
+                    ax.text(c, r, f"{v:.0f}", ha='center', va='center', fontsize=7)
+
+        suffix = f"_{slice_name}_{s_val:g}" if slice_name is not None else ""
+        heat_path = f"{stem}_heat_{x_name}_{y_name}{suffix}.png"
+        plt.tight_layout()
+        plt.savefig(heat_path)
+        plt.close(fig)
+        print(f"Heatmap saved to: {heat_path}")
+
+def collect_solver_inputs(output_dir):
+    """Builds one grid-model row per report (set params, symbol, base pip gap, USD factor) for the inverse solver."""
+    trades_dir = os.path.join(output_dir, "Trades")
+    report_list_path = os.path.join(output_dir, "report_list.csv")
+    fx_rates = load_price_folder(os.path.join(output_dir, "prices"))
+
+    basenames = []
+    if os.path.exists(report_list_path):
+        try:
+            df_rl = pd.read_csv(report_list_path)
+            basenames = [os.path.splitext(os.path.basename(fp))[0] for fp in df_rl['FilePath']]
+        except Exception as e:
+            print(f"Warning: Could not read {report_list_path}: {e}")
+    run_index = artifacts.get_run_index(output_dir)
+    if not basenames:
+        basenames = run_index.names('set')
+
+    rows = []
+    for basename in basenames:
+        set_path = run_index.get(basename, 'set')
+        params = parse_set_file(set_path) if set_path else None
+        if not params:
+            print(f"  Warning: .set file not found for {basename}")
+            continue
+        try:
+            s_lot = float(params.get('LotSize', 0))
+            s_pipstep = float(params.get('PipStep', 0))
+            s_maxpipstep = float(params.get('MaxPipStep', 0))
+            row = {
+                'Report': basename,
+                'LotSize': s_lot,
+                'LotSizeExponent': float(params.get('LotSizeExponent', 1)),
+                'MaxLots': float(params.get('MaxLots', 999)),
+                'SetPipStep': s_pipstep,
+                'PipStepExponent': float(params.get('PipStepExponent', 1)),
+                'MaxPipStep': s_maxpipstep,
+                'LiveDelay': int(params.get('LiveDelay', 0)),
+            }
+        except ValueError as e:
+            print(f"  Warning: Invalid parameters in {basename}.set: {e}")
+            continue
+        if s_pipstep == 0 or s_lot <= 0:
+            continue
+        if s_pipstep > 0 and s_maxpipstep < 0:
+            print(f"  Info: Skipping {basename} (MaxPipStep < 0 while PipStep > 0)")
+            continue
+
+        symbol = None
+        last_date = datetime.now().date()
+        first_gaps = []
+        trades_path = os.path.join(trades_dir, f"all_trades_{basename}.csv")
+        if os.path.exists(trades_path):
+            try:
+                df_at = pd.read_csv(trades_path)
+                if not df_at.empty:
+                    df_at['Time'] = pd.to_datetime(df_at['Time'])
+                    last_date = df_at['Time'].max().date()
+                    valid_symbols = df_at['Symbol'].dropna() if 'Symbol' in df_at.columns else pd.Series(dtype=str)
+                    valid_symbols = valid_symbols[valid_symbols.astype(str).str.strip() != ""]
+                    if not valid_symbols.empty:
+                        symbol = str(valid_symbols.iloc[0]).upper()
+                    if 'SequenceNumber' in df_at.columns:
+                        ins = df_at[df_at['Direction'].astype(str).str.lower() == 'in'].sort_values('Time')
+                        first_two = ins[ins['SequenceNumber'] > 0].groupby('SequenceNumber')['Price'].head(2)
+                        first_two = ins.loc[first_two.index].groupby('SequenceNumber')['Price']
+                        first_gaps = [abs(p.iloc[1] - p.iloc[0]) for _, p in first_two if len(p) >= 2]
+            except Exception as e:
+                print(f"  Warning: Could not read trades for {basename}: {e}")
+        if not symbol:
+            symbol = next((p.upper() for p in basename.split('_') if len(p) == 6), "EURUSD")
+        point = 0.01 if "JPY" in symbol else 0.0001
+
+        # Base pip gap: fixed PipStep, or the mean first gap for dynamic (negative) PipStep
+        if s_pipstep > 0:
+            base_gap = s_pipstep
+        elif first_gaps:
+            base_gap = float(np.mean(first_gaps)) / point
+        else:
+            print(f"  Info: Skipping {basename} (dynamic PipStep without trade data)")
+            continue
+
+        row.update({
+            'Symbol': symbol,
+            'Point': point,
+            'FX_Factor': get_usd_conv_factor(symbol, last_date, fx_rates),
+            'PipStep': base_gap,
+        })
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+def run_solver(df_inputs, budget, moves, out_dir):
+    """Solves max safe starting lot and min base pip gap for every report and adverse move at once."""
+    if df_inputs.empty:
+        print("No reports with usable grid parameters for the solver.")
+        return
+
+    col = lambda c: df_inputs[c].to_numpy(dtype=float)[:, None]
+    moves = np.asarray(moves, dtype=float)[None, :]
+    max_lot = grid.solve_max_lot(budget, moves, col('LotSizeExponent'), col('MaxLots'), col('PipStep'),
+                                 col('PipStepExponent'), col('SetPipStep'), col('MaxPipStep'),
+                                 col('LiveDelay'), col('Point'), col('FX_Factor'))
+    min_gap = grid.solve_min_pipstep(budget, moves, col('LotSize'), col('LotSizeExponent'), col('MaxLots'),
+                                     col('PipStepExponent'), col('SetPipStep'), col('MaxPipStep'),
+                                     col('LiveDelay'), col('Point'), col('FX_Factor'))
+    # Lots are traded in 0.01 steps, so round the safe lot down
+    max_lot_step = np.floor(max_lot * 100 + 1e-9) / 100
+
+    df_out = df_inputs[['Report', 'Symbol', 'LotSize', 'PipStep', 'FX_Factor']].copy()
+    for m_idx, move in enumerate(moves[0]):
+        df_out[f'MaxLot@{move:g}'] = max_lot_step[:, m_idx]
+        df_out[f'MinPipStep@{move:g}'] = min_gap[:, m_idx]
+
+    print(f"\nInverse Solver: DD budget ${budget:,.2f}")
+    print("=" * 110)
+    header = f"{'Report':<36} | {'Lot':<6} | {'PipStep':<8}"
+    for move in moves[0]:
+        header += f" | {f'{move:g}p Lot/Gap':<16}"
+    print(header)
+    print("-" * 110)
+    for r_idx, row in df_inputs.iterrows():
+        line = f"{row['Report'][:36]:<36} | {row['LotSize']:<6g} | {row['PipStep']:<8.1f}"
+        for m_idx in range(moves.shape[1]):
+            lot_v = max_lot_step[r_idx, m_idx]
+            gap_v = min_gap[r_idx, m_idx]
+            gap_str = f"{gap_v:.1f}" if not np.isnan(gap_v) else "N/A"
+            line += f" | {f'{lot_v:.2f} / {gap_str}':<16}"
+        print(line)
+    print("=" * 110)
+    print("Lot: max starting LotSize at the base pip gap. Gap: min base pip gap at the set LotSize (N/A = budget exceeded at any gap).")
+
+    os.makedirs(out_dir, exist_ok=True)
+    out_path = os.path.join(out_dir, f"dd_solve_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv")
+    df_out.to_csv(out_path, index=False)
+    print(f"Solver results saved to: {out_path}")
+
 def main():
     parser = argparse.ArgumentParser(description="Estimate Drawdown based on grid parameters.")
     parser.add_argument("--dir", required=True, help="Full path to the output directory.")
-    parser.add_argument("--file", required=True, help="Base name of the report/set file (e.g. ADX_BB_GBPAUD_9_3696).")
+    parser.add_argument("--file", help="Base name of the report/set file (e.g. ADX_BB_GBPAUD_9_3696). Optional with --solve (all reports).")
     parser.add_argument("--date", help="Date to analyze (YYYY-MM-DD). If omitted, finds the max gap day.")
     parser.add_argument("--lot", type=float, help="Custom LotSize override.")
     parser.add_argument("--pipgap", type=float, help="Custom PipGap override.")
+    parser.add_argument("--sweep", action="store_true", help="Sweep mode: evaluate the DD ladder over ranges of parameters.")
+    parser.add_argument("--sweep-lot", help="LotSize values (start:stop:step or comma list).")
+    parser.add_argument("--sweep-lotexp", help="LotSizeExponent values.")
+    parser.add_argument("--sweep-pipstep", help="PipStep (base pip gap) values.")
+    parser.add_argument("--sweep-pipstepexp", help="PipStepExponent values.")
+    parser.add_argument("--sweep-maxpipstep", help="MaxPipStep values (negative = ATR multiple).")
+    parser.add_argument("--sweep-livedelay", help="LiveDelay values.")
+    parser.add_argument("--sweep-out", help="Folder for the sweep cube (default: <dir>/sweep).")
+    parser.add_argument("--heatmap", default="LotSize,PipStep", help="Heatmap axes X,Y (default: LotSize,PipStep).")
+    parser.add_argument("--heatmap-slice", help="Parameter to slice heatmaps by (default: first other swept parameter).")
+    parser.add_argument("--thresholds", default="1000", help="USD DD thresholds marked in the ladder (comma list, e.g. 500,1000,2000,5000,10000).")
+    parser.add_argument("--solve", action="store_true", help="Inverse mode: max safe lot / min pip gap for a DD budget.")
+    parser.add_argument("--budget", type=float, default=1000.0, help="DD budget in USD for --solve (default: 1000).")
+    parser.add_argument("--move", default="100,200,300,500", help="Adverse move(s) in pips for --solve (comma list).")
     
     args = parser.parse_args()
+
+    try:
+        dd_thresholds = grid.parse_thresholds(args.thresholds)
+    except ValueError as e:
+        print(f"Error: {e}")
+        return
+
+    if args.solve:
+        try:
+            solve_moves = [float(m) for m in args.move.split(',') if m.strip()]
+        except ValueError:
+            print(f"Error: Invalid --move '{args.move}'. Use a comma separated list of pips.")
+            return
+        if not args.file:
+            # All reports at once
+            run_solver(collect_solver_inputs(args.dir), args.budget, solve_moves, os.path.join(args.dir, "solve"))
+            return
+    elif not args.file:
+        parser.error("--file is required unless --solve is used.")
     
     output_dir = args.dir
     basename = args.file
@@ -157,8 +439,8 @@ def main():
             return
 
     # Paths
-    set_path = os.path.join(output_dir, "sets", f"{basename}.set")
-    trades_path = os.path.join(output_dir, "trades", f"all_trades_{basename}.csv")
+    set_path = artifacts.get_run_index(output_dir).get(basename, 'set') or os.path.join(output_dir, "sets", f"{basename}.set")
+    trades_path = os.path.join(output_dir, "Trades", f"all_trades_{basename}.csv")
     prices_dir = os.path.join(output_dir, "prices")
     report_list_path = os.path.join(output_dir, "report_list.csv")
 
@@ -343,45 +625,45 @@ def main():
         print(f"Using Default/Custom PipStep: {current_pipstep}")
 
     # 5. FX Rate Conversion
-    fx_rates = load_fx_rates(prices_dir)
+    fx_rates = load_price_folder(prices_dir)
     fx_factor = get_usd_conv_factor(symbol_str, target_date, fx_rates)
     print(f"USD Conversion Factor for {target_date_str}: {fx_factor:.4f}")
 
-    # 6. Theoretical Calculation
-    # Level 1 to 20
-    # Level 1 volume includes LiveDelay + 1st physical trade
-    def get_theo_lot(k):
-        return min(s_max_lot, s_lot * (s_lotexp ** (k-1)))
+    if args.sweep:
+        base_values = {
+            'LotSize': s_lot,
+            'LotSizeExponent': s_lotexp,
+            'PipStep': current_pipstep,
+            'PipStepExponent': s_pipstepexp,
+            'MaxPipStep': s_maxpipstep,
+            'LiveDelay': s_ld,
+        }
+        try:
+            run_sweep(args, output_dir, basename, base_values, s_max_lot, s_pipstep, point, fx_factor)
+        except ValueError as e:
+            print(f"Error: {e}")
+        return
 
-    volumes = [0.0] * 22
-    volumes[1] = sum(get_theo_lot(j) for j in range(1, s_ld + 2))
-    for i in range(2, 21):
-        volumes[i] = get_theo_lot(s_ld + i)
+    if args.solve:
+        df_inputs = pd.DataFrame([{
+            'Report': basename, 'Symbol': symbol_str, 'Point': point, 'FX_Factor': fx_factor,
+            'LotSize': s_lot, 'LotSizeExponent': s_lotexp, 'MaxLots': s_max_lot,
+            'PipStep': current_pipstep, 'SetPipStep': s_pipstep, 'PipStepExponent': s_pipstepexp,
+            'MaxPipStep': s_maxpipstep, 'LiveDelay': s_ld,
+        }])
+        run_solver(df_inputs, args.budget, solve_moves, os.path.join(output_dir, "solve"))
+        return
 
-    # Calculate Gaps and Prices for both scenarios
-    p_anchor = 1.0
-    
-    # ATR-based MaxPipStep scaling
-    calculated_atr = current_pipstep / abs(s_pipstep) if s_pipstep != 0 else 1.0
-    effective_maxpipstep = calculated_atr * abs(s_maxpipstep) if s_maxpipstep < 0 else s_maxpipstep
-    
-    # Global ATR calculation for Mean scenario
-    global_atr = global_mean_pipstep / abs(s_pipstep) if s_pipstep != 0 else 1.0
-    effective_global_maxpipstep = global_atr * abs(s_maxpipstep) if s_maxpipstep < 0 else s_maxpipstep
-
-    # Default scenario
-    prices_def = [0.0] * 23
-    prices_def[s_ld + 1] = p_anchor
-    for k in range(s_ld + 1, 22):
-        gap = min(effective_maxpipstep, current_pipstep * (s_pipstepexp ** (k-1))) if effective_maxpipstep > 0 else current_pipstep * (s_pipstepexp ** (k-1))
-        prices_def[k+1] = prices_def[k] + (gap * point)
-
-    # Mean scenario
-    prices_mean = [0.0] * 23
-    prices_mean[s_ld + 1] = p_anchor
-    for k in range(s_ld + 1, 22):
-        gap = min(effective_global_maxpipstep, global_mean_pipstep * (s_pipstepexp ** (k-1))) if effective_global_maxpipstep > 0 else global_mean_pipstep * (s_pipstepexp ** (k-1))
-        prices_mean[k+1] = prices_mean[k] + (gap * point)
+    # 6. Theoretical Calculation (grid.py ladder for both scenarios, levels 1 to 20)
+    # ATR-based MaxPipStep scaling, for the passed/default and the global mean pip gap
+    effective_maxpipstep = float(grid.effective_max_pipstep(current_pipstep, s_pipstep, s_maxpipstep))
+    effective_global_maxpipstep = float(grid.effective_max_pipstep(global_mean_pipstep, s_pipstep, s_maxpipstep))
+
+    # Level 1 volume includes LiveDelay + 1st physical trade
+    dd_def_l, gap_def_l, volumes, open_def_l = grid.theoretical_ladder(s_lot, s_lotexp, s_max_lot, current_pipstep, s_pipstepexp,
+                                                                      effective_maxpipstep, s_ld, point, fx_factor)
+    dd_mean_l, gap_mean_l, _, open_mean_l = grid.theoretical_ladder(s_lot, s_lotexp, s_max_lot, global_mean_pipstep, s_pipstepexp,
+                                                                   effective_global_maxpipstep, s_ld, point, fx_factor)
 
     # 7. Print Table
     print("\n" + "="*110)
@@ -393,69 +675,37 @@ def main():
     RED = "\033[91m"
     RESET = "\033[0m"
 
-    multiplier = 100000
+    # Red from the 1k limit, independent of the --thresholds marked in the ladder
+    highlight_limit = grid.DEFAULT_THRESHOLD
+
+    # Threshold breaches for both scenarios via searchsorted on the monotonic DD ladder
+    breach_lvl_def, breach_gap_def, _ = grid.breach_table(dd_def_l, gap_def_l, open_def_l, dd_thresholds)
+    breach_lvl_mean, breach_gap_mean, _ = grid.breach_table(dd_mean_l, gap_mean_l, open_mean_l, dd_thresholds)
+
     for i in range(1, 21):
-        # Default DD calculation
-        target_price_def = prices_def[min(s_ld + i + 1, 22)]
-        dd_def = 0
-        for j in range(1, i + 1):
-            dd_def += volumes[j] * abs(target_price_def - prices_def[s_ld + j])
-        dd_usd_def = dd_def * multiplier * fx_factor
-        gap_pips_def = abs(target_price_def - p_anchor) / point
-
-        # Mean DD calculation
-        target_price_mean = prices_mean[min(s_ld + i + 1, 22)]
-        dd_mean = 0
-        for j in range(1, i + 1):
-            dd_mean += volumes[j] * abs(target_price_mean - prices_mean[s_ld + j])
-        dd_usd_mean = dd_mean * multiplier * fx_factor
-        gap_pips_mean = abs(target_price_mean - p_anchor) / point
-        
+        dd_usd_def, gap_pips_def = dd_def_l[i - 1], gap_def_l[i - 1]
+        dd_usd_mean, gap_pips_mean = dd_mean_l[i - 1], gap_mean_l[i - 1]
+
         # Prepare strings with conditional coloring
         dd_usd_def_str = f"${dd_usd_def:<13.2f}"
-        if dd_usd_def >= 1000:
+        if dd_usd_def >= highlight_limit:
             dd_usd_def_str = f"{RED}{dd_usd_def_str}{RESET}"
             
         dd_usd_mean_str = f"${dd_usd_mean:<13.2f}"
-        if dd_usd_mean >= 1000:
+        if dd_usd_mean >= highlight_limit:
             dd_usd_mean_str = f"{RED}{dd_usd_mean_str}{RESET}"
         
-        # --- Crossover Checks ---
-        # 1. Default Scenario Crossover
-        prev_dd_usd_def = 0
-        if i > 1:
-            prev_target_price_def = prices_def[min(s_ld + i, 22)]
-            prev_dd_def = 0
-            for j in range(1, i):
-                prev_dd_def += volumes[j] * abs(prev_target_price_def - prices_def[s_ld + j])
-            prev_dd_usd_def = prev_dd_def * multiplier * fx_factor
-        
-        if prev_dd_usd_def < 1000 <= dd_usd_def:
-            # Interpolate Gap
-            open_vol = sum(volumes[j] for j in range(1, i + 1))
-            needed_price_diff = (1000 - prev_dd_usd_def) / (open_vol * multiplier * fx_factor)
-            price_at_1k = prices_def[min(s_ld + i, 22)] + (needed_price_diff if prices_def[min(s_ld + i + 1, 22)] > prices_def[min(s_ld + i, 22)] else -needed_price_diff)
-            gap_at_1k = abs(price_at_1k - p_anchor) / point
-            print(f"{'---':<8} | {'---':<10} | {gap_at_1k:<12.1f} | {RED}{'$1,000.00':<13}{RESET} | {'---':<12} | {'---':<14} (Default Threshold)")
-
-        # 2. Mean Scenario Crossover
-        prev_dd_usd_mean = 0
-        if i > 1:
-            prev_target_price_mean = prices_mean[min(s_ld + i, 22)]
-            prev_dd_mean = 0
-            for j in range(1, i):
-                prev_dd_mean += volumes[j] * abs(prev_target_price_mean - prices_mean[s_ld + j])
-            prev_dd_usd_mean = prev_dd_mean * multiplier * fx_factor
-
-        if prev_dd_usd_mean < 1000 <= dd_usd_mean:
-            # Interpolate Gap
-            open_vol = sum(volumes[j] for j in range(1, i + 1))
-            needed_price_diff = (1000 - prev_dd_usd_mean) / (open_vol * multiplier * fx_factor)
-            price_at_1k = prices_mean[min(s_ld + i, 22)] + (needed_price_diff if prices_mean[min(s_ld + i + 1, 22)] > prices_mean[min(s_ld + i, 22)] else -needed_price_diff)
-            gap_at_1k = abs(price_at_1k - p_anchor) / point
-            print(f"{'---':<8} | {'---':<10} | {'---':<12} | {'---':<14} | {gap_at_1k:<12.1f} | {RED}{'$1,000.00':<13}{RESET} (Mean Threshold)")
-
-        line = f"{i:<8} | {volumes[i]:<10.2f} | {gap_pips_def:<12.1f} | {dd_usd_def_str} | {gap_pips_mean:<12.1f} | {dd_usd_mean_str}"
+        # --- Threshold Crossovers (resolved up front, printed above the breaching level) ---
+        for t_i, t_val in enumerate(dd_thresholds):
+            if breach_lvl_def[t_i] == i:
+                t_str = f"${t_val:,.2f}"
+                print(f"{'---':<8} | {'---':<10} | {breach_gap_def[t_i]:<12.1f} | {RED}{t_str:<13}{RESET} | {'---':<12} | {'---':<14} (Default Threshold)")
+        for t_i, t_val in enumerate(dd_thresholds):
+            if breach_lvl_mean[t_i] == i:
+                t_str = f"${t_val:,.2f}"
+                print(f"{'---':<8} | {'---':<10} | {'---':<12} | {'---':<14} | {breach_gap_mean[t_i]:<12.1f} | {RED}{t_str:<13}{RESET} (Mean Threshold)")
+
+        line = f"{i:<8} | {volumes[i - 1]:<10.2f} | {gap_pips_def:<12.1f} | {dd_usd_def_str} | {gap_pips_mean:<12.1f} | {dd_usd_mean_str}"
         print(line)
 
     print("="*110)
@@ -465,45 +715,15 @@ def main():
     target_lots = [0.01, 0.02, 0.03, 0.04, 0.05]
     results_1k = {}
     
-    for start_lot in target_lots:
-        # Simulate volumes for this start_lot
-        sim_volumes = [0.0] * 22
-        def get_sim_lot(k):
-            return min(s_max_lot, start_lot * (s_lotexp ** (k-1)))
-        
-        sim_volumes[1] = sum(get_sim_lot(j) for j in range(1, s_ld + 2))
-        for j in range(2, 21):
-            sim_volumes[j] = get_sim_lot(s_ld + j)
-            
-        # Use existing prices_def (which used current_pipstep)
-        k1_gap = "N/A"
-        total_lots_at_1k = "N/A"
-        level_at_1k = "N/A"
-        last_dd_usd = 0
-        last_gap_pips = 0
-        
-        for i in range(1, 21):
-            t_price = prices_def[min(s_ld + i + 1, 22)]
-            dd_val = 0
-            open_lots = 0
-            for j in range(1, i + 1):
-                dd_val += sim_volumes[j] * abs(t_price - prices_def[s_ld + j])
-                open_lots += sim_volumes[j]
-            dd_usd = dd_val * multiplier * fx_factor
-            gap_pips = abs(t_price - p_anchor) / point
-            
-            if last_dd_usd < 1000 <= dd_usd:
-                # Interpolate Gap
-                if dd_usd > last_dd_usd:
-                    gap_val = last_gap_pips + (gap_pips - last_gap_pips) * (1000 - last_dd_usd) / (dd_usd - last_dd_usd)
-                    k1_gap = f"{gap_val:.1f}"
-                    total_lots_at_1k = f"{open_lots:.2f}"
-                    level_at_1k = f"L{i}-{i+1}"
-                break
-            last_dd_usd = dd_usd
-            last_gap_pips = gap_pips
-        
-        results_1k[start_lot] = {'gap': k1_gap, 'lots': total_lots_at_1k, 'level': level_at_1k}
+    # Use the passed/default pip gap grid (current_pipstep) for every starting lot at once
+    sim_dd, sim_gaps, _, sim_open = grid.theoretical_ladder(np.array(target_lots), s_lotexp, s_max_lot, current_pipstep,
+                                                            s_pipstepexp, effective_maxpipstep, s_ld, point, fx_factor)
+    lvl_k1, gap_k1, lots_k1 = grid.first_breach(sim_dd, sim_gaps, sim_open, grid.DEFAULT_THRESHOLD)
+    for lt_i, start_lot in enumerate(target_lots):
+        if lvl_k1[lt_i] > 0:
+            results_1k[start_lot] = {'gap': f"{gap_k1[lt_i]:.1f}", 'lots': f"{lots_k1[lt_i]:.2f}", 'level': f"L{lvl_k1[lt_i]}-{lvl_k1[lt_i]+1}"}
+        else:
+            results_1k[start_lot] = {'gap': "N/A", 'lots': "N/A", 'level': "N/A"}
 
     # Print Horizontal Table
     header_row = " | ".join([f"{lot:<10}" for lot in target_lots])
@@ -0,0 +1,244 @@
+"""
+drawdowns.py - Drawdown Episode Extraction
+
+Splits an equity or balance curve into drawdown episodes: from a peak, down to the
+trough, back to the peak level (recovery). Each episode has its peak, trough and
+recovery time, depth (absolute and %), duration and time to trough. Episodes that are
+still open at the end of the data have no recovery time.
+
+The extraction is a single vectorized pass (running peak, underwater runs, per-run
+minimum with np.minimum.reduceat), so it stays O(n) on multi-million-row parquet curves.
+
+Usage:
+    python drawdowns.py <output_folder> [--column equity|balance] [--min-dd 100] [--top 10] [--all]
+"""
+
+import os
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+import equity
+import tensor
+
+EPISODE_COLUMNS = ['Peak', 'Trough', 'Recovery', 'PeakValue', 'Depth', 'DepthPct', 'Duration', 'TimeToTrough']
+
+
+def extract_episodes(times, values, min_depth=0.0):
+    """
+    Drawdown episodes of a curve as a DataFrame (EPISODE_COLUMNS), deepest first.
+    times: datetime-like array, values: equity/balance at those times. min_depth: minimum
+    absolute depth (positive amount) an episode needs to be listed.
+    """
+    times = pd.DatetimeIndex(times)
+    v = np.asarray(values, dtype=float)
+    n = len(v)
+    if n < 2:
+        return pd.DataFrame(columns=EPISODE_COLUMNS)
+
+    peak = np.maximum.accumulate(v)
+    dd = v - peak
+    under = dd < 0
+    if not under.any():
+        return pd.DataFrame(columns=EPISODE_COLUMNS)
+
+    # Underwater runs [start, end): start-1 is the peak, end is the recovery point (or n)
+    edges = np.diff(under.astype(np.int8), prepend=0, append=0)
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+
+    depth = np.minimum.reduceat(dd, starts)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        dd_pct = np.where(peak != 0, (v / peak - 1) * 100, 0.0)
+    depth_pct = np.minimum.reduceat(dd_pct, starts)
+
+    # Trough = first point of each run that reaches the run's depth
+    run_id = np.cumsum(edges[:-1] == 1) - 1
+    hits = np.flatnonzero(under & (dd == depth[np.maximum(run_id, 0)]))
+    _, first = np.unique(run_id[hits], return_index=True)
+    troughs = hits[first]
+
+    peak_idx = starts - 1
+    recovered = ends < n
+    peak_t = times[peak_idx]
+    trough_t = times[troughs]
+    recovery_t = pd.DatetimeIndex(np.where(recovered, times.values[np.minimum(ends, n - 1)], np.datetime64('NaT')))
+    stop_t = pd.DatetimeIndex(np.where(recovered, recovery_t.values, times.values[-1]))
+
+    df = pd.DataFrame({
+        'Peak': peak_t,
+        'Trough': trough_t,
+        'Recovery': recovery_t,
+        'PeakValue': peak[peak_idx],
+        'Depth': depth,
+        'DepthPct': depth_pct,
+        'Duration': stop_t - peak_t,
+        'TimeToTrough': trough_t - peak_t,
+    })
+    df = df[-df['Depth'] >= min_depth]
+    return df.sort_values('Depth', kind='stable').reset_index(drop=True)
+
+
+def time_under_water(times, values):
+    """
+    Share of the period spent below a previous peak, and the longest time under water. Taken from
+    the full underwater mask, so it does not depend on the min_depth filter of the listed episodes.
+    """
+    times = pd.DatetimeIndex(times)
+    v = np.asarray(values, dtype=float)
+    span = times[-1] - times[0] if len(times) > 1 else pd.Timedelta(0)
+    if span <= pd.Timedelta(0):
+        return 0.0, pd.Timedelta(0)
+    under = v < np.maximum.accumulate(v)
+    if not under.any():
+        return 0.0, pd.Timedelta(0)
+    edges = np.diff(under.astype(np.int8), prepend=0, append=0)
+    starts = np.flatnonzero(edges == 1)
+    ends = np.minimum(np.flatnonzero(edges == -1), len(v) - 1)
+    durations = times[ends] - times[starts - 1]
+    return float(durations.sum() / span * 100), durations.max()
+
+
+def rolling_worst(times, values, days):
+    """
+    Worst drawdown and worst PnL within any rolling window of each length in days.
+    The rolling peak uses pandas' variable-window max (a monotonic deque, O(n));
+    the window PnL compares each point with the last value at or before t - window.
+    Returns [{'days', 'dd', 'dd_pct', 'dd_time', 'pnl', 'pnl_time'}].
+    """
+    times = pd.DatetimeIndex(times)
+    v = np.asarray(values, dtype=float)
+    out = []
+    if len(v) < 2:
+        return out
+    series = pd.Series(v, index=times)
+    for d in days:
+        window = pd.Timedelta(days=d)
+        peak = series.rolling(window, closed='both').max().to_numpy()
+        dd = v - peak
+        with np.errstate(divide='ignore', invalid='ignore'):
+            dd_pct = np.where(peak != 0, (v / peak - 1) * 100, 0.0)
+        prev = np.searchsorted(times.values, (times - window).values, side='right') - 1
+        pnl = v - v[np.maximum(prev, 0)]
+        i, j = int(dd.argmin()), int(pnl.argmin())
+        out.append({'days': d, 'dd': float(dd[i]), 'dd_pct': float(dd_pct.min()), 'dd_time': times[i],
+                    'pnl': float(pnl[j]), 'pnl_time': times[j]})
+    return out
+
+
+def attribute_worst(dd_matrix, top=5):
+    """
+    Each report's share of the portfolio's worst moments. dd_matrix: aligned time x report
+    drawdowns (negative, 0 = at peak); the portfolio DD of a row is the row sum. The top rows
+    are sliced out at once and divided by their totals.
+    Returns [{'time', 'total', 'reports': [{'report', 'dd', 'pct'}]}], worst first, contributors by size.
+    """
+    if dd_matrix is None or dd_matrix.empty or top <= 0:
+        return []
+    total = dd_matrix.sum(axis=1)
+    worst = total[total < 0].nsmallest(top).index
+    rows = dd_matrix.loc[worst]
+    pct = rows.div(total[worst], axis=0) * 100
+    out = []
+    for t in worst:
+        contrib = rows.loc[t]
+        contrib = contrib[contrib < 0].sort_values(kind='stable')
+        out.append({'time': t, 'total': float(total[t]),
+                    'reports': [{'report': r, 'dd': float(v), 'pct': float(pct.at[t, r])} for r, v in contrib.items()]})
+    return out
+
+
+def format_rolling(rolling, key='dd'):
+    """'7d: -120.50 | 30d: -340.00' for the report lists."""
+    return " | ".join(f"{r['days']}d: {r[key]:,.2f}" for r in rolling)
+
+
+def format_duration(td):
+    """Timedelta as days with one decimal, e.g. '12.3 d'."""
+    if td is None or pd.isna(td):
+        return "N/A"
+    return f"{td / pd.Timedelta(days=1):.1f} d"
+
+
+def report_episodes(job):
+    """Worker: (name, parquet path, column, min_depth) -> (name, episodes, under water %, longest, rows)."""
+    name, path, column, min_depth = job
+    df = equity.load_report_equity(path)
+    if df is None or column not in df.columns:
+        return name, None, 0.0, pd.Timedelta(0), 0
+    times, values = df['DATE'].to_numpy(), df[column].to_numpy(dtype=float)
+    eps = extract_episodes(times, values, min_depth)
+    uw, longest = time_under_water(times, values)
+    return name, eps, uw, longest, len(df)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drawdown episodes (peak, trough, recovery) of every report and the portfolio.")
+    parser.add_argument("output_folder", help="Path to the output folder (analysis/output_*) with report_list.csv.")
+    parser.add_argument("--column", choices=['equity', 'balance'], default='equity', help="Curve of the parquet files (default: equity).")
+    parser.add_argument("--min-dd", type=float, default=0.0, help="Minimum episode depth in account currency (default: 0).")
+    parser.add_argument("--top", type=int, default=10, help="Episodes listed per report and for the portfolio (default: 10).")
+    parser.add_argument("--all", action="store_true", help="Include reports with Include = 0.")
+    parser.add_argument("--base", type=float, default=100000.0, help="Base capital of the portfolio curve (default: 100,000).")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Parallel worker processes (default: CPU count).")
+    args = parser.parse_args()
+
+    output_dir = os.path.abspath(args.output_folder)
+    column = args.column.upper()
+    reports = [(name, path) for name, inc, path in tensor.run_reports(output_dir) if path and (inc or args.all)]
+    if not reports:
+        print("No parquet equity files found.")
+        return
+
+    jobs = [(name, path, column, args.min_dd) for name, path in reports]
+    if args.workers > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=args.workers) as executor:
+            results = list(executor.map(report_episodes, jobs))
+    else:
+        results = [report_episodes(job) for job in jobs]
+
+    pd.set_option('display.width', 250)
+    out_dir = os.path.join(output_dir, "drawdowns")
+    os.makedirs(out_dir, exist_ok=True)
+    all_eps, summary = [], []
+    for name, eps, uw, longest, rows in results:
+        if eps is None:
+            print(f"Warning: No {column} curve in the parquet of {name}")
+            continue
+        eps.insert(0, 'Report', name)
+        all_eps.append(eps)
+        summary.append({'Report': name, 'Rows': rows, 'Episodes': len(eps),
+                        'MaxDepth': eps['Depth'].min() if len(eps) else 0.0,
+                        'TimeUnderWater%': round(uw, 1), 'Longest': format_duration(longest)})
+
+    # Portfolio episodes from the equity tensor, if it was built. Each cell holds every report's own
+    # minimum within the cell, so the summed curve is a conservative bound on the portfolio curve
+    # (troughs at least as deep, peaks possibly lower), not the exact curve.
+    if os.path.exists(os.path.join(output_dir, tensor.TENSOR_DIR, tensor.INDEX_FILE)):
+        t = tensor.EquityTensor(output_dir)
+        pnl = t.portfolio(t.weight_vector(include_all=args.all))
+        times = t.times()
+        eps = extract_episodes(times, args.base + pnl, args.min_dd)
+        uw, longest = time_under_water(times, args.base + pnl)
+        print(f"\nPortfolio (equity tensor, {t.info['freq']}, conservative bound): {len(eps)} episodes, {uw:.1f}% under water, longest {format_duration(longest)}")
+        print(eps.head(args.top).to_string(index=False))
+        eps.insert(0, 'Report', 'PORTFOLIO')
+        all_eps.append(eps)
+    else:
+        print("\nPortfolio episodes need the equity tensor: python tensor.py build <output_folder>")
+
+    print(f"\nPer-report summary ({column}):")
+    print(pd.DataFrame(summary).to_string(index=False))
+    for eps in all_eps:
+        if len(eps) and eps['Report'].iloc[0] != 'PORTFOLIO':
+            print(f"\n{eps['Report'].iloc[0]}:")
+            print(eps.drop(columns='Report').head(args.top).to_string(index=False))
+
+    out_path = os.path.join(out_dir, f"episodes_{args.column}.csv")
+    if all_eps:
+        pd.concat(all_eps, ignore_index=True).to_csv(out_path, index=False)
+        print(f"\nEpisodes saved to: {out_path}")
+
+
+if __name__ == "__main__":
+    main()
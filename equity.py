@@ -0,0 +1,216 @@
+"""
+equity.py - Portfolio Floating-Equity Aggregation
+
+Combines the per-report parquet BALANCE/EQUITY curves (minute resolution) into the
+portfolio equity curve and its floating drawdown. A report's curve holds all of its
+sequences, including those trades.py rejected as overlapping or capped, so the result
+describes all sequences of the selected reports, not the accepted trades.
+
+Each report's curve is turned into change events (time, delta of EQUITY against its
+initial deposit) and spilled to .npy files. A chunked k-way merge then walks the union
+timeline one time window at a time: the events of all reports falling into the window
+are read through memory maps, summed per timestamp and accumulated. A report carries its
+last equity until its next point (forward fill) and counts as flat before its first one.
+Memory stays bounded by the events of one window, not by the number of reports.
+
+Usage:
+    python equity.py <output_folder> [--all] [--chunk-days 30] [--out portfolio_equity.csv]
+"""
+
+import os
+import shutil
+import argparse
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+import artifacts
+
+DATE_FORMAT = '%Y.%m.%d %H:%M'
+
+
+def load_report_equity(parquet_path):
+    """
+    Parses a report's equity parquet (one tab-separated column '<DATE>\\t<BALANCE>\\t<EQUITY>\\t...')
+    into a DATE-sorted frame with numeric BALANCE/EQUITY. Returns None if empty.
+    """
+    p_df = pd.read_parquet(parquet_path)
+    if p_df.empty:
+        return None
+
+    cols = [c.replace('<', '').replace('>', '').strip() for c in p_df.columns[0].split('\t')]
+    df = p_df.iloc[:, 0].astype(str).str.split('\t', expand=True)
+    df = df.reindex(columns=range(len(cols)))
+    df.columns = cols
+    df['DATE'] = pd.to_datetime(df['DATE'], format=DATE_FORMAT, errors='coerce')
+    df = df.dropna(subset=['DATE'])
+
+    for c in ['BALANCE', 'EQUITY']:
+        if c in df.columns:
+            df[c] = pd.to_numeric(df[c], errors='coerce').fillna(0)
+    return df.sort_values('DATE')
+
+
+def equity_events(df):
+    """
+    Change events of a report's floating PnL: (int64 ns times, float64 deltas) where the running
+    sum of the deltas equals EQUITY - initial BALANCE. Duplicate timestamps keep their last value.
+    """
+    if df is None or df.empty or 'EQUITY' not in df.columns:
+        return None
+    df = df.drop_duplicates('DATE', keep='last')
+    start = df['BALANCE'].iloc[0] if 'BALANCE' in df.columns else df['EQUITY'].iloc[0]
+    level = df['EQUITY'].to_numpy(dtype=float) - start
+    deltas = np.diff(level, prepend=0.0)
+    times = df['DATE'].to_numpy(dtype='datetime64[ns]').astype(np.int64)
+    keep = deltas != 0
+    keep[0] = True
+    return times[keep], deltas[keep]
+
+
+def spill_events(parquet_paths, spill_dir, workers=4):
+    """Parses each parquet and writes its events to <spill_dir>/<n>_t.npy / _d.npy. Returns the spilled file pairs."""
+    os.makedirs(spill_dir, exist_ok=True)
+
+    def spill(job):
+        n, path = job
+        try:
+            events = equity_events(load_report_equity(path))
+        except Exception as e:
+            print(f"Warning: Could not read equity from {path}: {e}")
+            return None
+        if events is None:
+            return None
+        t_path, d_path = os.path.join(spill_dir, f"{n}_t.npy"), os.path.join(spill_dir, f"{n}_d.npy")
+        np.save(t_path, events[0])
+        np.save(d_path, events[1])
+        return path, t_path, d_path
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        return [r for r in executor.map(spill, enumerate(parquet_paths)) if r is not None]
+
+
+def merge_events(spilled, base=100000.0, start=None, end=None, chunk_days=30, resample='1h'):
+    """
+    Chunked k-way merge of spilled event streams into the portfolio equity (base + summed floating PnL).
+    Events before start only set the opening level. Returns the max DD summary and a curve of
+    per-`resample` equity minima (which keeps every trough) for charting.
+    """
+    streams = [(np.load(t, mmap_mode='r'), np.load(d, mmap_mode='r')) for _, t, d in spilled]
+    streams = [(t, d) for t, d in streams if len(t)]
+    result = {'reports': len(streams), 'max_dd_abs': 0.0, 'max_dd_pct': 0.0, 'max_dd_time': None,
+              'max_dd_pct_time': None, 'final_equity': base, 'curve': pd.Series(dtype=float)}
+    if not streams:
+        return result
+
+    t_min = min(int(t[0]) for t, _ in streams)
+    t_max = max(int(t[-1]) for t, _ in streams)
+    lo = pd.Timestamp(start).value if start is not None else t_min
+    hi = pd.Timestamp(end).value if end is not None else t_max + 1
+
+    # Opening level: everything that happened before the window
+    level = base + sum(float(d[:np.searchsorted(t, lo, side='left')].sum()) for t, d in streams)
+    peak = level
+    step = int(pd.Timedelta(days=chunk_days).value)
+    pos = [int(np.searchsorted(t, lo, side='left')) for t, _ in streams]
+    curve_parts = []
+
+    for c_lo in range(lo, hi, step):
+        c_hi = min(c_lo + step, hi)
+        t_parts, d_parts = [], []
+        for i, (t, d) in enumerate(streams):
+            j = int(np.searchsorted(t, c_hi, side='left'))
+            if j > pos[i]:
+                t_parts.append(np.asarray(t[pos[i]:j]))
+                d_parts.append(np.asarray(d[pos[i]:j]))
+                pos[i] = j
+        if not t_parts:
+            continue
+
+        times = np.concatenate(t_parts)
+        deltas = np.concatenate(d_parts)
+        order = np.argsort(times, kind='stable')
+        times, deltas = times[order], deltas[order]
+        # One portfolio value per timestamp: sum all reports' changes at that minute first
+        uniq, first = np.unique(times, return_index=True)
+        equity = level + np.cumsum(np.add.reduceat(deltas, first))
+        level = float(equity[-1])
+
+        peaks = np.maximum.accumulate(np.maximum(equity, peak))
+        dd = equity - peaks
+        dd_pct = (equity / peaks - 1) * 100
+        peak = float(peaks[-1])
+        i_abs, i_pct = int(dd.argmin()), int(dd_pct.argmin())
+        if dd[i_abs] < result['max_dd_abs']:
+            result['max_dd_abs'] = float(dd[i_abs])
+            result['max_dd_time'] = pd.Timestamp(int(uniq[i_abs]))
+        if dd_pct[i_pct] < result['max_dd_pct']:
+            result['max_dd_pct'] = float(dd_pct[i_pct])
+            result['max_dd_pct_time'] = pd.Timestamp(int(uniq[i_pct]))
+        curve_parts.append(pd.Series(equity, index=pd.to_datetime(uniq)).resample(resample).min().dropna())
+
+    result['final_equity'] = level
+    if curve_parts:
+        result['curve'] = pd.concat(curve_parts)
+    return result
+
+
+def portfolio_equity(parquet_paths, base=100000.0, start=None, end=None, chunk_days=30, spill_dir=None, workers=4):
+    """Spills the reports' equity events to a temporary folder and merges them into the portfolio curve."""
+    own_dir = spill_dir is None
+    spill_dir = spill_dir or tempfile.mkdtemp(prefix="equity_")
+    try:
+        spilled = spill_events(parquet_paths, spill_dir, workers)
+        return merge_events(spilled, base, start, end, chunk_days)
+    finally:
+        if own_dir:
+            shutil.rmtree(spill_dir, ignore_errors=True)
+
+
+def report_parquets(output_dir, include_all=False):
+    """Parquet equity paths of the run's reports (report_list.csv, Include == 1 unless include_all)."""
+    df_list = pd.read_csv(os.path.join(output_dir, "report_list.csv"))
+    report_paths = df_list['FilePath'].tolist()
+    if not include_all and 'Include' in df_list.columns:
+        df_list = df_list[df_list['Include'] == 1]
+    index = artifacts.get_run_index(output_dir, report_paths)
+    paths, missing = [], []
+    for fp in df_list['FilePath']:
+        basename = os.path.splitext(os.path.basename(fp))[0]
+        path = index.get(basename, 'parquet')
+        (paths if path else missing).append(path or basename)
+    return paths, missing
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Portfolio floating-equity drawdown from the reports' parquet equity curves (all sequences of each report).")
+    parser.add_argument("output_folder", help="Path to the output folder (analysis/output_*) with report_list.csv.")
+    parser.add_argument("--all", action="store_true", help="Include reports with Include = 0.")
+    parser.add_argument("--base", type=float, default=100000.0, help="Base capital (default: 100,000).")
+    parser.add_argument("--start", help="Start date (YYYY-MM-DD).")
+    parser.add_argument("--end", help="End date (YYYY-MM-DD).")
+    parser.add_argument("--chunk-days", type=int, default=30, help="Days of the union timeline merged per chunk (default: 30).")
+    parser.add_argument("--workers", type=int, default=4, help="Parallel parquet parsers (default: 4).")
+    parser.add_argument("--out", help="Save the hourly minimum portfolio equity to this CSV.")
+    args = parser.parse_args()
+
+    output_dir = os.path.abspath(args.output_folder)
+    paths, missing = report_parquets(output_dir, args.all)
+    if missing:
+        print(f"No equity parquet for {len(missing)} reports: {', '.join(missing[:10])}{' ...' if len(missing) > 10 else ''}")
+    res = portfolio_equity(paths, args.base, args.start, args.end, args.chunk_days, workers=args.workers)
+    if not res['reports']:
+        print("No equity curves found.")
+        return
+
+    print(f"Reports merged: {res['reports']}")
+    print(f"Final Equity:   {res['final_equity']:,.2f}")
+    print(f"Max Floating DD: {res['max_dd_abs']:,.2f} [{res['max_dd_time']}]")
+    print(f"Max Floating DD %: {res['max_dd_pct']:.2f}% [{res['max_dd_pct_time']}]")
+    if args.out:
+        res['curve'].rename('Equity').to_csv(args.out, index_label='Time')
+        print(f"Equity curve saved to: {args.out}")
+
+
+if __name__ == "__main__":
+    main()
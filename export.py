@@ -1,14 +1,22 @@
 import os
-import shutil
 import argparse
 import pandas as pd
 import re
-import glob
+import hashlib
+import zipfile
+import artifacts
+import placement
+
+MANIFEST_FILE = "export_manifest.json"
 
 def export_files():
     parser = argparse.ArgumentParser(description='Export and organize files based on Full_Analysis.html report.')
     parser.add_argument('output_folder', type=str, help='Path to the output folder containing Full_Analysis.html and report_list.csv')
     parser.add_argument('magic_start', type=int, help='Starting magic number for the exported sets')
+    parser.add_argument('--mode', choices=placement.PLACE_MODES, default='hardlink',
+                        help='How .htm/.parquet files are placed in export/ (default: hardlink, falls back to copy).')
+    parser.add_argument('--zip', nargs='?', const='', metavar='PATH',
+                        help='Also stream the bundle into a zip archive (default: <output_folder>/export.zip).')
     args = parser.parse_args()
 
     output_dir = os.path.abspath(args.output_folder)
@@ -22,11 +30,12 @@ def export_files():
         print(f"Error: report_list.csv not found in {output_dir}")
         return
 
-    # 1. Refresh 'export' folder inside output_dir
+    # 1. 'export' folder inside output_dir, updated in place against its previous manifest
     selected_dir = os.path.join(output_dir, "export")
-    if os.path.exists(selected_dir):
-        print(f"Refreshing 'export' folder: {selected_dir}")
-        shutil.rmtree(selected_dir)
+    manifest_path = os.path.join(selected_dir, MANIFEST_FILE)
+    previous = placement.read_manifest(manifest_path).get('files', {})
+    if previous:
+        print(f"Updating 'export' folder: {selected_dir}")
     os.makedirs(selected_dir, exist_ok=True)
 
     # 2. Create subfolders
@@ -121,7 +130,11 @@ def export_files():
 
     # 5. Copy and modify files
     sets_in_dir = os.path.join(output_dir, "sets")
+    run_index = artifacts.get_run_index(output_dir, df_list['FilePath'].tolist())
     magic_counter = args.magic_start
+    manifest = {}
+    bundle = []       # (relative path, bytes or source path) in export order, for --zip
+    file_jobs = []    # (source, destination) of the .htm/.parquet files
     
     for file_name in selected_files:
         original_htm_path = path_map[file_name]
@@ -129,8 +142,8 @@ def export_files():
         
         # a. Copy and modify .set file from output/sets/
         set_file_name = f"{base_name}.set"
-        set_in_path = os.path.join(sets_in_dir, set_file_name)
-        if os.path.exists(set_in_path):
+        set_in_path = run_index.get(base_name, 'set')
+        if set_in_path:
             set_out_path = os.path.join(sets_out_dir, set_file_name)
             
             content = None
@@ -179,39 +192,80 @@ def export_files():
             comment_pattern = r'^(TradeComment=)([^|\r\n]+)(\|\|.*)?$'
             new_content = re.sub(comment_pattern, modify_comment, new_content, flags=re.MULTILINE)
             
-            # Write back in UTF-8
-            with open(set_out_path, 'w', encoding='utf-8') as f:
-                f.write(new_content)
-                
-            print(f"  Processed: {set_file_name} -> export/sets/ (Magic Number: {magic_counter}, Max Trades: {max_trades_map.get(file_name, 'N/A')})")
+            # Write back in UTF-8 (platform line endings), only if it differs from the previous export
+            data = new_content.replace('\n', os.linesep).encode('utf-8')
+            digest = hashlib.blake2b(data, digest_size=16).hexdigest()
+            rel = os.path.join("sets", set_file_name)
+            if previous.get(rel, {}).get('hash') == digest and os.path.exists(set_out_path):
+                status = "Unchanged"
+            else:
+                with open(f"{set_out_path}.tmp", 'wb') as f:
+                    f.write(data)
+                os.replace(f"{set_out_path}.tmp", set_out_path)
+                status = "Processed"
+            manifest[rel] = {'source': set_in_path, 'hash': digest, 'magic': magic_counter}
+            bundle.append((rel, data))
+
+            print(f"  {status}: {set_file_name} -> export/sets/ (Magic Number: {magic_counter}, Max Trades: {max_trades_map.get(file_name, 'N/A')})")
             magic_counter += 1
         else:
-            print(f"  Warning: .set file not found: {set_in_path}")
+            print(f"  Warning: .set file not found: {os.path.join(sets_in_dir, set_file_name)}")
 
-        # b. Copy .htm file to HTML/
+        # b. Queue .htm file for HTML/
         if os.path.exists(original_htm_path):
-            shutil.copy2(original_htm_path, html_out_dir)
-            print(f"  Copied: {file_name} -> export/HTML/")
+            file_jobs.append((original_htm_path, os.path.join(html_out_dir, file_name)))
         else:
             print(f"  Warning: .htm file not found: {original_htm_path}")
 
-        # c. Copy .parquet file to CSV/
-        # Logic from analyze.py: sibling CSV folder
-        htm_dir = os.path.dirname(original_htm_path)
-        csv_in_folder = os.path.join(os.path.dirname(htm_dir), "CSV")
-        if os.path.exists(csv_in_folder):
-            parquet_pattern = os.path.join(csv_in_folder, f"{base_name}.parquet")
-            matches = glob.glob(parquet_pattern)
-            if matches:
-                for match in matches:
-                    shutil.copy2(match, csv_out_dir)
-                    print(f"  Copied: {os.path.basename(match)} -> export/CSV/")
-            else:
-                print(f"  Info: No parquet found for {base_name}")
+        # c. Queue .parquet file for CSV/
+        # Same resolution as analyze.py: sibling CSV folder, exact name first
+        parquet_path = run_index.get(base_name, 'parquet')
+        if parquet_path:
+            file_jobs.append((parquet_path, os.path.join(csv_out_dir, os.path.basename(parquet_path))))
         else:
-            print(f"  Info: CSV folder not found at {csv_in_folder}")
+            print(f"  Info: No parquet found for {base_name}")
+
+    # 6. Place the large artifacts; files with matching size and mtime are left as they are
+    for dst, entry in placement.place_files(file_jobs, args.mode).items():
+        rel = os.path.relpath(dst, selected_dir)
+        manifest[rel] = entry
+        bundle.append((rel, entry['source']))
+        if entry['method'] != 'unchanged':
+            print(f"  {entry['method'].capitalize()}: {os.path.basename(dst)} -> export/{os.path.dirname(rel)}/")
+    bundle.sort(key=lambda item: item[0])
+
+    # 7. Remove files left over from previous exports
+    removed = 0
+    for folder in (csv_out_dir, html_out_dir, sets_out_dir):
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                if entry.is_file() and os.path.relpath(entry.path, selected_dir) not in manifest:
+                    os.remove(entry.path)
+                    removed += 1
+    if removed:
+        print(f"Removed {removed} stale files from {selected_dir}")
+
+    placement.write_manifest(manifest_path, manifest, magic_start=args.magic_start, mode=args.mode)
+
+    if args.zip is not None:
+        zip_path = os.path.abspath(args.zip) if args.zip else os.path.join(output_dir, "export.zip")
+        write_bundle_zip(zip_path, bundle)
+        print(f"Bundle zipped to: {zip_path}")
 
     print(f"\nSelection complete. Files are organized in: {selected_dir}")
 
+def write_bundle_zip(zip_path, bundle):
+    """Streams the export straight from its sources into a zip (parquet/png stored, text deflated)."""
+    tmp = f"{zip_path}.tmp"
+    with zipfile.ZipFile(tmp, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
+        for rel, payload in bundle:
+            arcname = rel.replace(os.sep, '/')
+            if isinstance(payload, bytes):
+                zf.writestr(arcname, payload)
+            else:
+                stored = arcname.lower().endswith(('.parquet', '.png'))
+                zf.write(payload, arcname, compress_type=zipfile.ZIP_STORED if stored else zipfile.ZIP_DEFLATED)
+    os.replace(tmp, zip_path)
+
 if __name__ == "__main__":
     export_files()
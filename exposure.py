@@ -0,0 +1,162 @@
+"""
+exposure.py - Concurrent Exposure Timeline
+
+Sweeps the selected deals once in time order and builds step functions of:
+  - open lots per symbol and side,
+  - net currency exposure in lots (a long EURUSD position is +EUR / -USD),
+  - concurrently open sequences across the portfolio.
+
+Each report and side holds one sequence at a time (as in trades.py): 'in' deals add
+volume, 'out' and 'in/out' deals remove it, and a sequence is open while its volume is
+positive. Deals at the same timestamp are netted before the peaks are taken, so
+simultaneous open/close pairs do not create spikes.
+
+Usage:
+    python exposure.py <output_folder> [--start] [--end] [--csv exposure_timeline.csv]
+"""
+
+import os
+import glob
+import argparse
+import numpy as np
+import pandas as pd
+from prices import clean_symbol
+
+EPS = 1e-6
+
+
+def deal_deltas(df):
+    """
+    Per-deal effective volume change of its (report, side) position, in time order.
+    Returns a frame with Time, SourceFile, Symbol, Side, Delta (lots) and Opened (+1/-1/0 sequences).
+    """
+    df = df.reset_index(drop=True)
+    direction = df['Direction'].astype(str).str.strip().str.lower()
+    df = df[direction.isin(['in', 'out', 'in/out'])]
+    direction = direction[df.index]
+    kind = df['Type'].astype(str).str.strip().str.lower()
+    # Entries: buy -> long, sell -> short. Exits close the opposite side: sell -> long, buy -> short.
+    side = np.where((direction == 'in') == (kind == 'buy'), 'long', 'short')
+    volume = pd.to_numeric(df['Volume'], errors='coerce').fillna(0).to_numpy()
+    out = pd.DataFrame({
+        'Time': pd.to_datetime(df['Time']).to_numpy(),
+        'SourceFile': df['SourceFile'].astype(str).to_numpy() if 'SourceFile' in df.columns else '',
+        'Symbol': df['Symbol'].astype(str).to_numpy(),
+        'Side': side,
+        'Signed': np.where(direction == 'in', volume, -volume),
+    }).sort_values('Time', kind='stable').reset_index(drop=True)
+
+    # Running volume per position (rounding noise around 0 is clipped), then re-differenced
+    keys = [out['SourceFile'], out['Side']]
+    level = out.groupby(keys)['Signed'].cumsum().clip(lower=0)
+    level = level.where(level > EPS, 0.0)
+    prev = level.groupby(keys).shift(fill_value=0.0)
+    out['Delta'] = level - prev
+    out['Opened'] = (level > 0).astype(int) - (prev > 0).astype(int)
+    return out.drop(columns='Signed')
+
+
+def step_peaks(times, keys, deltas, use_abs=False):
+    """
+    Peak of the running sum of deltas per key (timestamps netted first).
+    Returns a frame with Key, Peak, PeakTime and Final, largest peak first.
+    """
+    frame = pd.DataFrame({'Time': times, 'Key': keys, 'Delta': deltas})
+    frame = frame.groupby(['Key', 'Time'], sort=True)['Delta'].sum().reset_index()
+    frame['Level'] = frame.groupby('Key')['Delta'].cumsum().round(8) + 0.0
+    score = frame['Level'].abs() if use_abs else frame['Level']
+    best = score.groupby(frame['Key']).idxmax()
+    res = pd.DataFrame({'Key': frame.loc[best, 'Key'].to_numpy(), 'Peak': frame.loc[best, 'Level'].to_numpy(),
+                        'PeakTime': frame.loc[best, 'Time'].to_numpy(),
+                        'Final': frame.groupby('Key')['Level'].last().reindex(frame.loc[best, 'Key']).to_numpy()})
+    order = res['Peak'].abs() if use_abs else res['Peak']
+    return res.loc[order.sort_values(ascending=False).index].reset_index(drop=True)
+
+
+def currency_events(deltas):
+    """Splits each position change into base (+) and quote (-) currency legs, signed by side."""
+    pairs = deltas['Symbol'].map(clean_symbol)
+    valid = pairs.notna()
+    d = deltas[valid]
+    pairs = pairs[valid]
+    signed = np.where(d['Side'] == 'long', d['Delta'], -d['Delta'])
+    return (np.concatenate([d['Time'].to_numpy(), d['Time'].to_numpy()]),
+            np.concatenate([pairs.str[:3].to_numpy(), pairs.str[3:].to_numpy()]),
+            np.concatenate([signed, -signed]))
+
+
+def exposure_summary(df):
+    """Peaks of open lots per symbol/side, net currency exposure and concurrent sequences."""
+    deltas = deal_deltas(df)
+    if deltas.empty:
+        return None
+    symbol_side = step_peaks(deltas['Time'], deltas['Symbol'] + ' ' + deltas['Side'], deltas['Delta'])
+    currency = step_peaks(*currency_events(deltas), use_abs=True)
+    sequences = step_peaks(deltas['Time'], np.full(len(deltas), 'ALL'), deltas['Opened'])
+    total_lots = step_peaks(deltas['Time'], np.full(len(deltas), 'ALL'), deltas['Delta'])
+    return {
+        'symbol_side': symbol_side,
+        'currency': currency,
+        'max_sequences': int(sequences['Peak'].iloc[0]), 'max_sequences_time': sequences['PeakTime'].iloc[0],
+        'max_lots': float(total_lots['Peak'].iloc[0]), 'max_lots_time': total_lots['PeakTime'].iloc[0],
+    }
+
+
+def exposure_timeline(df):
+    """Long-format step function (Time, Series, Level) of all symbol/side, currency and sequence series."""
+    deltas = deal_deltas(df)
+    parts = [
+        (deltas['Time'], 'LOTS ' + deltas['Symbol'] + ' ' + deltas['Side'], deltas['Delta']),
+        (deltas['Time'], np.full(len(deltas), 'SEQUENCES'), deltas['Opened']),
+    ]
+    c_times, c_keys, c_deltas = currency_events(deltas)
+    parts.append((c_times, np.char.add('CCY ', c_keys.astype(str)), c_deltas))
+    frame = pd.concat([pd.DataFrame({'Time': t, 'Series': k, 'Delta': d}) for t, k, d in parts], ignore_index=True)
+    frame = frame.groupby(['Series', 'Time'])['Delta'].sum().reset_index()
+    frame['Level'] = frame.groupby('Series')['Delta'].cumsum().round(8) + 0.0
+    return frame.drop(columns='Delta')
+
+
+def load_selected_deals(output_dir, start=None, end=None):
+    """The portfolio's selected deals (Trades/selected_trades_*.csv), optionally restricted to [start, end)."""
+    files = glob.glob(os.path.join(output_dir, "Trades", "selected_trades_*.csv"))
+    if not files:
+        return pd.DataFrame()
+    df = pd.concat([pd.read_csv(f) for f in files], ignore_index=True)
+    df['Time'] = pd.to_datetime(df['Time'])
+    if start:
+        df = df[df['Time'] >= pd.Timestamp(start)]
+    if end:
+        df = df[df['Time'] < pd.Timestamp(end)]
+    return df
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent lots, currency exposure and open sequences of the selected trades.")
+    parser.add_argument("output_folder", help="Path to the output folder (analysis/output_*) with the Trades folder.")
+    parser.add_argument("--start", help="Start date (YYYY-MM-DD).")
+    parser.add_argument("--end", help="End date (YYYY-MM-DD, exclusive).")
+    parser.add_argument("--csv", help="Save the full step-function timeline to this CSV file.")
+    args = parser.parse_args()
+
+    output_dir = os.path.abspath(args.output_folder)
+    df = load_selected_deals(output_dir, args.start, args.end)
+    summary = exposure_summary(df) if not df.empty else None
+    if summary is None:
+        print("No selected deals found.")
+        return
+
+    pd.set_option('display.width', 250)
+    print(f"Max concurrent sequences: {summary['max_sequences']} [{summary['max_sequences_time']}]")
+    print(f"Max open lots (all symbols): {summary['max_lots']:.2f} [{summary['max_lots_time']}]")
+    print("\nPeak open lots per symbol and side:")
+    print(summary['symbol_side'].rename(columns={'Key': 'Position'}).to_string(index=False))
+    print("\nPeak net currency exposure (lots):")
+    print(summary['currency'].rename(columns={'Key': 'Currency'}).to_string(index=False))
+    if args.csv:
+        exposure_timeline(df).to_csv(args.csv, index=False)
+        print(f"\nTimeline saved to: {args.csv}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+"""
+grid.py - Vectorized Theoretical Grid Drawdown Model
+
+Evaluates the theoretical DD ladder used by analyze.py and dd.py for many
+parameter sets in one pass. All parameters may be scalars or arrays that
+broadcast against each other; results carry a trailing level axis.
+
+Level 1 carries the LiveDelay volume (levels 1..LiveDelay+1) at the anchor
+price, level i >= 2 opens one grid gap further. DD(i) is the floating loss
+of levels 1..i when price reaches level i+1.
+"""
+
+import numpy as np
+
+LEVELS = 20
+CONTRACT_SIZE = 100000
+DEFAULT_THRESHOLD = 1000.0
+DEFAULT_THRESHOLDS = (500.0, 1000.0, 2000.0, 5000.0, 10000.0)
+
+
+def effective_max_pipstep(pipstep, set_pipstep, maxpipstep):
+    """Applies the ATR scaling of a negative MaxPipStep (relative to the set file PipStep)."""
+    pipstep = np.asarray(pipstep, dtype=float)
+    set_pipstep = np.asarray(set_pipstep, dtype=float)
+    maxpipstep = np.asarray(maxpipstep, dtype=float)
+
+    shape = np.broadcast(pipstep, set_pipstep).shape
+    abs_set = np.broadcast_to(np.abs(set_pipstep), shape)
+    atr = np.divide(np.broadcast_to(pipstep, shape), abs_set, out=np.ones(shape), where=abs_set != 0)
+    return np.where(maxpipstep < 0, atr * np.abs(maxpipstep), maxpipstep)
+
+
+def level_gaps(pipstep, pipstep_exp, eff_maxpipstep, live_delay, levels=LEVELS):
+    """Pip gap between level j and j+1 (j = 1..levels), capped by the effective MaxPipStep."""
+    pipstep = np.asarray(pipstep, dtype=float)[..., None]
+    pipstep_exp = np.asarray(pipstep_exp, dtype=float)[..., None]
+    eff_max = np.asarray(eff_maxpipstep, dtype=float)[..., None]
+    live_delay = np.asarray(live_delay, dtype=float)[..., None]
+
+    # Gap after level j uses grid step k = LiveDelay + j, i.e. PipStep * Exp^(k-1)
+    k = live_delay + np.arange(1, levels + 1)
+    raw = pipstep * pipstep_exp ** (k - 1)
+    return np.where(eff_max > 0, np.minimum(eff_max, raw), raw)
+
+
+def level_volumes(lot, lot_exp, max_lots, live_delay, levels=LEVELS):
+    """Volume opened at each level; level 1 aggregates the LiveDelay lots."""
+    lot = np.asarray(lot, dtype=float)[..., None]
+    lot_exp = np.asarray(lot_exp, dtype=float)[..., None]
+    max_lots = np.asarray(max_lots, dtype=float)[..., None]
+    live_delay = np.asarray(live_delay, dtype=int)[..., None]
+
+    # Level 1: sum of theoretical lots 1..LiveDelay+1
+    n = np.arange(1, int(live_delay.max(initial=0)) + 2)
+    first = np.minimum(max_lots, lot * lot_exp ** (n - 1))
+    first = np.where(n <= live_delay + 1, first, 0.0).sum(axis=-1, keepdims=True)
+
+    # Level i >= 2: theoretical lot LiveDelay + i
+    i = np.arange(2, levels + 1)
+    rest = np.minimum(max_lots, lot * lot_exp ** (live_delay + i - 1))
+
+    batch = np.broadcast_shapes(first.shape[:-1], rest.shape[:-1])
+    first = np.broadcast_to(first, batch + (1,))
+    rest = np.broadcast_to(rest, batch + (levels - 1,))
+    return np.concatenate([first, rest], axis=-1)
+
+
+def theoretical_ladder(lot, lot_exp, max_lots, pipstep, pipstep_exp, eff_maxpipstep, live_delay,
+                       point, fx_factor=1.0, levels=LEVELS):
+    """
+    Returns (dd_usd, gap_pips, volumes, open_lots), each shaped (..., levels).
+    gap_pips[i-1] is the distance from the anchor to level i+1, i.e. where DD(i) is measured.
+    """
+    gaps = level_gaps(pipstep, pipstep_exp, eff_maxpipstep, live_delay, levels)
+    vols = level_volumes(lot, lot_exp, max_lots, live_delay, levels)
+    gaps, vols = np.broadcast_arrays(gaps, vols)
+
+    # Distance of level j from the anchor: d_1 = 0, d_{j+1} = d_j + gap_j
+    dist_next = np.cumsum(gaps, axis=-1)
+    dist_open = dist_next - gaps
+
+    # DD(i) = sum_{j<=i} vol_j * (d_{i+1} - d_j) = d_{i+1} * L_i - S_i
+    open_lots = np.cumsum(vols, axis=-1)
+    weighted = np.cumsum(vols * dist_open, axis=-1)
+    dd_pips_lots = dist_next * open_lots - weighted
+
+    usd_per_pip_lot = np.asarray(point, dtype=float) * CONTRACT_SIZE * np.asarray(fx_factor, dtype=float)
+    dd_usd = dd_pips_lots * np.asarray(usd_per_pip_lot)[..., None]
+    return dd_usd, dist_next, vols, open_lots
+
+
+def parse_thresholds(spec):
+    """Parses a comma separated list of USD thresholds into a sorted array."""
+    values = sorted({float(v) for v in str(spec).split(',') if v.strip()})
+    if not values or values[0] <= 0:
+        raise ValueError(f"Invalid thresholds '{spec}'. Use positive USD values, e.g. 500,1000,2000.")
+    return np.array(values)
+
+
+def breach_table(dd_usd, gap_pips, open_lots, thresholds=DEFAULT_THRESHOLDS):
+    """
+    Resolves every threshold against the (monotonic) DD ladder at once.
+    Returns (level, gap, lots), each shaped (..., len(thresholds)); level is 0 and gap/lots are NaN when never reached.
+    """
+    dd_usd = np.asarray(dd_usd, dtype=float)
+    gap_pips = np.asarray(gap_pips, dtype=float)
+    open_lots = np.asarray(open_lots, dtype=float)
+    thresholds = np.atleast_1d(np.asarray(thresholds, dtype=float))
+    levels = dd_usd.shape[-1]
+
+    # Index of the first level with DD >= threshold (searchsorted 'left' on each ladder row)
+    if dd_usd.ndim == 1:
+        idx = np.searchsorted(dd_usd, thresholds, side='left')
+    else:
+        idx = (dd_usd[..., None, :] < thresholds[:, None]).sum(axis=-1)
+    hit = idx < levels
+    idx_c = np.minimum(idx, levels - 1)
+
+    take = lambda a: np.take_along_axis(np.broadcast_to(a, dd_usd.shape), idx_c, axis=-1)
+    take_prev = lambda a: np.where(idx_c > 0, np.take_along_axis(np.broadcast_to(a, dd_usd.shape),
+                                                                 np.maximum(idx_c - 1, 0), axis=-1), 0.0)
+    curr_dd, prev_dd = take(dd_usd), take_prev(dd_usd)
+    curr_gap, prev_gap = take(gap_pips), take_prev(gap_pips)
+
+    # DD is linear in price between two levels, so linear interpolation is exact
+    span = curr_dd - prev_dd
+    frac = np.divide(thresholds - prev_dd, span, out=np.zeros_like(span), where=span > 0)
+    gap = prev_gap + (curr_gap - prev_gap) * frac
+
+    level = np.where(hit, idx_c + 1, 0)
+    gap = np.where(hit, gap, np.nan)
+    lots = np.where(hit, take(open_lots), np.nan)
+    return level, gap, lots
+
+
+def first_breach(dd_usd, gap_pips, open_lots, threshold=DEFAULT_THRESHOLD):
+    """Single-threshold form of breach_table; returns (level, gap, lots) without the threshold axis."""
+    level, gap, lots = breach_table(dd_usd, gap_pips, open_lots, [threshold])
+    return level[..., 0], gap[..., 0], lots[..., 0]
+
+
+def dd_at_move(move_pips, lot, lot_exp, max_lots, pipstep, pipstep_exp, eff_maxpipstep, live_delay,
+               point, fx_factor=1.0, levels=LEVELS):
+    """Floating DD in USD after an adverse move of move_pips from the anchor (levels open as price passes them)."""
+    gaps = level_gaps(pipstep, pipstep_exp, eff_maxpipstep, live_delay, levels)
+    vols = level_volumes(lot, lot_exp, max_lots, live_delay, levels)
+    dist_open = np.cumsum(gaps, axis=-1) - gaps
+
+    move = np.asarray(move_pips, dtype=float)[..., None]
+    dd_pips_lots = (vols * np.clip(move - dist_open, 0, None)).sum(axis=-1)
+    return dd_pips_lots * np.asarray(point, dtype=float) * CONTRACT_SIZE * np.asarray(fx_factor, dtype=float)
+
+
+def _bisect(fn, lo, hi, increasing, iterations=60):
+    """
+    Vectorized bisection on a monotonic fn.
+    increasing=True: largest x in [lo, hi] with fn(x) <= 0 (assumes fn(lo) <= 0).
+    increasing=False: smallest x in [lo, hi] with fn(x) <= 0 (NaN where fn(hi) > 0).
+    """
+    lo, hi = np.broadcast_arrays(np.asarray(lo, dtype=float), np.asarray(hi, dtype=float))
+    lo, hi = lo.copy(), hi.copy()
+    if increasing:
+        done = fn(hi) <= 0
+    else:
+        done = fn(lo) <= 0
+        infeasible = fn(hi) > 0
+
+    for _ in range(iterations):
+        mid = (lo + hi) / 2
+        ok = fn(mid) <= 0
+        if increasing:
+            lo = np.where(ok, mid, lo)
+            hi = np.where(ok, hi, mid)
+        else:
+            hi = np.where(ok, mid, hi)
+            lo = np.where(ok, lo, mid)
+
+    if increasing:
+        return np.where(done, hi, lo)
+    return np.where(infeasible, np.nan, np.where(done, lo, hi))
+
+
+def solve_max_lot(budget, move_pips, lot_exp, max_lots, pipstep, pipstep_exp, set_pipstep, maxpipstep,
+                  live_delay, point, fx_factor=1.0, levels=LEVELS):
+    """Largest starting LotSize whose DD after move_pips stays within budget (capped at MaxLots)."""
+    eff_max = effective_max_pipstep(pipstep, set_pipstep, maxpipstep)
+    fn = lambda lot: dd_at_move(move_pips, lot, lot_exp, max_lots, pipstep, pipstep_exp, eff_max,
+                                live_delay, point, fx_factor, levels) - budget
+    shape = np.broadcast_shapes(*[np.shape(a) for a in (budget, move_pips, lot_exp, max_lots, pipstep,
+                                                         pipstep_exp, set_pipstep, maxpipstep, live_delay,
+                                                         point, fx_factor)])
+    return _bisect(fn, np.zeros(shape), np.broadcast_to(np.asarray(max_lots, dtype=float), shape), increasing=True)
+
+
+def solve_min_pipstep(budget, move_pips, lot, lot_exp, max_lots, pipstep_exp, set_pipstep, maxpipstep,
+                      live_delay, point, fx_factor=1.0, levels=LEVELS, max_pips=10000.0):
+    """Smallest base pip gap whose DD after move_pips stays within budget (NaN if even max_pips breaches)."""
+    def fn(pipstep):
+        eff_max = effective_max_pipstep(pipstep, set_pipstep, maxpipstep)
+        return dd_at_move(move_pips, lot, lot_exp, max_lots, pipstep, pipstep_exp, eff_max,
+                          live_delay, point, fx_factor, levels) - budget
+    shape = np.broadcast_shapes(*[np.shape(a) for a in (budget, move_pips, lot, lot_exp, max_lots,
+                                                         pipstep_exp, set_pipstep, maxpipstep, live_delay,
+                                                         point, fx_factor)])
+    return _bisect(fn, np.full(shape, 0.01), np.full(shape, max_pips), increasing=False)
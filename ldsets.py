@@ -2,8 +2,15 @@ import os
 import argparse
 import re
 import math
-import shutil
+import numpy as np
+import pandas as pd
 from bs4 import BeautifulSoup
+import artifacts
+import grid
+from setfiles import read_inputs_from_file
+
+# Smallest sequence DD a variant is scored with, so a variant without any DD does not score infinitely
+DD_FLOOR = 1.0
 
 def parse_max_trades(html_path):
     """
@@ -101,9 +108,119 @@ def update_set_file(src_path, dst_path, live_delay):
         print(f"Error updating {src_path}: {e}")
         return False
 
+def load_sequences(trades_path):
+    """
+    Closed sequences of an all_trades_<report>.csv as padded arrays: entry prices (sequences x trades),
+    trade count, direction (+1 buy / -1 sell), volume-weighted exit price and time, recorded volume,
+    net result, costs (commission + swap) and USD per lot per price unit derived from the recorded profit.
+    """
+    df = pd.read_csv(trades_path)
+    df = df.assign(Direction=df['Direction'].astype(str).str.strip().str.lower())
+    df = df[(df['SequenceNumber'] > 0) & df['Direction'].isin(['in', 'out'])]
+    ins = df[df['Direction'] == 'in'].sort_values(['SequenceNumber', 'Time'])
+    outs = df[df['Direction'] == 'out']
+    if ins.empty or outs.empty:
+        return None
+
+    exit_grp = outs.assign(PV=outs['Price'] * outs['Volume']).groupby('SequenceNumber')
+    closed = exit_grp['Volume'].sum()
+    exit_price = exit_grp['PV'].sum() / closed
+    exit_time = exit_grp['Time'].max()
+    ins = ins[ins['SequenceNumber'].isin(closed.index)]
+    seq_ids = ins['SequenceNumber'].unique()
+    costs = (df['Commission'].fillna(0) + df['Swap'].fillna(0)).groupby(df['SequenceNumber']).sum().reindex(seq_ids).to_numpy()
+    profit = outs['Profit'].fillna(0).groupby(outs['SequenceNumber']).sum().reindex(seq_ids).to_numpy()
+
+    pos = ins.groupby('SequenceNumber').cumcount().to_numpy()
+    row = pd.Index(seq_ids).get_indexer(ins['SequenceNumber'])
+    count = np.bincount(row, minlength=len(seq_ids))
+    entry = np.full((len(seq_ids), count.max()), np.nan)
+    volume = np.zeros_like(entry)
+    entry[row, pos] = ins['Price'].to_numpy()
+    volume[row, pos] = ins['Volume'].to_numpy()
+
+    direction = np.where(ins.groupby('SequenceNumber', sort=False)['Type'].first().str.lower().to_numpy() == 'buy', 1.0, -1.0)
+    exit_price = exit_price.reindex(seq_ids).to_numpy()
+    move = direction * np.nansum(volume * (exit_price[:, None] - entry), axis=1)
+
+    # Recorded profit = usd_per_unit * lots * price move; fall back to the median where the move is ~0
+    with np.errstate(invalid='ignore', divide='ignore'):
+        usd_per_unit = np.where(np.abs(move) > 1e-9, profit / move, np.nan)
+    usd_per_unit = np.where(np.isfinite(usd_per_unit) & (usd_per_unit > 0), usd_per_unit, np.nanmedian(usd_per_unit[usd_per_unit > 0]) if np.any(usd_per_unit > 0) else np.nan)
+
+    order = np.argsort(exit_time.reindex(seq_ids).to_numpy(), kind='stable')
+    return {'entry': entry[order], 'count': count[order], 'direction': direction[order], 'exit': exit_price[order],
+            'volume': volume.sum(axis=1)[order], 'net': (profit + costs)[order], 'costs': costs[order],
+            'usd_per_unit': usd_per_unit[order]}
+
+def estimate_live_delays(seqs, lot, lot_exp, max_lots, base_ld, delays):
+    """
+    Replays every recorded sequence under each LiveDelay in delays (>= base_ld), all at once.
+
+    A sequence that reached absolute grid level base_ld + n only opens live trades under delay D if
+    base_ld + n > D. Its first live trade then sits at the recorded price of level D+1 with the
+    aggregated volume of lots 1..D+1, and later trades use lot D+i (grid.level_volumes, as in
+    analyze.py). Exits are kept at the recorded exit price; costs scale with the traded volume.
+    """
+    delays = np.asarray(delays, dtype=int)
+    entry, count = seqs['entry'], seqs['count']
+    n_seq, n_lvl = entry.shape
+    shift = delays - base_ld                                           # recorded trades skipped per variant
+
+    # Live entry prices per (sequence, variant, live trade): recorded trade shift + j
+    padded = np.concatenate([entry, np.full((n_seq, n_lvl), np.nan)], axis=1)
+    idx = np.clip(shift[:, None] + np.arange(n_lvl), 0, 2 * n_lvl - 1)
+    live_entry = padded[:, idx]                                        # (S, N, M)
+    # Theoretical lots rounded to the 0.01 volume step, as the broker fills them
+    vols = np.round(grid.level_volumes(lot, lot_exp, max_lots, delays, levels=n_lvl), 2)   # (N, M)
+    live_vols = np.where(np.isnan(live_entry), 0.0, vols[None, :, :])
+
+    k = seqs['usd_per_unit'][:, None]
+    direction = seqs['direction'][:, None]
+    deepest = entry[np.arange(n_seq), count - 1][:, None, None]
+    with np.errstate(invalid='ignore'):
+        gross = k * direction * np.nansum(live_vols * (seqs['exit'][:, None, None] - live_entry), axis=2)
+        seq_dd = k * direction * np.nansum(live_vols * (deepest - live_entry), axis=2)
+    traded = live_vols.sum(axis=2)
+    net = gross + seqs['costs'][:, None] * traded / np.where(seqs['volume'] > 0, seqs['volume'], 1.0)[:, None]
+    net = np.nan_to_num(net)
+
+    balance = np.cumsum(net, axis=0)
+    balance_dd = (balance - np.maximum(np.maximum.accumulate(balance, axis=0), 0.0)).min(axis=0)
+    levels = np.clip(count[:, None] - shift[None, :], 0, None)
+
+    return pd.DataFrame({
+        'LiveDelay': delays,
+        'Sequences': n_seq,
+        'Live Sequences': (levels > 0).sum(axis=0),
+        'Net PnL': net.sum(axis=0),
+        'Max Seq DD': np.minimum(np.nan_to_num(seq_dd).min(axis=0), 0.0),
+        'Max Balance DD': np.minimum(balance_dd, 0.0),
+        'Max Level': levels.max(axis=0),
+    })
+
+def rank_variants(est, base_ld, top, min_live=5):
+    """
+    Scores variants by Net PnL / max(|Max Seq DD|, DD_FLOOR) and selects the best `top` delays that
+    beat the recorded LiveDelay on that score without a deeper sequence DD. A variant needs at least
+    `min_live` live sequences, so an estimate from one or two sequences is never selected.
+    """
+    est = est.copy()
+    est['Score'] = est['Net PnL'] / est['Max Seq DD'].abs().clip(lower=DD_FLOOR)
+    base = est[est['LiveDelay'] == base_ld].iloc[0]
+    promising = ((est['LiveDelay'] > base_ld) & (est['Score'] > base['Score']) & (est['Max Seq DD'] >= base['Max Seq DD'])
+                 & (est['Net PnL'] > 0) & (est['Live Sequences'] >= min_live))
+    est['Rank'] = est['Score'].rank(ascending=False, method='first').astype(int)
+    est['Selected'] = False
+    est.loc[est[promising].sort_values('Score', ascending=False).index[:top], 'Selected'] = True
+    return est
+
 def main():
     parser = argparse.ArgumentParser(description='Create LiveDelay variations of set files based on Max Trades.')
     parser.add_argument('output_dir', type=str, help='Path to the analysis output directory (e.g., analysis/output_*)')
+    parser.add_argument('--top', type=int, default=2, help='Set files to write per report from the estimated ranking (default: 2).')
+    parser.add_argument('--min-live', type=int, default=5, help='Live sequences a variation needs to be selected (default: 5).')
+    parser.add_argument('--all', action='store_true', help='Write every LiveDelay variation without estimating (previous behaviour).')
     args = parser.parse_args()
 
     output_dir = os.path.abspath(args.output_dir)
@@ -128,21 +245,54 @@ def main():
     print(f"Extracted Max Trades for {len(report_max_trades)} reports.")
 
     # 3. Process each report
+    run_index = artifacts.get_run_index(output_dir)
+    trades_dir = os.path.join(output_dir, "Trades")
     created_count = 0
+    estimates = []
     for report_name, max_trades in report_max_trades.items():
         if max_trades > 4:
             max_ld = math.floor(max_trades / 2)
-            print(f"Processing {report_name}: Max Trades = {max_trades}, Creating {max_ld} variations...")
+            print(f"Processing {report_name}: Max Trades = {max_trades}, Estimating {max_ld} variations...")
 
             # Locate original set file
-            src_set_path = os.path.join(sets_dir, f"{report_name}.set")
-            if not os.path.exists(src_set_path):
-                # Try case-insensitive or partial match if needed, but Step 1 (list.py) copies it as {basename}.set
-                print(f"  Warning: Original set file not found at {src_set_path}")
+            # Step 1 (list.py) copies it as {basename}.set
+            src_set_path = run_index.get(report_name, 'set')
+            if not src_set_path:
+                print(f"  Warning: Original set file not found at {os.path.join(sets_dir, f'{report_name}.set')}")
                 continue
 
-            # 4. Create max_ld variations
-            for ld in range(1, max_ld + 1):
+            # 4. Estimate the variations from the recorded sequences and keep the promising ones
+            selected = list(range(1, max_ld + 1))
+            trades_path = os.path.join(trades_dir, f"all_trades_{report_name}.csv")
+            if not args.all:
+                est = None
+                base_ld = None
+                try:
+                    params = read_inputs_from_file(src_set_path, 'set')
+                    base_ld = int(float(params.get('LiveDelay', 0)))
+                    seqs = load_sequences(trades_path) if os.path.exists(trades_path) and max_ld > base_ld else None
+                    if seqs is not None:
+                        est = estimate_live_delays(seqs, float(params.get('LotSize', 0.01)), float(params.get('LotSizeExponent', 1)),
+                                                   float(params.get('MaxLots', 999)), base_ld, range(base_ld, max_ld + 1))
+                except Exception as e:
+                    print(f"  Warning: Could not estimate variations ({e})")
+                if base_ld is not None and max_ld <= base_ld:
+                    print(f"  LiveDelay={base_ld} is already at or above ld{max_ld}; no set files written.")
+                    selected = []
+                elif est is None:
+                    # Without estimates, only delays above the current LiveDelay are written
+                    selected = [ld for ld in selected if base_ld is None or ld > base_ld]
+                    print(f"  Warning: No closed sequences in {trades_path}; writing ld{selected[0]}..ld{selected[-1]}.")
+                else:
+                    est = rank_variants(est, base_ld, args.top, args.min_live)
+                    print(est.to_string(index=False, float_format=lambda v: f"{v:,.2f}"))
+                    est.insert(0, 'Report', report_name)
+                    estimates.append(est)
+                    selected = est.loc[est['Selected'], 'LiveDelay'].tolist()
+                    if not selected:
+                        print(f"  No variation beats LiveDelay={base_ld}; no set files written.")
+
+            for ld in selected:
                 dst_set_name = f"{report_name}_ld{ld}.set"
                 dst_set_path = os.path.join(ldsets_dir, dst_set_name)
                 
@@ -152,6 +302,11 @@ def main():
             # print(f"Skipping {report_name}: Max Trades = {max_trades} (<= 4)")
             pass
 
+    if estimates:
+        est_path = os.path.join(ldsets_dir, "ld_estimates.csv")
+        pd.concat(estimates, ignore_index=True).to_csv(est_path, index=False, float_format='%.2f')
+        print(f"\nEstimates saved to: {est_path}")
+
     print(f"\nDone. Created {created_count} new set files in {ldsets_dir}.")
 
 if __name__ == "__main__":
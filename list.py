@@ -5,12 +5,23 @@ from datetime import datetime
 import argparse
 import shutil
 import re
+import codecs
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
 from bs4 import BeautifulSoup
-import yfinance as yf
+import prices
+
+HEADER_CHUNK = 16384
+HEADER_MAX_BYTES = 1 << 20
+HASH_CHUNK = 1 << 20
 
 def generate_file_list():
     parser = argparse.ArgumentParser(description='Generate a CSV file list of .htm reports from a parent folder.')
     parser.add_argument('parent_path', type=str, help='Path to the parent folder containing the "HTML Reports" subfolder.')
+    parser.add_argument('--price-store', type=str, help='Shared price store folder (default: ~/.analyzedrawdown/prices).')
+    parser.add_argument('--offline', action='store_true', help='Do not download; use only what the price store already has.')
+    parser.add_argument('--workers', type=int, default=4, help='Parallel report scans and price downloads (default: 4).')
+    parser.add_argument('--no-hash', action='store_true', help='Skip the content hash in the report catalog.')
     args = parser.parse_args()
 
     # Get absolute path of the parent folder
@@ -78,17 +89,128 @@ def generate_file_list():
     print(f"Output folder created: {output_dir}")
     print(f"Report list saved to: {output_file}")
 
-    # Extract period from the first report
-    if htm_files:
+    # Catalog every report from its header region (in parallel)
+    print(f"\nCataloging {len(htm_files)} reports...")
+    df_catalog = build_catalog(htm_files, args.workers, not args.no_hash)
+    catalog_path = os.path.join(output_dir, "report_catalog.parquet")
+    try:
+        df_catalog.to_parquet(catalog_path, index=False)
+    except Exception as e:
+        catalog_path = os.path.join(output_dir, "report_catalog.csv")
+        print(f"  Warning: Could not write parquet ({e}), writing CSV instead.")
+        df_catalog.to_csv(catalog_path, index=False)
+    print(f"Report catalog saved to: {catalog_path}")
+
+    # Overall backtest period across all reports (falls back to a full parse of the first report)
+    start_date, end_date = None, None
+    if df_catalog['PeriodStart'].notna().any():
+        start_date = df_catalog['PeriodStart'].min()
+        end_date = df_catalog['PeriodEnd'].max()
+    else:
         first_report = htm_files[0]
         print(f"\nExtracting backtest period from: {first_report}")
         start_date, end_date = extract_period(first_report)
-        
-        if start_date and end_date:
-            print(f"\nExtracted Backtest Period: {start_date} to {end_date}")
-            download_fx_data(output_dir, start_date, end_date)
-        else:
-            print("\nCould not extract backtest period from the report.")
+
+    if start_date and end_date:
+        print(f"\nExtracted Backtest Period: {start_date} to {end_date}")
+        symbols = df_catalog['Symbol'].dropna().tolist()
+        download_fx_data(output_dir, start_date, end_date, symbols,
+                         args.price_store, args.offline, args.workers)
+    else:
+        print("\nCould not extract backtest period from the report.")
+
+def read_report_header(html_file):
+    """
+    Parses the MT5 report header (Symbol, Period, Initial Deposit, Total Deals) by decoding the
+    file in chunks and stopping as soon as all fields are found or the deals table starts.
+    """
+    fields = {'Symbol': None, 'Timeframe': None, 'PeriodStart': None, 'PeriodEnd': None,
+              'InitialDeposit': None, 'TotalDeals': None}
+    patterns = {
+        'Symbol': re.compile(r'Symbol:\s*([A-Za-z0-9._#]+)'),
+        'Period': re.compile(r'Period:\s*(\S+)\s*\((\d{4}\.\d{2}\.\d{2})\s*-\s*(\d{4}\.\d{2}\.\d{2})\)'),
+        'InitialDeposit': re.compile(r'Initial Deposit:\s*([\d\s\xa0]+(?:\.\d+)?)'),
+        'TotalDeals': re.compile(r'Total Deals:\s*(\d+)'),
+    }
+    # The deals table header marks the end of the summary section
+    deals_marker = re.compile(r'Time\s+Deal\s+Symbol\s+Type')
+
+    def complete(pattern):
+        # A match running into the end of the text may still continue in the next chunk
+        m = pattern.search(plain)
+        return m if m and m.end() < len(plain) else None
+
+    with open(html_file, 'rb') as f:
+        head = f.read(HEADER_CHUNK)
+        bom_utf16 = head[:2] in (b'\xff\xfe', b'\xfe\xff') or head[1:2] == b'\x00'
+        decoder = codecs.getincrementaldecoder('utf-16' if bom_utf16 else 'utf-8')(errors='ignore')
+        plain = ""
+        pending = ""
+        read = 0
+        chunk = head
+        while chunk:
+            read += len(chunk)
+            pending += decoder.decode(chunk)
+            # Strip tags from the new text only; an unclosed tag at the end waits for the next chunk
+            cut = pending.rfind('<')
+            if cut <= pending.rfind('>'):
+                cut = len(pending)
+            plain += re.sub(r'<[^>]+>', ' ', pending[:cut])
+            pending = pending[cut:]
+
+            if fields['Symbol'] is None and (m := complete(patterns['Symbol'])):
+                fields['Symbol'] = m.group(1)
+            if fields['Timeframe'] is None and (m := complete(patterns['Period'])):
+                fields['Timeframe'] = m.group(1)
+                fields['PeriodStart'] = m.group(2).replace('.', '-')
+                fields['PeriodEnd'] = m.group(3).replace('.', '-')
+            if fields['InitialDeposit'] is None and (m := complete(patterns['InitialDeposit'])):
+                try: fields['InitialDeposit'] = float(re.sub(r'[\s\xa0]', '', m.group(1)))
+                except ValueError: pass
+            if fields['TotalDeals'] is None and (m := complete(patterns['TotalDeals'])):
+                fields['TotalDeals'] = int(m.group(1))
+
+            if all(v is not None for v in fields.values()) or deals_marker.search(plain) or read >= HEADER_MAX_BYTES:
+                break
+            chunk = f.read(HEADER_CHUNK)
+    return fields
+
+def file_hash(path):
+    """Streams the whole file through BLAKE2b (no decoding) for change detection."""
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_CHUNK), b''):
+            h.update(block)
+    return h.hexdigest()
+
+def catalog_entry(html_file, with_hash=True):
+    """One catalog row: header fields plus file size, modification time and hash."""
+    st = os.stat(html_file)
+    entry = {'FilePath': os.path.abspath(html_file), 'FileName': os.path.basename(html_file)}
+    try:
+        entry.update(read_report_header(html_file))
+    except Exception as e:
+        print(f"  Warning: Could not read header of {html_file}: {e}")
+    if not entry.get('Symbol'):
+        # Fallback: first 6-letter token of the file name
+        for token in os.path.splitext(entry['FileName'])[0].split('_'):
+            if re.fullmatch(r'[A-Za-z]{6}', token):
+                entry['Symbol'] = token.upper()
+                break
+    entry['FileSize'] = st.st_size
+    entry['Modified'] = datetime.fromtimestamp(st.st_mtime)
+    entry['Hash'] = file_hash(html_file) if with_hash else None
+    return entry
+
+def build_catalog(htm_files, workers=8, with_hash=True):
+    """Catalogs all reports in parallel, sorted by file name like report_list.csv."""
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        rows = list(executor.map(lambda f: catalog_entry(f, with_hash), htm_files))
+    columns = ['FilePath', 'FileName', 'Symbol', 'Timeframe', 'PeriodStart', 'PeriodEnd',
+               'InitialDeposit', 'TotalDeals', 'FileSize', 'Modified', 'Hash']
+    df = pd.DataFrame(rows).reindex(columns=columns)
+    df['TotalDeals'] = df['TotalDeals'].astype('Int64')
+    return df.sort_values('FileName', key=lambda c: c.str.lower()).reset_index(drop=True)
 
 def extract_period(html_file):
     """Extracts start and end dates from the MetaTrader HTML report."""
@@ -136,48 +258,22 @@ def extract_period(html_file):
         print(f"Error extracting period: {e}")
     return None, None
 
-def download_fx_data(output_dir, start_date, end_date):
-    """Downloads daily FX close prices for specified pairs."""
-    fx_pairs = [
-        'EURUSD', 'USDCHF', 'USDJPY', 'USDCAD', 
-        'AUDUSD', 'GBPUSD', 'NZDUSD'
-    ]
-    
+def download_fx_data(output_dir, start_date, end_date, symbols=None, price_store=None, offline=False, workers=4):
+    """Updates the shared price store for the reports' quote currencies and links it into prices/."""
+    fx_pairs = prices.required_pairs(symbols or [])
+    if not fx_pairs:
+        fx_pairs = list(prices.DEFAULT_PAIRS)
+
     prices_dir = os.path.join(output_dir, "prices")
-    os.makedirs(prices_dir, exist_ok=True)
-    
-    print(f"Downloading daily close price data to: {prices_dir}")
-    
-    # Increase end_date by 1 day because yfinance end is exclusive
-    end_dt = datetime.strptime(end_date, "%Y-%m-%d")
-    from datetime import timedelta
-    adjusted_end_date = (end_dt + timedelta(days=1)).strftime("%Y-%m-%d")
-
-    for pair in fx_pairs:
-        ticker = f"{pair}=X"
-        print(f"  Downloading {pair}...", end="", flush=True)
-        try:
-            data = yf.download(ticker, start=start_date, end=adjusted_end_date, interval="1d", progress=False)
-            if not data.empty:
-                # In recent yfinance versions, data might have multi-index columns
-                # We extract the 'Close' price and simplify the structure
-                if isinstance(data.columns, pd.MultiIndex):
-                    data = data['Close']
-                else:
-                    data = data[['Close']]
-                
-                # Ensure we have a single column named 'Price' and index as 'Date'
-                df_export = pd.DataFrame(data)
-                df_export.columns = ['Price']
-                df_export.index.name = 'Date'
-                
-                output_path = os.path.join(prices_dir, f"{pair}.csv")
-                df_export.to_csv(output_path)
-                print(" Done.")
-            else:
-                print(" No data found.")
-        except Exception as e:
-            print(f" Error: {e}")
+    store = price_store or prices.default_store()
+    print(f"USD conversion pairs: {', '.join(fx_pairs)}")
+
+    missing = prices.update_store(fx_pairs, start_date, end_date, store, workers, offline)
+    if missing:
+        print(f"Warning: Price data incomplete for {', '.join(missing)}; USD conversion falls back to 1.0 where missing.")
+
+    print(f"Linking daily close price data to: {prices_dir}")
+    prices.link_into_run(fx_pairs, prices_dir, store)
 
 if __name__ == "__main__":
     generate_file_list()
@@ -0,0 +1,215 @@
+"""
+overlaps.py - Report Overlap Matrix
+
+Explains the "Overlapping Trades (Skipped)" list of analyze.py. The sequences of the
+included reports are rebuilt from Trades/all_trades_<report>.csv and, per symbol and side,
+swept once over their start/end events: every later sequence starting before an earlier
+one ends overlaps it. Each report is only visited at the events that happen while it has a
+sequence open, where the overlapping sequences and hours are added up per report pair, so
+neither the sequence pairs nor a time x report matrix is ever built. The result is a sparse
+report x report table (overlapping sequences and overlapping hours).
+
+The trades.py selection is replayed on the same sequences (with the caps recorded in
+Trades/selection.json), so every rejected sequence can be looked up with the accepted
+sequence that blocked it.
+
+Usage:
+    python overlaps.py <output_folder> [--top 20] [--report NAME]
+"""
+
+import os
+import json
+import argparse
+import numpy as np
+import pandas as pd
+from trades import select_sequences
+
+EPS = 1e-6
+
+
+def report_sequences(output_dir, included_only=True):
+    """
+    Closed sequences of the run's reports as a frame (Report, SourceFile, Seq, Symbol, Side,
+    Start, End), in the order trades.py collects them (report list order, then close time).
+    """
+    df_list = pd.read_csv(os.path.join(output_dir, "report_list.csv"))
+    if included_only and 'Include' in df_list.columns:
+        df_list = df_list[df_list['Include'] == 1]
+    frames = []
+    for fp in df_list['FilePath']:
+        source = os.path.basename(fp)
+        report = os.path.splitext(source)[0]
+        csv_path = os.path.join(output_dir, "Trades", f"all_trades_{report}.csv")
+        if not os.path.exists(csv_path):
+            continue
+        df = pd.read_csv(csv_path)
+        df = df[pd.to_numeric(df['SequenceNumber'], errors='coerce').fillna(0) > 0]
+        if df.empty:
+            continue
+        direction = df['Direction'].astype(str).str.strip().str.lower()
+        volume = pd.to_numeric(df['Volume'], errors='coerce').fillna(0)
+        df = df.assign(Time=pd.to_datetime(df['Time']),
+                       Net=np.where(direction == 'in', volume, np.where(direction == 'out', -volume, 0.0)))
+        g = df.groupby('SequenceNumber', sort=False)
+        seqs = pd.DataFrame({
+            'Seq': g['SequenceNumber'].first().astype(int),
+            'Symbol': g['Symbol'].first().astype(str),
+            'Side': np.where(g['Type'].first().astype(str).str.strip().str.lower() == 'buy', 'long', 'short'),
+            'Start': g['Time'].min(),
+            'End': g['Time'].max(),
+            'Open': g['Net'].sum().abs() > EPS,
+        })
+        # trades.py only keeps sequences that closed
+        seqs = seqs[~seqs['Open']].drop(columns='Open').sort_values('End', kind='stable')
+        seqs.insert(0, 'SourceFile', source)
+        seqs.insert(0, 'Report', report)
+        frames.append(seqs)
+    if not frames:
+        return pd.DataFrame(columns=['Report', 'SourceFile', 'Seq', 'Symbol', 'Side', 'Start', 'End'])
+    return pd.concat(frames, ignore_index=True)
+
+
+def overlap_pairs(seqs):
+    """
+    Overlapping sequence pairs of different reports on the same symbol and side, aggregated per
+    report pair without listing the pairs. Per symbol/side, the start (+1) and end (-1) events
+    are swept once in time order (starts before ends at the same time), so a sequence overlaps
+    every sequence open at its start. Each report is then visited only at the events that happen
+    while it has a sequence open:
+      Sequences(A, B) = sum over starts of B of A's open count (and vice versa),
+      Hours(A, B)     = integral of open_A * open_B
+                      = -(K[A, B] + K[B, A]),  K[A, B] = sum over events e of B of sign_e * t_e * open_A,
+    which follows from -sum(sign_e * sign_f * max(t_e, t_f)) over the event pairs of A and B.
+    Returns a frame with ReportA, ReportB (ReportA < ReportB), Symbol, Side, Sequences and Hours.
+    """
+    parts = []
+    for (symbol, side), g in seqs.groupby(['Symbol', 'Side'], sort=False):
+        names, code = np.unique(g['Report'].to_numpy().astype(str), return_inverse=True)
+        n_rep = len(names)
+        if n_rep < 2:
+            continue
+        start = g['Start'].to_numpy(dtype='datetime64[ns]').astype(np.int64)
+        end = g['End'].to_numpy(dtype='datetime64[ns]').astype(np.int64)
+        n = len(g)
+
+        # Event sweep: time, starts before ends, then the stable start order of trades.py
+        t = np.concatenate([start, end])
+        kind = np.repeat([0, 1], n)
+        first = np.argsort(start, kind='stable')
+        order_key = np.empty(n, dtype=np.int64)
+        order_key[first] = np.arange(n)
+        order = np.lexsort((np.concatenate([order_key, order_key]), kind, t))
+        sign = np.where(kind[order] == 0, 1.0, -1.0)
+        rep = np.concatenate([code, code])[order]
+        hours = (t[order] - t.min()) / 3.6e12
+        weight = sign * hours
+
+        counts = np.zeros((n_rep, n_rep))
+        k_mat = np.zeros((n_rep, n_rep))
+        by_report = np.argsort(rep, kind='stable')
+        bounds = np.searchsorted(rep[by_report], np.arange(n_rep + 1))
+        for a in range(n_rep):
+            own = by_report[bounds[a]:bounds[a + 1]]
+            level = np.cumsum(sign[own])
+            # Other events strictly between two events of A, while A has open sequences
+            level, lo, hi = level[:-1], own[:-1] + 1, own[1:]
+            keep = (level > 0) & (hi > lo)
+            if not keep.any():
+                continue
+            level, lo, hi = level[keep], lo[keep], hi[keep]
+            lens = hi - lo
+            idx = np.arange(lens.sum()) - np.repeat(np.cumsum(lens) - lens, lens) + np.repeat(lo, lens)
+            open_a = np.repeat(level, lens)
+            k_mat[a] = np.bincount(rep[idx], weights=weight[idx] * open_a, minlength=n_rep)
+            starts = sign[idx] > 0
+            counts[a] = np.bincount(rep[idx][starts], weights=open_a[starts], minlength=n_rep)
+
+        counts = np.rint(counts + counts.T).astype(np.int64)
+        hours = -(k_mat + k_mat.T)
+        a, b = np.nonzero(np.triu(counts, k=1))
+        if not len(a):
+            continue
+        parts.append(pd.DataFrame({'ReportA': names[a], 'ReportB': names[b], 'Symbol': symbol, 'Side': side,
+                                   'Sequences': counts[a, b], 'Hours': hours[a, b]}))
+    if not parts:
+        return pd.DataFrame(columns=['ReportA', 'ReportB', 'Symbol', 'Side', 'Sequences', 'Hours'])
+    return pd.concat(parts, ignore_index=True)
+
+
+def overlap_matrix(pairs):
+    """Sparse report x report table: overlapping sequence pairs and hours per unordered report pair."""
+    if pairs.empty:
+        return pd.DataFrame(columns=['Report', 'OverlapsWith', 'Sequences', 'Hours'])
+    a = np.minimum(pairs['ReportA'].to_numpy(), pairs['ReportB'].to_numpy())
+    b = np.maximum(pairs['ReportA'].to_numpy(), pairs['ReportB'].to_numpy())
+    table = pd.DataFrame({'Report': a, 'OverlapsWith': b, 'Sequences': pairs['Sequences'].to_numpy(), 'Hours': pairs['Hours'].to_numpy()})
+    table = table.groupby(['Report', 'OverlapsWith']).agg(Sequences=('Sequences', 'sum'), Hours=('Hours', 'sum')).reset_index()
+    return table.sort_values(['Sequences', 'Hours'], ascending=False, kind='stable').reset_index(drop=True)
+
+
+def rejections(seqs, selection=None):
+    """
+    Replays the trades.py selection and returns one row per rejected sequence: Report, Seq,
+    Symbol, Side, Start, End, Reason ('overlap' or 'cap'), BlockedBy and BlockedBySeq.
+    """
+    selection = selection or {}
+    items = [{'start': r.Start, 'end': r.End, 'symbol': r.Symbol, 'side': r.Side, 'report': r.Report, 'seq': r.Seq}
+             for r in seqs.itertuples()]
+    reasons = []
+    select_sequences(items, selection.get('max_concurrent'), selection.get('max_per_currency'), reasons)
+    return pd.DataFrame([{'Report': s['report'], 'Seq': s['seq'], 'Symbol': s['symbol'], 'Side': s['side'],
+                          'Start': s['start'], 'End': s['end'], 'Reason': reason,
+                          'BlockedBy': blocker['report'] if blocker else None,
+                          'BlockedBySeq': blocker['seq'] if blocker else None}
+                         for s, reason, blocker in reasons],
+                        columns=['Report', 'Seq', 'Symbol', 'Side', 'Start', 'End', 'Reason', 'BlockedBy', 'BlockedBySeq']).astype({'BlockedBySeq': 'Int64'})
+
+
+def read_selection(output_dir):
+    """Caps recorded by trades.py (Trades/selection.json), or {}."""
+    path = os.path.join(output_dir, "Trades", "selection.json")
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report x report overlap matrix and the reason each sequence was skipped.")
+    parser.add_argument("output_folder", help="Path to the output folder (analysis/output_*) with the Trades folder.")
+    parser.add_argument("--top", type=int, default=20, help="Report pairs listed (default: 20).")
+    parser.add_argument("--report", help="Only show the rejected sequences of this report.")
+    parser.add_argument("--all", action="store_true", help="Include reports with Include = 0 (matrix only).")
+    args = parser.parse_args()
+
+    output_dir = os.path.abspath(args.output_folder)
+    seqs = report_sequences(output_dir, included_only=not args.all)
+    if seqs.empty:
+        print("No sequences found.")
+        return
+
+    pd.set_option('display.width', 250)
+    matrix = overlap_matrix(overlap_pairs(seqs))
+    print(f"{len(seqs)} sequences of {seqs['Report'].nunique()} reports, {len(matrix)} overlapping report pairs.")
+    if not matrix.empty:
+        print(matrix.head(args.top).to_string(index=False, float_format=lambda x: f"{x:,.1f}"))
+
+    rejected = rejections(report_sequences(output_dir) if args.all else seqs, read_selection(output_dir))
+    if args.report:
+        rejected = rejected[rejected['Report'] == args.report]
+    print(f"\nRejected sequences: {len(rejected)}")
+    if not rejected.empty:
+        summary = rejected.groupby(['Report', 'Reason', 'BlockedBy'], dropna=False).size().rename('Sequences').reset_index()
+        print(summary.to_string(index=False))
+        if args.report:
+            print(rejected.to_string(index=False))
+
+    out_dir = os.path.join(output_dir, "overlaps")
+    os.makedirs(out_dir, exist_ok=True)
+    matrix.to_csv(os.path.join(out_dir, "overlap_matrix.csv"), index=False)
+    rejected.to_csv(os.path.join(out_dir, "rejections.csv"), index=False)
+    print(f"\nSaved to: {out_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+placement.py - Incremental File Placement
+
+File placement helpers used by arrange.py and export.py: copy, hardlink or reflink a file
+into place, skip destinations whose size and mtime already match, and keep a JSON
+manifest of what was placed where.
+"""
+
+import os
+import json
+import shutil
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+PLACE_MODES = ('copy', 'hardlink', 'reflink')
+FICLONE = 0x40049409  # Linux ioctl for copy-on-write clones (btrfs, XFS)
+
+
+def is_current(src_stat, dst):
+    """True if dst exists with the same size and mtime (to the second) as the source."""
+    try:
+        dst_stat = os.stat(dst)
+    except OSError:
+        return False
+    return dst_stat.st_size == src_stat.st_size and int(dst_stat.st_mtime) == int(src_stat.st_mtime)
+
+
+def _reflink(src, dst):
+    import fcntl
+    with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+        fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+    shutil.copystat(src, dst)
+
+
+def place_file(src, dst, mode='copy'):
+    """
+    Puts src at dst by copy, hardlink or reflink, replacing dst atomically.
+    Falls back to a plain copy when links are not supported (e.g. across drives). Returns the method used.
+    """
+    tmp = f"{dst}.tmp"
+    if os.path.lexists(tmp):
+        os.remove(tmp)
+    method = 'copy'
+    try:
+        if mode == 'hardlink':
+            os.link(src, tmp)
+            method = 'hardlink'
+        elif mode == 'reflink':
+            _reflink(src, tmp)
+            method = 'reflink'
+    except (OSError, ImportError):
+        if os.path.lexists(tmp):
+            os.remove(tmp)
+    if method == 'copy':
+        shutil.copy2(src, tmp)
+    os.replace(tmp, dst)
+    return method
+
+
+def place_files(jobs, mode='copy', workers=8, force=False):
+    """
+    Places (src, dst) jobs, skipping destinations that are already current unless force.
+    Cold files are placed on a thread pool. Returns {dst: manifest entry} for every job.
+    """
+    placed = {}
+    pending = []
+    for src, dst in jobs:
+        src_stat = os.stat(src)
+        entry = {'source': src, 'size': src_stat.st_size, 'mtime': int(src_stat.st_mtime)}
+        if not force and is_current(src_stat, dst):
+            entry['method'] = 'unchanged'
+            placed[dst] = entry
+        else:
+            pending.append((src, dst, entry))
+
+    def run(job):
+        src, dst, entry = job
+        entry['method'] = place_file(src, dst, mode)
+        return dst, entry
+
+    if pending:
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, len(pending)))) as executor:
+            for dst, entry in executor.map(run, pending):
+                placed[dst] = entry
+    return placed
+
+
+def read_manifest(path):
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"Warning: Could not read {path}: {e}")
+        return {}
+
+
+def write_manifest(path, files, **info):
+    """Writes {relative dst: entry} plus run info as JSON (atomic replace)."""
+    manifest = dict(info, updated=datetime.now().isoformat(timespec='seconds'), files=files)
+    tmp = f"{path}.tmp"
+    with open(tmp, 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp, path)
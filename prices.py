@@ -0,0 +1,354 @@
+"""
+prices.py - Shared Local FX Price Store
+
+Keeps one Parquet file of daily closes (Date, Price) per symbol in a folder shared by
+all analysis runs (default: ~/.analyzedrawdown/prices, or ANALYZEDRAWDOWN_PRICES / --price-store).
+Only date ranges the store has not covered yet are fetched from yfinance, in parallel and
+with retries. A successful fetch marks its whole range as covered (at most up to yesterday),
+weekends and holidays included; an empty response for a range with weekdays (yfinance also
+returns nothing when it throttles) and the current day are fetched again later. Runs link the
+store files into their prices/ folder, so a run needs no network when the store already
+covers its period.
+
+Usage:
+    python prices.py update --symbols EURUSD,USDJPY --start 2024-01-01 --end 2024-12-31
+    python prices.py import "C:/Path/To/prices_or_csv"
+    python prices.py list
+"""
+
+import os
+import re
+import glob
+import json
+import time
+import shutil
+import argparse
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+
+# Quote currencies traded as XXXUSD; every other quote currency is quoted as USDXXX
+USD_BASE_CURRENCIES = ('EUR', 'GBP', 'AUD', 'NZD')
+DEFAULT_PAIRS = ['EURUSD', 'USDCHF', 'USDJPY', 'USDCAD', 'AUDUSD', 'GBPUSD', 'NZDUSD']
+COVERAGE_FILE = "coverage.json"
+
+
+def default_store():
+    return os.environ.get("ANALYZEDRAWDOWN_PRICES") or os.path.join(os.path.expanduser("~"), ".analyzedrawdown", "prices")
+
+
+def clean_symbol(symbol):
+    """Broker symbol (e.g. EURUSD.m, GBPAUD_i) to its 6-letter pair, or None."""
+    match = re.match(r'^([A-Za-z]{6})', str(symbol).strip())
+    return match.group(1).upper() if match else None
+
+
+def required_pairs(symbols):
+    """USD conversion pairs needed for the quote currencies of the given report symbols."""
+    pairs = set()
+    for symbol in symbols:
+        pair = clean_symbol(symbol)
+        if not pair:
+            continue
+        quote = pair[3:]
+        if quote == 'USD':
+            continue
+        pairs.add(f"{quote}USD" if quote in USD_BASE_CURRENCIES else f"USD{quote}")
+    return sorted(pairs)
+
+
+def _to_date(value):
+    return pd.Timestamp(value).date()
+
+
+def _read_coverage(store):
+    path = os.path.join(store, COVERAGE_FILE)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"Warning: Could not read {path}: {e}")
+        return {}
+
+
+def _write_coverage(store, coverage):
+    path = os.path.join(store, COVERAGE_FILE)
+    tmp = f"{path}.tmp"
+    with open(tmp, 'w') as f:
+        json.dump(coverage, f, indent=1, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def _add_range(ranges, start, end):
+    """Adds [start, end] to a list of ISO date ranges and merges touching/overlapping ones."""
+    spans = sorted([(_to_date(s), _to_date(e)) for s, e in ranges] + [(_to_date(start), _to_date(end))])
+    merged = []
+    for s, e in spans:
+        if merged and s <= merged[-1][1] + timedelta(days=1):
+            merged[-1] = (merged[-1][0], max(merged[-1][1], e))
+        else:
+            merged.append((s, e))
+    return [[s.isoformat(), e.isoformat()] for s, e in merged]
+
+
+def missing_ranges(covered, start, end):
+    """Sub-ranges of [start, end] not in the covered list."""
+    start, end = _to_date(start), _to_date(end)
+    gaps = []
+    cursor = start
+    for s, e in sorted((_to_date(s), _to_date(e)) for s, e in covered):
+        if e < cursor:
+            continue
+        if s > end:
+            break
+        if s > cursor:
+            gaps.append((cursor, s - timedelta(days=1)))
+        cursor = max(cursor, e + timedelta(days=1))
+    if cursor <= end:
+        gaps.append((cursor, end))
+    return gaps
+
+
+def has_trading_days(start, end):
+    """True if [start, end] contains a weekday (FX trades Monday to Friday)."""
+    start, end = _to_date(start), _to_date(end)
+    return end >= start and bool(pd.bdate_range(start, end).size)
+
+
+def symbol_path(store, symbol):
+    return os.path.join(store, f"{symbol.upper()}.parquet")
+
+
+def load_symbol(store, symbol):
+    """Stored daily closes for symbol as a (Date, Price) frame, or None."""
+    path = symbol_path(store, symbol)
+    if not os.path.exists(path):
+        return None
+    return pd.read_parquet(path)
+
+
+def _merge_into_store(store, symbol, df_new):
+    df_old = load_symbol(store, symbol)
+    df = pd.concat([df_old, df_new]) if df_old is not None else df_new
+    df = df.drop_duplicates(subset='Date', keep='last').sort_values('Date').reset_index(drop=True)
+    path = symbol_path(store, symbol)
+    tmp = f"{path}.tmp"
+    df.to_parquet(tmp, index=False)
+    os.replace(tmp, path)
+    return len(df)
+
+
+def _normalize_closes(dates, closes):
+    df = pd.DataFrame({'Date': pd.to_datetime(dates, errors='coerce'), 'Price': pd.to_numeric(closes, errors='coerce')})
+    df = df.dropna()
+    df = df[df['Price'] > 0]
+    df['Date'] = df['Date'].dt.tz_localize(None) if df['Date'].dt.tz is not None else df['Date']
+    df['Date'] = df['Date'].dt.normalize()
+    return df.drop_duplicates(subset='Date', keep='last')
+
+
+def fetch_yfinance(symbol, start, end, retries=3):
+    """Downloads daily closes for [start, end] from yfinance; raises after the last failed attempt."""
+    import yfinance as yf
+
+    # yfinance treats end as exclusive
+    end_excl = (_to_date(end) + timedelta(days=1)).isoformat()
+    for attempt in range(retries):
+        try:
+            data = yf.download(f"{symbol}=X", start=_to_date(start).isoformat(), end=end_excl,
+                               interval="1d", progress=False)
+            if data.empty:
+                return pd.DataFrame(columns=['Date', 'Price'])
+            # In recent yfinance versions, data might have multi-index columns
+            close = data['Close']
+            if isinstance(close, pd.DataFrame):
+                close = close.iloc[:, 0]
+            return _normalize_closes(close.index, close.values)
+        except Exception:
+            if attempt == retries - 1:
+                raise
+            time.sleep(2 ** attempt)
+
+
+def update_store(symbols, start, end, store=None, workers=4, offline=False, retries=3):
+    """
+    Makes the store cover [start, end] for every symbol, fetching only the missing ranges.
+    Returns the list of symbols that are still not fully covered.
+    """
+    store = store or default_store()
+    os.makedirs(store, exist_ok=True)
+    coverage = _read_coverage(store)
+
+    jobs = []
+    for symbol in symbols:
+        for gap_start, gap_end in missing_ranges(coverage.get(symbol, []), start, end):
+            jobs.append((symbol, gap_start, gap_end))
+
+    if not jobs:
+        print(f"Price store is up to date for {len(symbols)} symbol(s): {store}")
+        return []
+    if offline:
+        incomplete = sorted({j[0] for j in jobs})
+        print(f"Offline: price store is missing data for {', '.join(incomplete)}")
+        return incomplete
+
+    print(f"Fetching {len(jobs)} missing range(s) into price store: {store}")
+
+    def run(job):
+        symbol, gap_start, gap_end = job
+        try:
+            return job, fetch_yfinance(symbol, gap_start, gap_end, retries), None
+        except Exception as e:
+            return job, None, e
+
+    # Downloads run in parallel; store writes and coverage stay on this thread
+    last_complete = datetime.now().date() - timedelta(days=1)
+    failed = set()
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        for (symbol, gap_start, gap_end), df_new, err in executor.map(run, jobs):
+            if err is not None:
+                print(f"  {symbol} {gap_start} - {gap_end}: Error: {err}")
+                failed.add(symbol)
+                continue
+            covered_end = min(gap_end, last_complete)
+            if df_new.empty and has_trading_days(gap_start, covered_end):
+                # yfinance also returns nothing when it fails or throttles; leave the gap open
+                print(f"  {symbol} {gap_start} - {gap_end}: no rows (not marked as covered)")
+                continue
+            if not df_new.empty:
+                _merge_into_store(store, symbol, df_new)
+            # A successful fetch covers the whole gap (weekends and holidays included), never past the last complete day
+            if covered_end >= gap_start:
+                coverage[symbol] = _add_range(coverage.get(symbol, []), gap_start, covered_end)
+            print(f"  {symbol} {gap_start} - {gap_end}: {len(df_new)} rows")
+
+    _write_coverage(store, coverage)
+    return sorted(failed)
+
+
+def import_csv(path, store=None, symbol=None):
+    """Imports Date/Price or OHLC (Close) CSV files into the store. path may be a file or a folder."""
+    store = store or default_store()
+    os.makedirs(store, exist_ok=True)
+    coverage = _read_coverage(store)
+    files = sorted(glob.glob(os.path.join(path, "*.csv"))) if os.path.isdir(path) else [path]
+
+    imported = []
+    for f in files:
+        sym = (symbol or clean_symbol(os.path.splitext(os.path.basename(f))[0]) or "").upper()
+        if not sym:
+            print(f"  Skipping {os.path.basename(f)}: no symbol in file name")
+            continue
+        try:
+            df = pd.read_csv(f, sep=None, engine='python')
+            cols = {str(c).strip('<>').strip().lower(): c for c in df.columns}
+            date_col = cols.get('date') or cols.get('datetime') or cols.get('time')
+            close_col = cols.get('price') or cols.get('close') or cols.get('adj close')
+            if date_col is None or close_col is None:
+                print(f"  Skipping {os.path.basename(f)}: no Date/Price or Close column")
+                continue
+            df_new = _normalize_closes(df[date_col], df[close_col])
+        except Exception as e:
+            print(f"  Skipping {os.path.basename(f)}: {e}")
+            continue
+        if df_new.empty:
+            continue
+        rows = _merge_into_store(store, sym, df_new)
+        coverage[sym] = _add_range(coverage.get(sym, []), df_new['Date'].min(), df_new['Date'].max())
+        imported.append(sym)
+        print(f"  Imported {sym}: {len(df_new)} rows ({rows} stored)")
+
+    _write_coverage(store, coverage)
+    return imported
+
+
+def _link_or_copy(src, dst):
+    if os.path.lexists(dst):
+        os.remove(dst)
+    try:
+        os.link(src, dst)
+        return "hardlink"
+    except OSError:
+        pass
+    try:
+        os.symlink(src, dst)
+        return "symlink"
+    except OSError:
+        shutil.copy2(src, dst)
+        return "copy"
+
+
+def link_into_run(symbols, prices_dir, store=None):
+    """Links the store files of symbols into a run's prices/ folder (hardlink, else symlink, else copy)."""
+    store = store or default_store()
+    os.makedirs(prices_dir, exist_ok=True)
+    linked = []
+    for symbol in symbols:
+        src = symbol_path(store, symbol)
+        if not os.path.exists(src):
+            print(f"  {symbol}: not in price store")
+            continue
+        mode = _link_or_copy(src, os.path.join(prices_dir, f"{symbol}.parquet"))
+        linked.append(symbol)
+        print(f"  {symbol}: {mode}")
+    return linked
+
+
+def load_price_folder(prices_dir):
+    """Loads a run's prices/ folder (.csv and .parquet) into {SYMBOL: DataFrame indexed by date}."""
+    rates = {}
+    if not os.path.exists(prices_dir):
+        return rates
+    for f in sorted(glob.glob(os.path.join(prices_dir, "*.csv")) + glob.glob(os.path.join(prices_dir, "*.parquet"))):
+        s = os.path.splitext(os.path.basename(f))[0].upper()
+        try:
+            rdf = pd.read_parquet(f) if f.endswith('.parquet') else pd.read_csv(f)
+            rdf['Date'] = pd.to_datetime(rdf['Date']).dt.date
+            rdf.set_index('Date', inplace=True)
+            rates[s] = rdf
+        except Exception:
+            pass
+    return rates
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the shared local FX price store.")
+    parser.add_argument("--price-store", help=f"Price store folder (default: {default_store()}).")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_update = sub.add_parser("update", help="Fetch missing date ranges from yfinance.")
+    p_update.add_argument("--symbols", default=",".join(DEFAULT_PAIRS), help="Comma separated pairs.")
+    p_update.add_argument("--start", required=True, help="Start date (YYYY-MM-DD).")
+    p_update.add_argument("--end", default=datetime.now().strftime("%Y-%m-%d"), help="End date (YYYY-MM-DD).")
+    p_update.add_argument("--workers", type=int, default=4, help="Parallel downloads (default: 4).")
+
+    p_import = sub.add_parser("import", help="Import CSV files (Date/Price or OHLC) into the store.")
+    p_import.add_argument("path", help="CSV file or folder of CSV files (symbol taken from the file name).")
+    p_import.add_argument("--symbol", help="Symbol for a single file whose name is not a pair.")
+
+    sub.add_parser("list", help="Show stored symbols and covered ranges.")
+    args = parser.parse_args()
+
+    store = args.price_store or default_store()
+    if args.command == "update":
+        symbols = [s.strip().upper() for s in args.symbols.split(',') if s.strip()]
+        failed = update_store(symbols, args.start, args.end, store, args.workers)
+        if failed:
+            print(f"Incomplete: {', '.join(failed)}")
+    elif args.command == "import":
+        import_csv(args.path, store, args.symbol)
+    else:
+        coverage = _read_coverage(store)
+        if not coverage:
+            print(f"Price store is empty: {store}")
+        for symbol in sorted(coverage):
+            df = load_symbol(store, symbol)
+            rows = len(df) if df is not None else 0
+            spans = ", ".join(f"{s} - {e}" for s, e in coverage[symbol])
+            print(f"{symbol:<8} {rows:>6} rows  {spans}")
+
+
+if __name__ == "__main__":
+    main()
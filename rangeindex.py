@@ -0,0 +1,220 @@
+"""
+rangeindex.py - Date-Window Metrics Index
+
+Answers PnL, max balance drawdown, trade count and max sequence length of any report (and
+of the portfolio of selected trades) for any [t0, t1) window in O(log n), without
+re-running analyze.py.
+
+Each report's closed deals are stored once in `rangeindex/<report>.npz` together with a
+segment tree over the deal PnL. A node holds (sum, max prefix, min prefix, max DD,
+max level) of its deals, and two nodes combine as
+    DD = min(DD_left, DD_right, sum_left + minprefix_right - maxprefix_left),
+so a window's DD (peak reset at the window start, as in analyze.py with --start) is the
+combination of O(log n) nodes. Indexes are rebuilt automatically when their Trades CSV
+changes.
+
+Usage:
+    python rangeindex.py build <output_folder>
+    python rangeindex.py query <output_folder> [--by year|quarter|month|week] [--start] [--end] [--report NAME] [--csv out.csv]
+"""
+
+import os
+import glob
+import argparse
+import numpy as np
+import pandas as pd
+
+INDEX_DIR = "rangeindex"
+PORTFOLIO = "PORTFOLIO"
+PERIODS = {'year': 'Y', 'quarter': 'Q', 'month': 'M', 'week': 'W'}
+
+
+def _combine(a, b):
+    """Combines two adjacent nodes (arrays or scalars), a before b."""
+    return (a[0] + b[0],
+            np.maximum(a[1], a[0] + b[1]),
+            np.minimum(a[2], a[0] + b[2]),
+            np.minimum(np.minimum(a[3], b[3]), a[0] + b[2] - a[1]),
+            np.maximum(a[4], b[4]))
+
+
+class RangeIndex:
+    """Segment tree over one deal stream (sorted times, PnL, entry counts and sequence levels per time)."""
+
+    def __init__(self, times, pnl, entries, seq):
+        self.times = np.asarray(times, dtype='datetime64[ns]')
+        self.entry_prefix = np.concatenate([[0], np.cumsum(np.asarray(entries, dtype=np.int64))])
+        n = len(self.times)
+        self.size = 1 << max(0, int(n - 1).bit_length())
+        pnl = np.asarray(pnl, dtype=float)
+
+        leaves = np.zeros((5, self.size))
+        leaves[0, :n] = pnl
+        leaves[1, :n] = np.maximum(pnl, 0)
+        leaves[2, :n] = np.minimum(pnl, 0)
+        leaves[3, :n] = np.minimum(pnl, 0)
+        leaves[4, :n] = np.asarray(seq, dtype=float)
+
+        # tree[:, 1] is the root, tree[:, size + i] leaf i; levels are combined vectorized
+        self.tree = np.zeros((5, 2 * self.size))
+        self.tree[:, self.size:] = leaves
+        width = self.size
+        while width > 1:
+            lo = width // 2
+            left = self.tree[:, width:2 * width:2]
+            right = self.tree[:, width + 1:2 * width:2]
+            self.tree[:, lo:width] = np.array(_combine(left, right))
+            width = lo
+
+    def _node(self, i):
+        return tuple(self.tree[:, i])
+
+    def query_rows(self, lo, hi):
+        """Metrics of deals [lo, hi) as a dict."""
+        left = right = (0.0, 0.0, 0.0, 0.0, 0.0)
+        a, b = lo + self.size, hi + self.size
+        while a < b:
+            if a & 1:
+                left = _combine(left, self._node(a))
+                a += 1
+            if b & 1:
+                b -= 1
+                right = _combine(self._node(b), right)
+            a //= 2
+            b //= 2
+        node = _combine(left, right)
+        return {'PnL': float(node[0]), 'MaxDD': float(node[3]), 'Trades': int(self.entry_prefix[hi] - self.entry_prefix[lo]),
+                'MaxSeq': int(node[4])}
+
+    def query(self, t0=None, t1=None):
+        """Metrics of the deals in [t0, t1) (None = open end)."""
+        lo = 0 if t0 is None else int(np.searchsorted(self.times, np.datetime64(pd.Timestamp(t0)), side='left'))
+        hi = len(self.times) if t1 is None else int(np.searchsorted(self.times, np.datetime64(pd.Timestamp(t1)), side='left'))
+        return self.query_rows(lo, max(lo, hi))
+
+
+def deal_arrays(df):
+    """
+    (times, pnl, entry counts, max sequence level) per deal timestamp of a Trades CSV frame,
+    without balance rows. Deals at the same timestamp are netted, as on analyze.py's balance grid.
+    """
+    df = df[df['Direction'].astype(str).str.lower().isin(['in', 'out', 'in/out'])]
+    df = pd.DataFrame({
+        'Time': pd.to_datetime(df['Time']),
+        'PnL': df['Profit'] + df['Commission'] + df['Swap'],
+        'Entries': df['Direction'].astype(str).str.lower().isin(['in', 'in/out']).astype(int),
+        'Seq': pd.to_numeric(df['TradeNumberInSequence'], errors='coerce') if 'TradeNumberInSequence' in df.columns else 0,
+    })
+    g = df.groupby('Time').agg(PnL=('PnL', 'sum'), Entries=('Entries', 'sum'), Seq=('Seq', 'max')).fillna(0)
+    return g.index.to_numpy(dtype='datetime64[ns]'), g['PnL'].to_numpy(), g['Entries'].to_numpy(), g['Seq'].to_numpy()
+
+
+def _sources(output_dir):
+    """{name: [csv paths]} of the per-report Trades files and the portfolio's selected trades."""
+    trades_folder = os.path.join(output_dir, "Trades")
+    sources = {os.path.basename(p)[len("all_trades_"):-len(".csv")]: [p]
+               for p in sorted(glob.glob(os.path.join(trades_folder, "all_trades_*.csv")))}
+    selected = sorted(glob.glob(os.path.join(trades_folder, "selected_trades_*.csv")))
+    if selected:
+        sources[PORTFOLIO] = selected
+    return sources
+
+
+def build_indexes(output_dir, force=False):
+    """Writes rangeindex/<name>.npz for every stale or missing index. Returns the number rebuilt."""
+    index_dir = os.path.join(output_dir, INDEX_DIR)
+    os.makedirs(index_dir, exist_ok=True)
+    rebuilt = 0
+    for name, paths in _sources(output_dir).items():
+        npz_path = os.path.join(index_dir, f"{name}.npz")
+        newest = max(os.path.getmtime(p) for p in paths)
+        if not force and os.path.exists(npz_path) and os.path.getmtime(npz_path) >= newest:
+            continue
+        df = pd.concat([pd.read_csv(p) for p in paths], ignore_index=True)
+        times, pnl, entries, seq = deal_arrays(df)
+        idx = RangeIndex(times, pnl, entries, seq)
+        np.savez(f"{npz_path}.tmp.npz", times=idx.times, entry_prefix=idx.entry_prefix, tree=idx.tree)
+        os.replace(f"{npz_path}.tmp.npz", npz_path)
+        rebuilt += 1
+    return rebuilt
+
+
+def load_index(npz_path):
+    idx = RangeIndex.__new__(RangeIndex)
+    with np.load(npz_path) as data:
+        idx.times = data['times']
+        idx.entry_prefix = data['entry_prefix']
+        idx.tree = data['tree']
+    idx.size = idx.tree.shape[1] // 2
+    return idx
+
+
+def load_indexes(output_dir, names=None):
+    """{name: RangeIndex} of the run, building missing or stale indexes first."""
+    build_indexes(output_dir)
+    index_dir = os.path.join(output_dir, INDEX_DIR)
+    wanted = names or list(_sources(output_dir))
+    return {name: load_index(os.path.join(index_dir, f"{name}.npz")) for name in wanted
+            if os.path.exists(os.path.join(index_dir, f"{name}.npz"))}
+
+
+def period_windows(start, end, by):
+    """[(label, t0, t1)] of the calendar periods covering [start, end)."""
+    periods = pd.period_range(pd.Timestamp(start), pd.Timestamp(end) - pd.Timedelta(nanoseconds=1), freq=PERIODS[by])
+    return [(str(p), p.start_time, (p + 1).start_time) for p in periods]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Instant per-window metrics from a precomputed range index of the run's trades.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_build = sub.add_parser("build", help="Build (or refresh) the range indexes of a run.")
+    p_build.add_argument("output_folder", help="Path to the output folder (analysis/output_*).")
+    p_build.add_argument("--force", action="store_true", help="Rebuild all indexes.")
+
+    p_query = sub.add_parser("query", help="PnL, max DD, trades and max sequence per window.")
+    p_query.add_argument("output_folder", help="Path to the output folder (analysis/output_*).")
+    p_query.add_argument("--by", choices=list(PERIODS), help="Break the period down by calendar window.")
+    p_query.add_argument("--start", help="Start date (YYYY-MM-DD).")
+    p_query.add_argument("--end", help="End date (YYYY-MM-DD, exclusive).")
+    p_query.add_argument("--report", action="append", help=f"Report name (repeatable; default: all reports and {PORTFOLIO}).")
+    p_query.add_argument("--csv", help="Save the result to this CSV file.")
+    args = parser.parse_args()
+
+    output_dir = os.path.abspath(args.output_folder)
+    if not os.path.isdir(os.path.join(output_dir, "Trades")):
+        print(f"Error: Trades folder not found in {output_dir}")
+        return
+    if args.command == "build":
+        rebuilt = build_indexes(output_dir, args.force)
+        print(f"Range indexes rebuilt: {rebuilt} ({os.path.join(output_dir, INDEX_DIR)})")
+        return
+
+    indexes = load_indexes(output_dir, args.report)
+    if not indexes:
+        print("No trade data found.")
+        return
+    filled = [idx for idx in indexes.values() if len(idx.times)]
+    if not filled:
+        print("No deals in the range indexes.")
+        return
+    first = min(idx.times[0] for idx in filled)
+    last = max(idx.times[-1] for idx in filled)
+    start = pd.Timestamp(args.start) if args.start else pd.Timestamp(first).normalize()
+    end = pd.Timestamp(args.end) if args.end else pd.Timestamp(last).normalize() + pd.Timedelta(days=1)
+    windows = period_windows(start, end, args.by) if args.by else [(f"{start.date()}..{end.date()}", start, end)]
+
+    rows = []
+    for label, t0, t1 in windows:
+        for name, idx in indexes.items():
+            rows.append({'Window': label, 'Report': name, **idx.query(max(t0, start), min(t1, end))})
+    df = pd.DataFrame(rows)
+    pd.set_option('display.width', 250)
+    pd.set_option('display.max_rows', 500)
+    print(df.to_string(index=False, float_format=lambda x: f"{x:,.2f}"))
+    if args.csv:
+        df.to_csv(args.csv, index=False)
+        print(f"Saved to: {args.csv}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+setfiles.py - .set / .chr Parameter Parsing
+
+Shared parser for MT5 .set files and the <inputs> block of .chr files, used by
+sets2csv.py and ldsets.py. Files are read once and decoded by BOM / NUL bytes
+(UTF-16 or UTF-8, latin-1 fallback).
+"""
+
+def decode_file(filename):
+    """Reads a file once and decodes it: BOM first, then NUL bytes mean UTF-16, else UTF-8 with a latin-1 fallback."""
+    with open(filename, 'rb') as file:
+        raw = file.read()
+    if raw.startswith((b'\xff\xfe', b'\xfe\xff')):
+        return raw.decode('utf-16')
+    if raw.startswith(b'\xef\xbb\xbf'):
+        return raw.decode('utf-8-sig')
+    if b'\x00' in raw:
+        return raw.decode('utf-16-le')
+    try:
+        return raw.decode('utf-8')
+    except UnicodeDecodeError:
+        return raw.decode('latin-1')
+
+def read_inputs_from_file(filename, file_ext):
+    """Parameters of one .chr (<inputs> block) or .set file as an ordered {name: value} dict."""
+    content = decode_file(filename)
+    data = {}
+
+    if file_ext == 'chr':
+        inside_inputs = False
+        for line in content.splitlines():
+            if '<inputs>' in line:
+                inside_inputs = True
+                continue
+            elif '</inputs>' in line:
+                inside_inputs = False
+                continue
+            # '=Group' lines are input group separators
+            if inside_inputs and not line.startswith('=') and '=' in line:
+                key, value = line.strip().split('=', 1)
+                data[key] = value
+
+        if not data:
+            raise ValueError(f"No inputs found in {filename}")
+
+    elif file_ext == 'set':
+        for line in content.splitlines():
+            if ';' in line:
+                continue
+            # Optimization ranges follow the value: Name=value||start||step||stop||N
+            first_part = line.split('||')[0].strip()
+            if '=' in first_part:
+                key, value = first_part.split('=', 1)
+                data[key] = value
+
+        if not data:
+            raise ValueError(f"No data found in file {filename}")
+
+    return data
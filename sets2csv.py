@@ -1,7 +1,10 @@
 import pandas as pd
 import os
 import sys
+import argparse
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
+from setfiles import read_inputs_from_file
 
 # Force unbuffered output (Windows compatible)
 if hasattr(sys.stdout, 'reconfigure'):
@@ -11,195 +14,146 @@ if hasattr(sys.stdout, 'reconfigure'):
     except:
         pass
 
-def read_inputs_from_file(filename, file_ext):
-    inside_inputs = False
-    data = []
-    
-    if file_ext == 'chr':
-        with open(filename, 'r', encoding='utf-16') as file:
-            for line in file:
-                # print(line)
-                if '<inputs>' in line:
-                    inside_inputs = True
-                    continue
-                elif '</inputs>' in line:
-                    inside_inputs = False
-                    continue
-                if line.startswith('='):
-                    blank = True
-                else:
-                    blank = False
-                
-                if inside_inputs and not blank:
-                    data.append(line.strip())
-                    
-        if not data:
-            raise ValueError(f"No inputs found in {filename}")
-            
-        df = pd.DataFrame([x.split('=') for x in data]).transpose()
-        df.columns = df.iloc[0]
-        df = df[1:]
-        
-    elif file_ext == 'set':
-        # Try different encodings - UTF-16 first, then UTF-8, then latin-1
-        file_encoding = None
-        file_content = None
-        
-        for encoding in ['utf-16', 'utf-8', 'latin-1']:
-            try:
-                with open(filename, 'r', encoding=encoding) as file:
-                    file_content = file.readlines()
-                file_encoding = encoding
-                break
-            except (UnicodeDecodeError, UnicodeError):
-                continue
-        
-        if file_encoding is None or file_content is None:
-            raise ValueError(f"Could not determine encoding for {filename}")
-        
-        # Process the content
-        for line in file_content:
-            if ';' not in line:
-                first_part = line.split('||')[0].strip()
-                data.append(first_part.split('='))
-        
-        if not data:
-            raise ValueError(f"No data found in file {filename}")
-        
-        df = pd.DataFrame(data).transpose()
-        if len(df) == 0:
-            raise ValueError(f"Empty DataFrame created from {filename}")
-        df.columns = df.iloc[0]
-        df = df[1:]
-    
+def _read_job(job):
+    path, file_ext = job
+    try:
+        return os.path.basename(path), read_inputs_from_file(path, file_ext), None
+    except Exception as e:
+        return os.path.basename(path), None, str(e)
+
+def read_folder(paths, file_ext, workers=None):
+    """Parses files in parallel into one wide table (union of all parameters, in order of first appearance)."""
+    jobs = [(p, file_ext) for p in paths]
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(jobs) < 64:
+        results = list(map(_read_job, jobs))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(_read_job, jobs, chunksize=max(1, len(jobs) // (4 * workers))))
+
+    records = []
+    for filename, data, error in results:
+        if error:
+            print(f"Error reading {file_ext} file {filename}: {error}")
+            continue
+        # A parameter named Filename must not replace (or collide with) the file name column
+        records.append({'Filename': filename, **{('Param_Filename' if k == 'Filename' else k): v for k, v in data.items()}})
+    if not records:
+        return pd.DataFrame()
+    return typed_columns(pd.DataFrame.from_records(records))
+
+def typed_columns(df):
+    """Converts parameter columns whose values are all numeric to Int64/float64; others stay text."""
+    for col in df.columns[1:]:
+        values = df[col].dropna()
+        if values.empty:
+            continue
+        numbers = pd.to_numeric(values, errors='coerce')
+        if numbers.isna().any():
+            continue
+        if values.str.fullmatch(r'\s*[+-]?\d+\s*').all():
+            df[col] = pd.to_numeric(df[col]).astype('Int64')
+        else:
+            df[col] = pd.to_numeric(df[col]).astype(float)
     return df
 
+def varying_columns(df):
+    """Keeps Filename and the parameters that differ between files (missing counts as a value)."""
+    keep = [c for c in df.columns[1:] if df[c].nunique(dropna=False) > 1]
+    return df[[df.columns[0]] + keep]
 
-    
-if __name__ == "__main__":
-    if len(sys.argv) != 2:
-        print("Usage: python sets2csv.py <directory_path>")
-        sys.exit(1)
+def write_parquet(df, path):
+    try:
+        df.to_parquet(path, index=False)
+        return True
+    except Exception as e:
+        print(f"Warning: Could not write {path} ({e}); CSV only.")
+        return False
+
+def fail(directory, error_msg, with_traceback=False):
+    print(error_msg, flush=True)
+    log_path = os.path.join(directory, 'error_log.txt') if os.path.isdir(directory) else 'error_log.txt'
+    with open(log_path, 'w') as f:
+        f.write(error_msg + '\n')
+        if with_traceback:
+            import traceback
+            traceback.print_exc()
+            traceback.print_exc(file=f)
+    sys.exit(1)
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert a folder of .set or .chr files into one parameter table (CSV and Parquet).")
+    parser.add_argument("directory", help="Folder with .set files, or .chr files (optionally with a sets/ or set/ subfolder).")
+    parser.add_argument("--diff", action="store_true", help="Only keep parameters that vary across files.")
+    parser.add_argument("--workers", type=int, help="Parser processes (default: CPU count).")
+    args = parser.parse_args()
 
     # Directory containing your files
-    directory = sys.argv[1]
-    
+    directory = args.directory
+
     # Verify directory exists
     if not os.path.exists(directory):
-        error_msg = f"Error: Directory does not exist: {directory}"
-        print(error_msg, flush=True)
-        log_path = os.path.join(directory, 'error_log.txt') if os.path.exists(os.path.dirname(directory)) else 'error_log.txt'
-        try:
-            with open(log_path, 'w') as f:
-                f.write(error_msg + '\n')
-        except:
-            with open('error_log.txt', 'w') as f:
-                f.write(error_msg + '\n')
-        sys.exit(1)
-    
+        fail(directory, f"Error: Directory does not exist: {directory}")
     if not os.path.isdir(directory):
-        error_msg = f"Error: Path is not a directory: {directory}"
-        print(error_msg, flush=True)
-        with open(os.path.join(directory, 'error_log.txt'), 'w') as f:
-            f.write(error_msg + '\n')
-        sys.exit(1)
-
-    # Detect file types in root
-    files_root = [f for f in os.listdir(directory) if os.path.isfile(os.path.join(directory, f))]
-    has_set_root = any(f.lower().endswith('.set') for f in files_root)
-    has_chr_root = any(f.lower().endswith('.chr') for f in files_root)
-
-    process_chr = False
-    process_set = False
+        fail(directory, f"Error: Path is not a directory: {directory}")
+
+    # Detect file types in root (one directory listing)
+    with os.scandir(directory) as entries:
+        files_root = sorted(e.name for e in entries if e.is_file())
+    chr_files = [f for f in files_root if f.lower().endswith('.chr')]
+    set_files = [f for f in files_root if f.lower().endswith('.set')]
     set_directory = directory
 
-    if has_set_root and has_chr_root:
-        error_msg = "Error: Input directory contains both *.set and *.chr files. Please provide a directory with only one type."
-        print(error_msg, flush=True)
-        with open(os.path.join(directory, 'error_log.txt'), 'w') as f:
-            f.write(error_msg + '\n')
-        sys.exit(1)
-    
-    if has_set_root:
-        process_set = True
-        set_directory = directory
+    if set_files and chr_files:
+        fail(directory, "Error: Input directory contains both *.set and *.chr files. Please provide a directory with only one type.")
+
+    if set_files:
         file_ext_name = 'set'
-    elif has_chr_root:
-        process_chr = True
+    elif chr_files:
         file_ext_name = 'chr'
         # Check for sets or set subdirectory
         for subdir_name in ['sets', 'set']:
             subdir_path = os.path.join(directory, subdir_name)
             if os.path.isdir(subdir_path):
-                subdir_files = [f for f in os.listdir(subdir_path) if f.lower().endswith('.set')]
+                subdir_files = sorted(f for f in os.listdir(subdir_path) if f.lower().endswith('.set'))
                 if subdir_files:
-                    process_set = True
+                    set_files = subdir_files
                     set_directory = subdir_path
                     file_ext_name = 'chr_and_set'
                     break
     else:
-        error_msg = f"Error: No .set or .chr files found in {directory}"
-        print(error_msg, flush=True)
-        with open(os.path.join(directory, 'error_log.txt'), 'w') as f:
-            f.write(error_msg + '\n')
-        sys.exit(1)
+        fail(directory, f"Error: No .set or .chr files found in {directory}")
 
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    out_file = f'all_sets_{file_ext_name}_{timestamp}.csv'
-    
-    chr_dfs = []
-    set_dfs = []
-
-    # Process CHR files if found in root
-    if process_chr:
-        for filename in files_root:
-            if filename.lower().endswith('.chr'):
-                try:
-                    df = read_inputs_from_file(os.path.join(directory, filename), 'chr')
-                    df.insert(0, 'Filename', filename)
-                    chr_dfs.append(df)
-                except Exception as e:
-                    print(f"Error reading chr file {filename}: {e}")
-                    continue
-
-    # Process SET files if found in root or subdir
-    if process_set:
-        files_set = [f for f in os.listdir(set_directory) if f.lower().endswith('.set')]
-        for filename in files_set:
-            try:
-                df = read_inputs_from_file(os.path.join(set_directory, filename), 'set')
-                df.insert(0, 'Filename', filename)
-                set_dfs.append(df)
-            except Exception as e:
-                print(f"Error reading set file {filename}: {e}")
-                continue
+    stem = f"all_sets_{file_ext_name}{'_diff' if args.diff else ''}_{timestamp}"
 
     try:
-        output_path = os.path.join(directory, out_file)
-        
-        if chr_dfs and set_dfs:
-            # Both types processed
-            final_chr_df = pd.concat(chr_dfs, ignore_index=True)
-            final_set_df = pd.concat(set_dfs, ignore_index=True)
-            
-            # Write CHR table
+        final_chr_df = read_folder([os.path.join(directory, f) for f in chr_files], 'chr', args.workers)
+        final_set_df = read_folder([os.path.join(set_directory, f) for f in set_files], 'set', args.workers)
+        if args.diff:
+            final_chr_df = varying_columns(final_chr_df) if not final_chr_df.empty else final_chr_df
+            final_set_df = varying_columns(final_set_df) if not final_set_df.empty else final_set_df
+
+        output_path = os.path.join(directory, f"{stem}.csv")
+
+        if not final_chr_df.empty and not final_set_df.empty:
+            # Both types processed: CHR table, 3 empty rows, SET table
             final_chr_df.to_csv(output_path, index=False)
-            
-            # Append empty rows and SET table
             with open(output_path, 'a', newline='') as f:
-                f.write('\n\n\n') # 3 empty rows
-            
+                f.write('\n\n\n')
             final_set_df.to_csv(output_path, mode='a', index=False)
+            write_parquet(final_chr_df, os.path.join(directory, f"{stem}_chr.parquet"))
+            write_parquet(final_set_df, os.path.join(directory, f"{stem}_set.parquet"))
             success_msg = f"Data (CHR and SET) has been written to {output_path}"
-        
-        elif chr_dfs:
-            final_chr_df = pd.concat(chr_dfs, ignore_index=True)
+
+        elif not final_chr_df.empty:
             final_chr_df.to_csv(output_path, index=False)
+            write_parquet(final_chr_df, os.path.join(directory, f"{stem}.parquet"))
             success_msg = f"Data (CHR only) has been written to {output_path}"
-            
-        elif set_dfs:
-            final_set_df = pd.concat(set_dfs, ignore_index=True)
+
+        elif not final_set_df.empty:
             final_set_df.to_csv(output_path, index=False)
+            write_parquet(final_set_df, os.path.join(directory, f"{stem}.parquet"))
             success_msg = f"Data (SET only) has been written to {output_path}"
         else:
             raise ValueError("No data extracted from any files.")
@@ -207,11 +161,7 @@ if __name__ == "__main__":
         print(success_msg, flush=True)
 
     except Exception as e:
-        error_msg = f"Error processing files: {e}"
-        print(error_msg, flush=True)
-        import traceback
-        traceback.print_exc()
-        with open(os.path.join(directory, 'error_log.txt'), 'w') as f:
-            f.write(error_msg + '\n')
-            traceback.print_exc(file=f)
-        sys.exit(1)
+        fail(directory, f"Error processing files: {e}", with_traceback=True)
+
+if __name__ == "__main__":
+    main()
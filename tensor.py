@@ -0,0 +1,272 @@
+"""
+tensor.py - Memory-Mapped Equity Tensor
+
+Stores the floating PnL (EQUITY - initial deposit) of every report of a run on one common
+time grid, as a float32 matrix (time x report) in `tensor/equity.f32` with a JSON sidecar
+(`tensor/index.json`) holding the grid, report names, Include flags and source files.
+
+The matrix is written in column-major (Fortran) order, so each report is one contiguous
+block on disk and is filled without ever holding the full matrix in RAM. Portfolio subsets
+and weights are evaluated through a memory map, one block of rows at a time, as a
+matrix-vector product. Parquet files are only read again when the tensor is rebuilt, which
+happens when a parquet file or an Include flag of report_list.csv changes.
+
+A grid cell holds the minimum equity over its interval (the forward-filled value at the
+cell start and every point inside it), so coarser grids keep each report's troughs.
+
+Usage:
+    python tensor.py build <output_folder> [--freq 1min] [--force]
+    python tensor.py eval <output_folder> [--reports A,B] [--weights A=2,B=0.5] [--all] [--start] [--end]
+"""
+
+import os
+import json
+import shutil
+import argparse
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+import artifacts
+import equity
+
+TENSOR_DIR = "tensor"
+DATA_FILE = "equity.f32"
+INDEX_FILE = "index.json"
+BLOCK_ROWS = 1_000_000
+
+
+def run_reports(output_dir):
+    """(basename, include flag, parquet path or None) of every report in report_list.csv."""
+    df_list = pd.read_csv(os.path.join(output_dir, "report_list.csv"))
+    index = artifacts.get_run_index(output_dir, df_list['FilePath'].tolist())
+    includes = df_list['Include'].tolist() if 'Include' in df_list.columns else [1] * len(df_list)
+    reports = []
+    for fp, inc in zip(df_list['FilePath'], includes):
+        basename = os.path.splitext(os.path.basename(fp))[0]
+        reports.append((basename, int(inc) == 1, index.get(basename, 'parquet')))
+    return reports
+
+
+def _source_info(name, inc, path):
+    """Staleness key of one report: its parquet file and its Include flag."""
+    st = os.stat(path)
+    return {'report': name, 'include': inc, 'path': path, 'size': st.st_size, 'mtime': st.st_mtime}
+
+
+def grid_column(times, levels, start, step, rows):
+    """Resamples one report onto the grid: forward-filled level at each cell start, lowered by any point inside the cell."""
+    col = np.empty(rows, dtype=np.float32)
+    for lo in range(0, rows, BLOCK_ROWS):
+        hi = min(lo + BLOCK_ROWS, rows)
+        grid = start + np.arange(lo, hi, dtype=np.int64) * step
+        idx = np.searchsorted(times, grid, side='right') - 1
+        col[lo:hi] = np.where(idx >= 0, levels[np.maximum(idx, 0)], 0.0)
+
+    inside = (times - start) % step != 0
+    if inside.any():
+        cells = (times[inside] - start) // step
+        np.minimum.at(col, cells, levels[inside].astype(np.float32))
+    return col
+
+
+def build_tensor(output_dir, freq='1min', workers=4, force=False):
+    """Writes tensor/equity.f32 and tensor/index.json for the run. Returns the sidecar dict."""
+    tensor_dir = os.path.join(output_dir, TENSOR_DIR)
+    index_path = os.path.join(tensor_dir, INDEX_FILE)
+    data_path = os.path.join(tensor_dir, DATA_FILE)
+
+    reports = [(name, inc, path) for name, inc, path in run_reports(output_dir) if path]
+    sources = [_source_info(name, inc, path) for name, inc, path in reports]
+    if not reports:
+        print("No parquet equity files found.")
+        return None
+
+    if not force and os.path.exists(index_path) and os.path.exists(data_path):
+        with open(index_path, 'r', encoding='utf-8') as f:
+            old = json.load(f)
+        if old.get('freq') == freq and old.get('sources') == sources:
+            print(f"Tensor is up to date: {data_path}")
+            return old
+
+    # Parse in parallel and spill each report's change events to .npy, so at most one report per
+    # worker is in RAM; the grid span is then read from the spilled times
+    os.makedirs(tensor_dir, exist_ok=True)
+    spill_dir = tempfile.mkdtemp(prefix="spill_", dir=tensor_dir)
+    try:
+        spilled = equity.spill_events([path for _, _, path in reports], spill_dir, workers)
+        if not spilled:
+            print("No equity curves found.")
+            return None
+        column = {path: i for i, (_, _, path) in enumerate(reports)}
+        keep = [column[path] for path, _, _ in spilled]
+
+        step = int(pd.Timedelta(freq).value)
+        bounds = [(int(t[0]), int(t[-1])) for t in (np.load(t_path, mmap_mode='r') for _, t_path, _ in spilled)]
+        first = min(b[0] for b in bounds)
+        last = max(b[1] for b in bounds)
+        start = first - first % step
+        rows = (last - start) // step + 1
+        size = rows * len(keep) * 4
+
+        free = shutil.disk_usage(tensor_dir).free + (os.path.getsize(data_path) if os.path.exists(data_path) else 0)
+        if size > free:
+            raise OSError(f"Tensor needs {size / 1e9:.2f} GB but only {free / 1e9:.2f} GB are free in {tensor_dir}. Use a coarser --freq.")
+
+        tmp_path = f"{data_path}.tmp"
+        mat = np.memmap(tmp_path, dtype=np.float32, mode='w+', shape=(rows, len(keep)), order='F')
+
+        def write_column(job):
+            # Grid one report straight into its column; its events are freed when the task ends
+            col, (_, t_path, d_path) = job
+            times = np.load(t_path)
+            mat[:, col] = grid_column(times, np.cumsum(np.load(d_path)), start, step, rows)
+
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            list(executor.map(write_column, enumerate(spilled)))
+        mat.flush()
+        del mat
+        os.replace(tmp_path, data_path)
+    finally:
+        shutil.rmtree(spill_dir, ignore_errors=True)
+
+    info = {
+        'freq': freq,
+        'start': str(pd.Timestamp(start)),
+        'rows': int(rows),
+        'dtype': 'float32',
+        'order': 'F',
+        'reports': [reports[i][0] for i in keep],
+        'include': [reports[i][1] for i in keep],
+        'sources': sources,
+    }
+    with open(f"{index_path}.tmp", 'w', encoding='utf-8') as f:
+        json.dump(info, f, indent=1)
+    os.replace(f"{index_path}.tmp", index_path)
+    print(f"Tensor saved to: {data_path} ({rows:,} x {len(keep)}, {size / 1e6:,.1f} MB)")
+    return info
+
+
+class EquityTensor:
+    """Read-only view of a run's equity tensor."""
+
+    def __init__(self, output_dir):
+        tensor_dir = os.path.join(output_dir, TENSOR_DIR)
+        with open(os.path.join(tensor_dir, INDEX_FILE), 'r', encoding='utf-8') as f:
+            self.info = json.load(f)
+        self.reports = self.info['reports']
+        self.include = self.info['include']
+        self.start = pd.Timestamp(self.info['start'])
+        self.step = pd.Timedelta(self.info['freq'])
+        self.rows = self.info['rows']
+        self.data = np.memmap(os.path.join(tensor_dir, DATA_FILE), dtype=np.float32, mode='r',
+                              shape=(self.rows, len(self.reports)), order='F')
+
+    def times(self, lo=0, hi=None):
+        hi = self.rows if hi is None else hi
+        return self.start + pd.to_timedelta(np.arange(lo, hi) * self.step.value)
+
+    def row_range(self, start=None, end=None):
+        """Row slice [lo, hi) covering start..end (end date inclusive)."""
+        lo = 0 if start is None else max(0, int(np.ceil((pd.Timestamp(start) - self.start) / self.step)))
+        hi = self.rows if end is None else min(self.rows, int((pd.Timestamp(end) + pd.Timedelta(days=1) - self.start) / self.step))
+        return lo, max(lo, hi)
+
+    def weight_vector(self, weights=None, reports=None, include_all=False):
+        """Weights per column: explicit weights, else 1 for the selected (default: included) reports."""
+        if weights:
+            unknown = set(weights) - set(self.reports)
+            if unknown:
+                raise KeyError(f"Unknown reports: {', '.join(sorted(unknown))}")
+            return np.array([float(weights.get(r, 0.0)) for r in self.reports])
+        if reports:
+            unknown = set(reports) - set(self.reports)
+            if unknown:
+                raise KeyError(f"Unknown reports: {', '.join(sorted(unknown))}")
+            return np.array([1.0 if r in reports else 0.0 for r in self.reports])
+        return np.array([1.0 if include_all or inc else 0.0 for inc in self.include])
+
+    def portfolio(self, w, start=None, end=None):
+        """Weighted portfolio floating PnL per grid row (float64), one block of rows at a time."""
+        lo, hi = self.row_range(start, end)
+        cols = np.flatnonzero(w)
+        out = np.zeros(hi - lo)
+        if not len(cols):
+            return out
+        w_sel = w[cols]
+        for b in range(lo, hi, BLOCK_ROWS):
+            e = min(b + BLOCK_ROWS, hi)
+            out[b - lo:e - lo] = self.data[b:e, cols].astype(np.float64) @ w_sel
+        return out
+
+
+def max_drawdown(pnl, base=100000.0):
+    """(max DD abs, max DD %, row of the abs trough) of base + pnl."""
+    if not len(pnl):
+        return 0.0, 0.0, None
+    eq = base + pnl
+    peaks = np.maximum.accumulate(eq)
+    dd = eq - peaks
+    i = int(dd.argmin())
+    return float(dd[i]), float(((eq / peaks) - 1).min() * 100), i
+
+
+def parse_weights(text):
+    weights = {}
+    for item in text.split(','):
+        name, _, value = item.strip().rpartition('=')
+        weights[name] = float(value)
+    return weights
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memory-mapped time x report equity tensor of a run.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_build = sub.add_parser("build", help="Resample every report's parquet equity onto a common grid.")
+    p_build.add_argument("output_folder", help="Path to the output folder (analysis/output_*).")
+    p_build.add_argument("--freq", default="1min", help="Grid step (pandas offset, e.g. 1min, 5min, 1h; default: 1min).")
+    p_build.add_argument("--workers", type=int, default=4, help="Parallel parquet parsers (default: 4).")
+    p_build.add_argument("--force", action="store_true", help="Rebuild even if the sources are unchanged.")
+
+    p_eval = sub.add_parser("eval", help="Portfolio DD of a subset or weighting of reports.")
+    p_eval.add_argument("output_folder", help="Path to the output folder (analysis/output_*).")
+    p_eval.add_argument("--reports", help="Comma list of reports (default: the included reports).")
+    p_eval.add_argument("--weights", help="Comma list of report=weight (lot multipliers).")
+    p_eval.add_argument("--all", action="store_true", help="All reports in the tensor.")
+    p_eval.add_argument("--base", type=float, default=100000.0, help="Base capital (default: 100,000).")
+    p_eval.add_argument("--start", help="Start date (YYYY-MM-DD).")
+    p_eval.add_argument("--end", help="End date (YYYY-MM-DD).")
+    args = parser.parse_args()
+
+    output_dir = os.path.abspath(args.output_folder)
+    if args.command == "build":
+        build_tensor(output_dir, args.freq, args.workers, args.force)
+        return
+
+    if not os.path.exists(os.path.join(output_dir, TENSOR_DIR, INDEX_FILE)):
+        print(f"No tensor in {output_dir}. Run: python tensor.py build \"{args.output_folder}\"")
+        return
+    tensor = EquityTensor(output_dir)
+    reports = [r.strip() for r in args.reports.split(',')] if args.reports else None
+    weights = parse_weights(args.weights) if args.weights else None
+    try:
+        w = tensor.weight_vector(weights, reports, args.all)
+    except KeyError as e:
+        print(f"Error: {e.args[0]}")
+        return
+
+    pnl = tensor.portfolio(w, args.start, args.end)
+    dd_abs, dd_pct, i = max_drawdown(pnl, args.base)
+    lo, _ = tensor.row_range(args.start, args.end)
+    print(f"Reports: {int(np.count_nonzero(w))} of {len(tensor.reports)} (grid {tensor.info['freq']}, {tensor.rows:,} rows)")
+    if i is None:
+        print("No rows in the selected period.")
+        return
+    print(f"Final Floating PnL: {pnl[-1]:,.2f}")
+    print(f"Max Floating DD: {dd_abs:,.2f} [{tensor.times(lo + i, lo + i + 1)[0]}]")
+    print(f"Max Floating DD %: {dd_pct:.2f}%")
+
+
+if __name__ == "__main__":
+    main()
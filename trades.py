@@ -4,8 +4,11 @@ import shutil
 import glob
 from bs4 import BeautifulSoup
 import io
+import json
 import argparse
+import heapq
 from datetime import datetime
+from prices import clean_symbol
 
 def parse_sequences_and_deals(file_path):
     try:
@@ -174,10 +177,66 @@ def parse_sequences_and_deals(file_path):
         print(f"Error parsing {os.path.basename(file_path)}: {e}")
         return [], []
 
+def select_sequences(sequences, max_concurrent=None, max_per_currency=None, reasons=None):
+    """
+    Greedy selection in start order: a sequence is accepted if it does not overlap the last
+    accepted sequence of its symbol and side and, when caps are set, fewer than max_concurrent
+    sequences (portfolio-wide) and fewer than max_per_currency sequences per currency of the
+    pair are still open. Open sequences are kept in end-time heaps, so this is O(n log n).
+    Returns ({symbol: [sequences]}, {'overlap': n, 'cap': n}) with the rejected counts.
+    If a reasons list is given, (sequence, 'overlap' or 'cap', blocking sequence or None) is
+    appended for every rejected sequence.
+    """
+    selected = {}
+    rejected = {'overlap': 0, 'cap': 0}
+    last = {}
+    open_all = []
+    open_ccy = {}
+
+    for s in sorted(sequences, key=lambda x: x['start']):
+        key = (s['symbol'], s.get('side', 'long'))
+        if key in last and s['start'] <= last[key]['end']:
+            rejected['overlap'] += 1
+            if reasons is not None:
+                reasons.append((s, 'overlap', last[key]))
+            continue
+
+        pair = clean_symbol(s['symbol'])
+        currencies = (pair[:3], pair[3:]) if pair else ()
+        if max_concurrent:
+            while open_all and open_all[0] < s['start']:
+                heapq.heappop(open_all)
+            if len(open_all) >= max_concurrent:
+                rejected['cap'] += 1
+                if reasons is not None:
+                    reasons.append((s, 'cap', None))
+                continue
+        if max_per_currency:
+            for ccy in currencies:
+                heap = open_ccy.setdefault(ccy, [])
+                while heap and heap[0] < s['start']:
+                    heapq.heappop(heap)
+            if any(len(open_ccy[ccy]) >= max_per_currency for ccy in currencies):
+                rejected['cap'] += 1
+                if reasons is not None:
+                    reasons.append((s, 'cap', None))
+                continue
+
+        last[key] = s
+        if max_concurrent:
+            heapq.heappush(open_all, s['end'])
+        if max_per_currency:
+            for ccy in currencies:
+                heapq.heappush(open_ccy[ccy], s['end'])
+        selected.setdefault(s['symbol'], []).append(s)
+    return selected, rejected
+
 def main():
     parser = argparse.ArgumentParser(description='Extract Non-Overlapping Trades to CSV')
     parser.add_argument('output_folder', type=str, help='Path to the output folder (e.g., [Parent]/analysis/output_*) created in Step 1.')
     parser.add_argument('--base', type=float, default=100000.0, help='Base capital for each symbol (default: 100,000)')
+    parser.add_argument('--max-concurrent', type=int, help='Max sequences open at the same time across the portfolio (default: no cap)')
+    parser.add_argument('--max-per-currency', type=int, help='Max sequences open at the same time per currency, e.g. 3 EUR sequences (default: no cap)')
     args = parser.parse_args()
 
     output_dir = os.path.abspath(args.output_folder)
@@ -230,42 +289,22 @@ def main():
             cols = ['Time', 'Deal', 'Symbol', 'Type', 'Direction', 'Volume', 'Price', 'Order', 'Commission', 'Swap', 'Profit', 'Balance', 'Comment', 'SequenceNumber', 'TradeNumberInSequence']
             pd.DataFrame(columns=cols).to_csv(all_trades_csv, index=False)
             
-    # Group by Symbol
-    sequences_by_symbol = {}
-    for s in all_sequences:
-        sym = s['symbol']
-        if sym not in sequences_by_symbol:
-            sequences_by_symbol[sym] = []
-        sequences_by_symbol[sym].append(s)
-        
-    # Apply non-overlapping logic per symbol
-    
+    # Apply non-overlapping logic per symbol (and the optional portfolio-wide caps)
+    sequences_by_symbol, rejected = select_sequences(all_sequences, args.max_concurrent, args.max_per_currency)
+    if args.max_concurrent or args.max_per_currency:
+        print(f"Concurrency cap: skipped {rejected['cap']} sequences "
+              f"(max concurrent: {args.max_concurrent or '-'}, per currency: {args.max_per_currency or '-'})")
+
     total_trades = 0
-    for sym, seqs in sequences_by_symbol.items():
-        seqs.sort(key=lambda x: x['start'])
-        last_end_time_long = pd.Timestamp.min
-        last_end_time_short = pd.Timestamp.min
-        
-        selected_seq_deals = []
-        
-        for s in seqs:
-            side = s.get('side', 'long')
-            if side == 'long':
-                if s['start'] > last_end_time_long:
-                    selected_seq_deals.extend(s['deals'])
-                    last_end_time_long = s['end']
-                    total_trades += 1
-            else: # short
-                if s['start'] > last_end_time_short:
-                    selected_seq_deals.extend(s['deals'])
-                    last_end_time_short = s['end']
-                    total_trades += 1
+    for sym, selected in sequences_by_symbol.items():
+        total_trades += len(selected)
+        selected_seq_deals = [d for s in selected for d in s['deals']]
+        accepted_deals = []
 
         if selected_seq_deals:
             # Re-sort all deals in selected sequences by Time for balance calculation
             selected_seq_deals.sort(key=lambda x: pd.to_datetime(x['Time']))
             
-            accepted_deals = []
             current_balance = args.base
             
             for d in selected_seq_deals:
@@ -291,6 +330,11 @@ def main():
                 
             df_selected.to_csv(out_csv, index=False)
 
+    # Record the selection settings for analyze.py
+    with open(os.path.join(trades_out_dir, "selection.json"), 'w', encoding='utf-8') as f_sel:
+        json.dump({'max_concurrent': args.max_concurrent, 'max_per_currency': args.max_per_currency,
+                   'selected': total_trades, 'skipped_overlap': rejected['overlap'], 'skipped_cap': rejected['cap']}, f_sel, indent=1)
+
     print(f"Extracted {total_trades} non-overlapping trades.")
     print(f"Deals saved to: {trades_out_dir}")
 